@@ -223,14 +223,12 @@ class EllipseClosedOrbitFinderIteration(object):
         self.centre, self.ellipse = common.fit_ellipse(self.points,
                                                       self.eps_max,
                                                       verbose = False)
-        noise_list = []
         ellipse = copy.deepcopy(self.ellipse)
         ellipse /= numpy.linalg.det(ellipse)**(1./len(self.centre))
         ellipse_inv = numpy.linalg.inv(ellipse)
-        for x_vec in self.points:
-            x_numpy = numpy.matrix(x_vec)-self.centre
-            noise = x_numpy * ellipse_inv * x_numpy.transpose()
-            noise_list.append(float(noise[0]))
+        x_numpy = numpy.array(self.points)-self.centre
+        noise_list = numpy.einsum('ij,jk,ik->i', x_numpy, ellipse_inv, x_numpy)
+        noise_list = noise_list.tolist()
         for value in noise_list:
             if math.isnan(value) or math.isinf(value):
                 raise ValueError("Failed to calculate noise; "+\
@@ -16,6 +16,7 @@
 
 import math
 import sys
+import bisect
 try:
     import numpy
 except ImportError:
@@ -34,10 +35,26 @@ class FFTTuneFinder(object):
 
     Apply a small displacement to the reference trajectory and track through a
     lattice; use the displaced trajectory 
+
+    Peaks found by the FFT are refined using a "slow" Fourier transform (SFT),
+    evaluated at arbitrary frequencies. The SFT is evaluated for many
+    frequencies at once as a matrix of phases; the (optionally filtered) data
+    are stored and reused until u or use_hanning_filter changes. If u is
+    modified in place, e.g. by appending data, call _sft_reset() before
+    finding the tune.
+
+    Two refinement modes are available:
+    - "recursive": bisect the interval around the peak, one SFT per step,
+      until the interval is smaller than the tune tolerance
+    - "naff": as in the NAFF algorithm, maximise the SFT amplitude directly,
+      using a grid search around the peak followed by successive parabolic
+      interpolation. Each step is much smaller than the last, so this
+      converges in a few SFT evaluations and does not assume that the peak
+      is symmetric. This is most precise when used with the hanning filter.
     """
 
     def __init__(self, u_data = None, up_data = None, peak_finder = None,
-                 use_hanning_filter = False):
+                 use_hanning_filter = False, refine_mode = "recursive"):
         """
         Initialise the tune finder
 
@@ -47,18 +64,25 @@ class FFTTuneFinder(object):
                 diagram. If peak_finder is None, uses a WindowPeakFinder with a
                 window size 10
         - use_hanning_filer: experimental hanning filter (probably doesnt work)
+        - refine_mode: string, either "recursive" or "naff"; algorithm used to
+                refine peaks (see class documentation)
         """
+        if refine_mode not in self.refine_modes:
+            raise ValueError("refine_mode should be one of "+\
+                             str(self.refine_modes)+" not "+str(refine_mode))
         self._peak_finder = peak_finder
         if self._peak_finder == None:
             self._peak_finder = WindowPeakFinder(5, 0., 1)
         self.u = u_data
         self.up = up_data
         self.use_hanning_filter = use_hanning_filter 
+        self.refine_mode = refine_mode
         self.fractional_tune = None
         self.peak_x_list = []
         self.peak_y_list = []
         self.k_mag_x = None
         self.k_mag_y = None
+        self._sft_reset()
 
     def get_tune(self, tune_tolerance = None):
         """
@@ -91,7 +115,15 @@ class FFTTuneFinder(object):
         if len(self.peak_x_list) == 0:
             self._sft_find_peaks(tune_tolerance)
         self._get_max_peak()
-        if tune_tolerance < 1./len(self.k_mag_x):
+        if tune_tolerance < 1./len(self.k_mag_x) and self.refine_mode == "naff":
+            for i, k_x in enumerate(self.peak_x_list):
+                new_peak_x, new_peak_y = self._naff_refine_peak(k_x,
+                                                                tune_tolerance)
+                self._insert_k_mag(new_peak_x, new_peak_y)
+                self.peak_x_list[i] = new_peak_x
+                self.peak_y_list[i] = new_peak_y
+            self._get_max_peak()
+        elif tune_tolerance < 1./len(self.k_mag_x):
             for i, k_x in enumerate(self.peak_x_list):
                 try:
                     new_peak_x = self._recursive_refine_peak(k_x, tune_tolerance)
@@ -242,7 +274,7 @@ class FFTTuneFinder(object):
         """
         n_items = int(1./interval/2.)
         self.k_mag_x = [i*interval for i in range(n_items)]
-        self.k_mag_y = [self._sft(k_x) for k_x in self.k_mag_x]
+        self.k_mag_y = self._sft_array(self.k_mag_x).tolist()
         self._find_peaks()
 
     def _fft_find_peaks(self):
@@ -250,9 +282,8 @@ class FFTTuneFinder(object):
         Perform the Fast Fourier Transform and find any peaks
         """
         fft = numpy.fft.rfft(numpy.array(self.u))
-        k_list = [[float(numpy.real(z)), float(numpy.imag(z))] for z in fft]
-        self.k_mag_y = [(z[0]**2+z[1]**2)**0.5 for z in k_list]
-        self.k_mag_x = [i/2./float(len(k_list)) for i, z in enumerate(k_list)]
+        self.k_mag_y = numpy.abs(fft).tolist()
+        self.k_mag_x = (numpy.arange(len(fft))/2./float(len(fft))).tolist()
         self._find_peaks()
 
     def _find_peaks(self):
@@ -320,28 +351,121 @@ class FFTTuneFinder(object):
             new_peak_index = peak_index + 1
         return self._recursive_refine_peak(self.k_mag_x[new_peak_index], x_tolerance)
 
+    def _naff_refine_peak(self, k_x, x_tolerance):
+        """
+        Maximise the SFT amplitude in the region of a peak
+
+        - k_x, float, seed position of the peak
+        - x_tolerance, float, stop when the step size is less than x_tolerance
+
+        The SFT is first evaluated on a grid of naff_n_points frequencies
+        spanning one FFT bin either side of k_x, to locate the maximum. Then,
+        on each iteration, the SFT is evaluated at the maximum and one step
+        either side; if the middle point is highest, the maximum is moved to
+        the peak of a parabola through the three points and the step is
+        divided by naff_zoom, otherwise the maximum moves one step uphill.
+
+        Returns a tuple of the new peak position and SFT amplitude
+        """
+        half_width = 1./len(self.u)
+        k_array = numpy.linspace(k_x-half_width, k_x+half_width,
+                                 self.naff_n_points)
+        k_array = numpy.clip(k_array, 0., 0.5)
+        k_x = float(k_array[numpy.argmax(self._sft_array(k_array))])
+        step = 2.*half_width/(self.naff_n_points-1)
+        for i in range(self.naff_max_iterations):
+            if step < x_tolerance:
+                break
+            y_0, y_1, y_2 = self._sft_array([k_x-step, k_x, k_x+step]).tolist()
+            curvature = y_0-2.*y_1+y_2
+            if y_1 >= y_0 and y_1 >= y_2 and curvature < 0.:
+                k_x += 0.5*(y_0-y_2)/curvature*step
+                step /= self.naff_zoom
+            elif y_0 > y_2:
+                k_x -= step
+            else:
+                k_x += step
+            k_x = min(max(k_x, 0.), 0.5)
+        return k_x, self._sft(k_x)
+
+    def _insert_k_mag(self, k_x, k_y):
+        """
+        Insert a point into k_mag_x and k_mag_y, keeping k_mag_x sorted
+        """
+        index = bisect.bisect(self.k_mag_x, k_x)
+        self.k_mag_x.insert(index, k_x)
+        self.k_mag_y.insert(index, k_y)
+
     def _sft(self, k_x):
         """
         Calculate "Slow" Fourier Transform at k_x
 
         - k_x, float, position at which the sft is found
-        - hanning filter, bool, set to True to apply a hanning filter
 
         "Slow" Fourier transform means using Sum(A_i cos(...) + A_i sin(...)) to
-        get the FT at a given k value
+        get the FT at a given k value; if use_hanning_filter is True, a hanning
+        filter is applied to A_i
         """
-        y_point, z_point = 0., 0.
-        n = float(len(self.u))
-        hanning = 1.
-        for m, a_m in enumerate(self.u):
-            if self.use_hanning_filter:
-                hanning = 2.*math.sin(math.pi*m/n)**2.
-            f = 2.*math.pi*m*k_x*(n+1)/n
-            dy = hanning*a_m*math.cos(f)
-            dz = hanning*a_m*math.sin(f)
-            y_point += dy
-            z_point += dz
-        k_y = (y_point**2+z_point**2)**0.5
-        return k_y
+        return float(self._sft_array([k_x])[0])
 
+    def _sft_array(self, k_x_array):
+        """
+        Calculate "Slow" Fourier Transform at many k values
 
+        - k_x_array, list or numpy array of floats, positions at which the sft
+          is found
+
+        The phases for up to sft_batch_size elements are calculated in one
+        go, as an outer product of k values and turn numbers. Returns a numpy
+        array of the sft magnitude at each k value.
+        """
+        k_x_array = numpy.asarray(k_x_array, dtype=float)
+        weighted_u = self._sft_weighted_u()
+        n = float(len(weighted_u))
+        turns = numpy.arange(len(weighted_u))*(2.*math.pi*(n+1)/n)
+        k_y_array = numpy.zeros(k_x_array.shape)
+        batch_size = max(1, self.sft_batch_size//max(1, len(weighted_u)))
+        for start in range(0, len(k_x_array), batch_size):
+            phases = numpy.outer(k_x_array[start:start+batch_size], turns)
+            k_y_array[start:start+batch_size] = \
+                                numpy.abs(numpy.exp(1j*phases).dot(weighted_u))
+        return k_y_array
+
+    def _sft_weighted_u(self):
+        """
+        Get u as a numpy array, with the hanning filter applied if
+        use_hanning_filter is True. The array is stored and reused until u or
+        use_hanning_filter changes.
+        """
+        if self._sft_u is not self.u or \
+           self._sft_length != len(self.u) or \
+           self._sft_hanning != self.use_hanning_filter:
+            weighted_u = numpy.array(self.u, dtype=float)
+            if self.use_hanning_filter:
+                n = float(len(weighted_u))
+                turns = numpy.arange(len(weighted_u))
+                weighted_u *= 2.*numpy.sin(math.pi*turns/n)**2
+            self._sft_weights = weighted_u
+            self._sft_u = self.u
+            self._sft_length = len(self.u)
+            self._sft_hanning = self.use_hanning_filter
+        return self._sft_weights
+
+    def _sft_reset(self):
+        """
+        Clear the stored data used by _sft_array
+        """
+        self._sft_u = None
+        self._sft_length = None
+        self._sft_hanning = None
+        self._sft_weights = None
+
+    refine_modes = ["recursive", "naff"]
+    ## number of grid points used to locate the peak in _naff_refine_peak
+    naff_n_points = 21
+    ## factor by which the step shrinks on each _naff_refine_peak iteration
+    naff_zoom = 10.
+    ## maximum number of _naff_refine_peak iterations
+    naff_max_iterations = 100
+    ## maximum number of elements in the phase matrix used by _sft_array
+    sft_batch_size = 2**20
@@ -41,6 +41,10 @@ try:
   from numpy import linalg
 except ImportError:
   pass
+try:
+  import multiprocessing.pool
+except ImportError:
+  pass
 
 import xboa.common as Common
 import xboa.common.config as config
@@ -84,7 +88,7 @@ class Bunch:
   def __repr__(self):
     """Return a long string that contains data in every hit"""
     covs = 'None'
-    if self.__covs != None:
+    if self.__covs is not None:
       covs = 'numpy.'+repr(self.__covs)
     out = 'Bunch.new_from_hits( ['
     for hit in self.__hits:
@@ -679,9 +683,7 @@ class Bunch:
 
     e.g. bunch.moment(['x','px']) returns the covariance of x,px about the bunch mean
     """
-    bunch_weight = self.bunch_weight()
-    if abs(bunch_weight) < 1e-9: raise ZeroDivisionError('Trying to find moment of bunch with 0 weight')
-    if self.__covs != None and len(variable_list) == 2:
+    if self.__covs is not None and len(variable_list) == 2:
       axis_list = Bunch.axis_list_to_covariance_list(Bunch.__axis_list)
       try:
         i1 = axis_list.index(variable_list[0])
@@ -689,6 +691,8 @@ class Bunch:
         return float(self.__covs[i1,i2]) # not numpy.float64
       except ValueError:
         pass
+    bunch_weight = self.bunch_weight()
+    if abs(bunch_weight) < 1e-9: raise ZeroDivisionError('Trying to find moment of bunch with 0 weight')
     if variable_mean_dict == {}:
       variable_mean_dict = self.mean(variable_list)
     try:
@@ -736,18 +740,16 @@ class Bunch:
     dim = len(get_variable_list)
     cov = matrix(numpy.zeros((dim,dim)))
     origin_dict1 = copy.deepcopy(origin_dict)
-    origin_list  = []
     for var in get_variable_list:
       if not var in origin_dict1:
         origin_dict1[var] = self.mean([var])[var]
-      origin_list.append(origin_dict1[var])
-    try:
-      covariances = self.__bunchcore.covariance_matrix(get_variable_list, origin_list)
+    try: # all elements in one pass over the hits
+      covariances = self.__bunchcore.covariance_matrix(get_variable_list, origin_dict1)
       for i1 in range(dim):
-        for i2 in range(i1, dim):
-          cov[i1,i2] = covariance_list[i1][i2]
+        for i2 in range(dim):
+          cov[i1,i2] = covariances[i1][i2]
       return cov
-    except:
+    except: #variables not in bunchcore.get_variable list
       pass
     for i1 in range(dim):
       for i2 in range(i1, dim):
@@ -755,7 +757,244 @@ class Bunch:
         cov[i1,i2]     = self.moment(covariance_list, origin_dict1)
         cov[i2,i1]     = cov[i1,i2]
     return cov
-  
+
+  def quantile(self, variable, quantile, weighted=True):
+    """
+    Return the value of a hit variable below which some fraction of the bunch lies
+
+    - variable = either a variable from Hit.get_variables() or an amplitude variable.
+        amplitude variables should be formatted like 'amplitude x y' or 'amplitude x y t'
+    - quantile = float in the range [0, 1], or a list of floats; the fraction of
+        the bunch that lies at or below the returned value
+    - weighted = boolean; if True, hits are counted according to their 'weight'
+        and hits with 0 weight are ignored. If False, every hit is counted once.
+
+    Several quantiles can be calculated in one call by passing a list of
+    quantiles; the hit data are only extracted once. The quantiles are found by
+    a linear time weighted selection rather than by sorting the hits.
+
+    e.g. bunch.quantile('amplitude x y', 0.09) returns the amplitude containing
+    9 % of the bunch
+
+    e.g. bunch.quantile('x', [0.25, 0.5, 0.75]) returns a list of the quartiles
+    of x
+    """
+    config.has_numpy()
+    quantile_list = quantile
+    if not hasattr(quantile, '__iter__'):
+      quantile_list = [quantile]
+    values = self._hit_variable_array(variable)
+    weights = None
+    if weighted:
+      weights = self._hit_variable_array('weight')
+    quantile_list = Common.weighted_quantile(values, quantile_list, weights)
+    if not hasattr(quantile, '__iter__'):
+      return quantile_list[0]
+    return quantile_list
+
+  def bootstrap(self, variable_string, variable_list, n_samples=1000, n_workers=1, confidence_level=0.68, seed=None):
+    """
+    Estimate the statistical uncertainty on a bunch variable by bootstrap resampling
+
+    - variable_string = one of 'emittance', 'beta', 'alpha', 'gamma', 'mean',
+        'standard_deviation' or 'bunch_weight'
+    - variable_list = list of variables, as for Bunch.get(variable_string, variable_list)
+    - n_samples = number of bootstrap samples
+    - n_workers = number of threads over which the samples are spread
+    - confidence_level = float in the range [0, 1]; the central fraction of the
+        bootstrap distribution enclosed by the confidence interval
+    - seed = integer seed for the random number generator; if None, a seed is
+        taken from the operating system
+
+    Each sample draws len(bunch) hits with replacement. Hits are never copied;
+    instead the hit data are extracted once into a table of columns and each
+    sample is represented by a multinomial count for each hit, which multiplies
+    the hit weight. Moments for a batch of samples are then calculated with a
+    single matrix product. Samples are generated in fixed size batches, each
+    with its own random stream, so that the result for a given seed does not
+    depend on n_workers.
+
+    Returns a dict like
+      {'mean':<mean over samples>, 'standard_deviation':<standard deviation over samples>,
+       'confidence_interval':[<lower>, <upper>], 'samples':<numpy array of sampled values>}
+
+    e.g. bunch.bootstrap('emittance', ['x', 'y'], 1000, 4)['standard_deviation']
+    returns the statistical error on the 4D emittance
+    """
+    config.has_numpy()
+    config.has_multiprocessing()
+    if not variable_string in Bunch.__bootstrap_list:
+      raise KeyError(variable_string+' not available for bootstrap. Options are '+str(Bunch.__bootstrap_list))
+    if confidence_level < 0. or confidence_level > 1.:
+      raise ValueError('confidence_level '+str(confidence_level)+' should be in range [0, 1]')
+    if n_samples < 1 or len(self.__hits) == 0:
+      raise ValueError('bootstrap needs at least one sample and one hit')
+    geometric = Bunch.__geometric_momentum
+    if variable_string in ['mean', 'standard_deviation', 'bunch_weight']:
+      var_list = variable_list[:1]
+    else:
+      var_list = Bunch.axis_list_to_covariance_list(variable_list)
+      if not geometric:
+        var_list.append('p')
+    weights = self._hit_variable_array('weight')
+    columns = numpy.array([self._hit_variable_array(var) for var in var_list]).T
+    # centre the columns on the bunch mean to avoid rounding errors in the
+    # raw second moments
+    offset = numpy.dot(weights, columns)/numpy.sum(weights)
+    columns -= offset
+    index = numpy.triu_indices(len(var_list))
+    products = columns[:, index[0]]*columns[:, index[1]]
+    table = numpy.hstack([weights[:, None], weights[:, None]*columns,
+                          weights[:, None]*products])
+    batch_size = max(1, min(Bunch.__bootstrap_batch_size,
+                            Bunch.__bootstrap_batch_hits//len(self.__hits)))
+    n_batches = (n_samples+batch_size-1)//batch_size
+    seed_list = numpy.random.SeedSequence(seed).spawn(n_batches)
+    job_list = [(table, seed_list[i], min(batch_size, n_samples-i*batch_size))
+                for i in range(n_batches)]
+    if n_workers > 1:
+      pool = multiprocessing.pool.ThreadPool(n_workers)
+      try:
+        sums = pool.map(Bunch.__bootstrap_batch, job_list)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      sums = [Bunch.__bootstrap_batch(job) for job in job_list]
+    sums = numpy.vstack(sums)
+    sum_weight = sums[:, 0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      means = sums[:, 1:len(var_list)+1]/sum_weight[:, None]
+      covs = numpy.zeros((n_samples, len(var_list), len(var_list)))
+      covs[:, index[0], index[1]] = sums[:, len(var_list)+1:]/sum_weight[:, None]
+      covs[:, index[1], index[0]] = covs[:, index[0], index[1]]
+      covs -= means[:, :, None]*means[:, None, :]
+      samples = self.__bootstrap_variable(variable_string, variable_list, sum_weight, means+offset, covs)
+    tail = (1.-confidence_level)/2.
+    return {
+      'mean':float(numpy.nanmean(samples)),
+      'standard_deviation':float(numpy.nanstd(samples)),
+      'confidence_interval':[float(value) for value in numpy.nanquantile(samples, [tail, 1.-tail])],
+      'samples':samples,
+    }
+
+  def __bootstrap_batch(job):
+    """Return weighted sums over resampled hits; one row for each sample in the batch"""
+    table, seed, n_samples = job
+    n_hits = table.shape[0]
+    random = numpy.random.default_rng(seed)
+    counts = random.multinomial(n_hits, numpy.ones(n_hits)/n_hits, size=n_samples)
+    return numpy.dot(counts.astype(float), table)
+  __bootstrap_batch = staticmethod(__bootstrap_batch)
+
+  def __bootstrap_variable(self, variable_string, axis_list, sum_weight, means, covs):
+    """Convert arrays of resampled means and covariances into arrays of variable_string"""
+    if variable_string == 'bunch_weight':
+      return sum_weight
+    if variable_string == 'mean':
+      return means[:, 0]
+    if variable_string == 'standard_deviation':
+      return covs[:, 0, 0]**0.5
+    n_dim = len(axis_list)
+    emittance = linalg.det(covs[:, :2*n_dim, :2*n_dim])**(1./2./n_dim)
+    if not Bunch.__geometric_momentum:
+      emittance /= self.__hits[0].get('mass')
+    if variable_string == 'emittance':
+      return emittance
+    if variable_string == 'beta':
+      value = sum([covs[:, 2*i, 2*i] for i in range(n_dim)])
+    elif variable_string == 'gamma':
+      value = sum([covs[:, 2*i+1, 2*i+1] for i in range(n_dim)])
+    elif variable_string == 'alpha':
+      value = -sum([covs[:, 2*i, 2*i+1] for i in range(n_dim)])
+    value /= emittance*n_dim
+    if not Bunch.__geometric_momentum:
+      mass = self.__hits[0].get('mass')
+      if variable_string == 'beta':
+        value *= means[:, -1]/mass
+      elif variable_string == 'gamma':
+        value /= means[:, -1]*mass
+      else:
+        value /= mass
+    return value
+
+  def compare_distribution(self, other, variable, weighted=True):
+    """
+    Test whether hit variables in this bunch and another bunch have the same distribution
+
+    - other = the bunch to compare with
+    - variable = either a variable from Hit.get_variables() or an amplitude
+        variable, or a list of such variables
+    - weighted = boolean; if True, hits are counted according to their 'weight'
+        and hits with 0 weight are ignored. If False, every hit is counted once.
+
+    Uses weighted two-sample Kolmogorov-Smirnov and Anderson-Darling tests; see
+    Common.two_sample_test. ROOT is not required.
+
+    Returns a dict like
+      {'ks_statistic':D, 'ks_probability':P(D), 'ad_statistic':A^2, 'ad_probability':P(A^2)}
+    If variable is a list, each value is a numpy array with one element for
+    each variable.
+
+    e.g. bunch_1.compare_distribution(bunch_2, 'x')['ks_probability'] returns
+    the probability that x is drawn from the same distribution in both bunches
+    """
+    config.has_numpy()
+    variable_list = variable
+    if type(variable) == str:
+      variable_list = [variable]
+    values_1 = numpy.array([self._hit_variable_array(var) for var in variable_list])
+    values_2 = numpy.array([other._hit_variable_array(var) for var in variable_list])
+    weights_1, weights_2 = None, None
+    if weighted:
+      weights_1 = self._hit_variable_array('weight')
+      weights_2 = other._hit_variable_array('weight')
+    result = Common.two_sample_test(values_1, values_2, weights_1, weights_2)
+    if type(variable) == str:
+      return dict([(key, float(value[0])) for key, value in result.items()])
+    return result
+
+  def list_compare_distribution(dict_of_bunches_1, dict_of_bunches_2, list_of_variables, weighted=True, n_workers=1):
+    """
+    Compare the distributions of several variables in two dicts of bunches
+
+    - dict_of_bunches_1 = dict of bunches, e.g. one for each station
+    - dict_of_bunches_2 = dict of bunches to compare with; bunches are compared
+        if they have the same key in each dict
+    - list_of_variables = list of variables that will be compared
+    - weighted = boolean; if True, hits are counted according to their 'weight'
+    - n_workers = number of threads over which the bunches are spread
+
+    Returns a dict of key to the output of compare_distribution for each key
+    that is in both dicts. All variables for a pair of bunches are tested in
+    one batch.
+
+    E.g. list_compare_distribution(old_version, new_version, ['x', 'px', 'energy'])
+    might be used to check that a change to a simulation code does not change
+    the output at any station.
+    """
+    key_list = [key for key in dict_of_bunches_1 if key in dict_of_bunches_2]
+    job_list = [(dict_of_bunches_1[key], dict_of_bunches_2[key], list_of_variables, weighted)
+                for key in key_list]
+    if n_workers > 1:
+      config.has_multiprocessing()
+      pool = multiprocessing.pool.ThreadPool(n_workers)
+      try:
+        results = pool.map(Bunch.__compare_distribution_bunch, job_list)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      results = [Bunch.__compare_distribution_bunch(job) for job in job_list]
+    return dict(zip(key_list, results))
+  list_compare_distribution = staticmethod(list_compare_distribution)
+
+  def __compare_distribution_bunch(job):
+    """Call compare_distribution for one pair of bunches"""
+    bunch_1, bunch_2, list_of_variables, weighted = job
+    return bunch_1.compare_distribution(bunch_2, list(list_of_variables), weighted)
+  __compare_distribution_bunch = staticmethod(__compare_distribution_bunch)
+
   def set_covariance_matrix(self, use_internal_covariance_matrix=True, covariance_matrix=None, mean_dict={}):
     """
     Choose whether to use an internal covariance matrix for calculations
@@ -770,11 +1009,13 @@ class Bunch:
     As a speed optimisation, x-boa can calculate a covariance matrix and use this for all calculations involving covariances, i.e. Twiss parameters, emittances, amplitudes etc. Otherwise x-boa will re-calculate this each time, which can be slow. Be careful though - x-boa does not automatically detect for hits being added or removed from the bunch, etc. The user must call this function each time the bunch changes (events added, weightings changed, etc) to update the internal covariance matrix
     """
     if use_internal_covariance_matrix:
-      if covariance_matrix == None:
-        self.__covs = self.covariance_matrix(Bunch.axis_list_to_covariance_list(Bunch.__axis_list))
+      if covariance_matrix is None or mean_dict == {}:
+        axis_covs, axis_means = self.__axis_covariance_matrix()
+      if covariance_matrix is None:
+        self.__covs = axis_covs
       else: self.__covs = covariance_matrix
       if mean_dict == {}:
-        self.__means = self.mean(Bunch.axis_list_to_covariance_list(Bunch.__axis_list))
+        self.__means = axis_means
       else: self.__means = mean_dict
     else:
       self.__covs  = None
@@ -782,7 +1023,7 @@ class Bunch:
 
   def covariances_set(self):
     """If internal covariances are set by set_covariance_matrix, return True; else return False"""
-    return self.__covs != None
+    return self.__covs is not None
 
 
   def means_set(self):
@@ -810,6 +1051,19 @@ class Bunch:
     """Set global_weight and local_weight of all hits in the bunch to 1"""
     self.clear_local_weights()
     self.clear_global_weights()
+
+  def set_weights(self, weights, global_cut = False):
+    """
+    Set the statistical weight of every hit in the bunch in a single call
+
+    - weights = sequence of floats (e.g. numpy array) with one weight for each hit
+    - global_cut = boolean; if True, set global weights in the current weight
+      context; else set local weights
+
+    Weights are written by the C core without any per-hit Python calls. Raises
+    a ValueError if weights has a different length to the bunch.
+    """
+    self.__bunchcore.set_weights(weights, bool(global_cut))
   
   def cut(self, variable_value_dict, comparator, value_is_nsigma_bool = False, global_cut = False):
     """
@@ -1114,7 +1368,35 @@ class Bunch:
     if not Bunch.__geometric_momentum:
       emittance /= self.__hits[0].get('mass')
     return float(emittance)
-  
+
+  def fractional_emittance(self, axis_list, fraction, weighted=True):
+    """
+    Return the phase space content of the amplitude contour containing some fraction of the bunch
+
+    - fractional emittance = pi^n*A_f^n/n!
+
+    where n is the number of elements in axis_list and A_f is the amplitude
+    below which fraction of the bunch lies, as returned by
+    quantile('amplitude ...', fraction). The fractional emittance has the same
+    normalisation as get_emittance, i.e. it is normalised to the particle mass
+    unless geometric momenta are in use.
+
+    - axis_list = list of axes from Bunch.get_axes().
+    - fraction = float in the range [0, 1], or a list of floats; the fraction
+        of the bunch contained within the contour
+    - weighted = boolean; if True, hits are counted according to their 'weight'
+
+    e.g. bunch.fractional_emittance(['x', 'y'], 0.09) returns the 4D phase
+    space volume occupied by the 9 % of the bunch closest to the beam core
+    """
+    n_dim = len(axis_list)
+    amplitude = self.quantile('amplitude '+' '.join(axis_list), fraction,
+                              weighted)
+    norm = math.pi**n_dim/math.factorial(n_dim)
+    if not hasattr(fraction, '__iter__'):
+      return norm*amplitude**n_dim
+    return [norm*a_f**n_dim for a_f in amplitude]
+
   def get_kinetic_angular_momentum(self, rotation_axis_dict={'x':0,'y':0,'px':0,'py':0,'x\'':0,'y\'':0}):
     """
     Return the bunch kinetic angular momentum about some arbitrary axis, defined by
@@ -1291,16 +1573,61 @@ class Bunch:
       var = list_of_variables[i]
       if type(var) is str:
         if(var.find('amplitude') > -1):
-          axis_list = Bunch.convert_string_to_axis_list(var[10:len(var)])
-          covariance_list = Bunch.axis_list_to_covariance_list(axis_list)
-          covariance_matrix = self.covariance_matrix(covariance_list)
-          mean_dict = self.mean(covariance_list)
+          values[i] = self._hit_variable_array(var).tolist()
+          if not list_of_units == []:
+            values[i] = [value/Common.units[list_of_units[i]] for value in values[i]]
+          continue
       for hit in self.__hits:
         values[i].append( self.get_hit_variable(hit, var, covariance_matrix, mean_dict) )
-        if not list_of_units == []: 
+        if not list_of_units == []:
           values[i][-1] /= Common.units[list_of_units[i]]
     return values
-  
+
+  def _hit_variable_array(self, variable_name):
+    """
+    Return a numpy array of get_hit_variable results, one element for each hit in the bunch
+
+    - variable_name = either a variable from Hit.get_variables() or an amplitude variable.
+        amplitude variables should be formatted like 'amplitude x y' or 'amplitude x y t'
+
+    Amplitudes are calculated for all hits at once, using a single covariance
+    matrix inversion.
+    """
+    config.has_numpy()
+    if type(variable_name) == str and variable_name.find('amplitude') > -1:
+      axis_list = Bunch.convert_string_to_axis_list(variable_name[10:len(variable_name)])
+      return self._amplitude_array(axis_list)
+    return numpy.array([hit.get(variable_name) for hit in self.__hits], dtype=float)
+
+  def _amplitude_array(self, axis_list, covariance_matrix=None, mean_dict={}, geometric=None):
+    """
+    Return a numpy array of particle amplitudes, one element for each hit in the bunch
+
+    - axis_list = list of axes that defines the covariance matrix and particle vector
+    - covariance_matrix = if this is not set to None, will use this covariance_matrix
+          for the calculation rather than taking one from the bunch
+    - mean_dict = dict of variables to means; if empty, will use the bunch mean
+
+    Gives the same result as calling get_amplitude for each hit in turn.
+    """
+    if geometric == None: geometric = Bunch.__geometric_momentum
+    cov_list  = Bunch.axis_list_to_covariance_list(axis_list, geometric)
+    if mean_dict == {}:
+      mean_dict = self.__mean_picker(axis_list)
+      if mean_dict == {}:
+        mean_dict = self.mean(cov_list)
+    my_cov    = copy.deepcopy(covariance_matrix)
+    if my_cov is None:
+      my_cov = self.__cov_mat_picker(axis_list)
+      if my_cov is None:
+        my_cov = self.covariance_matrix(cov_list)
+    vectors = numpy.array([[hit.get(var) for var in cov_list] for hit in self.__hits], dtype=float)
+    vectors = vectors.reshape(len(self.__hits), len(cov_list))
+    vectors -= numpy.array([mean_dict[var] for var in cov_list])
+    cov_inv = numpy.asarray(linalg.inv(my_cov))
+    amplitudes = numpy.einsum('ij,jk,ik->i', vectors, cov_inv, vectors)
+    return amplitudes*self.get_emittance(axis_list, my_cov)
+
   def get(self, variable_string, variable_list):
     """
     Return a bunch variable taken from the list Bunch.get_variables()
@@ -1325,31 +1652,65 @@ class Bunch:
     else:
       return self.__get_dict[variable_string](self, variable_list)
   
-  def list_get(dict_of_bunches, list_of_variables, list_of_axis_lists):
+  def list_get(dict_of_bunches, list_of_variables, list_of_axis_lists, n_workers=1):
     """
-    Get a list of lists of variables from each bunch in the dict_of_bunches
+    Get a list of arrays of variables from each bunch in the dict_of_bunches
 
     - dict_of_bunches   = dict of bunches from which the lists will be taken
     - list_of_variables = list of variables that will be used in the calculation
     - list_of_axis_lists = axis_list that will be used in the calculation of the 
         corresponding variable
+    - n_workers = number of threads over which the bunches are spread
 
     E.g. list_get(my_dict_of_bunches, ['mean', 'emittance'], [['z'],['x','y']])
       would calculate a list of two arrays: (i) mean z; (ii) emittance x y
 
-    Output is sorted by the first variable in the list. This might be useful to interface
-    with E.g. a plotting package
+    Where several variables depend on the bunch covariances (e.g. emittance,
+    beta and alpha), the covariance matrix of each bunch is calculated once and
+    shared between them. Bunches that already use an internal covariance matrix
+    (see set_covariance_matrix) are left unchanged.
+
+    Output is a list of numpy arrays, sorted by the first variable in the list.
+    This might be useful to interface with E.g. a plotting package
     """
-    values = []
-    for dummy in list_of_variables:
-      values.append([])
-    for key, bunch in dict_of_bunches.items():
-      for i in range(len(list_of_variables)):
-        values[i].append(bunch.get(list_of_variables[i], list_of_axis_lists[i]))
-    Common.multisort(values)
-    return values
+    config.has_numpy()
+    # a bunch may appear under several keys; calculate it once, so that no
+    # two threads change the covariance matrix state of the same bunch
+    job_index, job_list = {}, []
+    for bunch in dict_of_bunches.values():
+      if id(bunch) not in job_index:
+        job_index[id(bunch)] = len(job_list)
+        job_list.append((bunch, list_of_variables, list_of_axis_lists))
+    if n_workers > 1:
+      config.has_multiprocessing()
+      pool = multiprocessing.pool.ThreadPool(n_workers)
+      try:
+        values = pool.map(Bunch.__list_get_bunch, job_list)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      values = [Bunch.__list_get_bunch(job) for job in job_list]
+    values = numpy.array(values, dtype=float).reshape(len(job_list), len(list_of_variables))
+    values = values[[job_index[id(bunch)] for bunch in dict_of_bunches.values()]]
+    values = values[numpy.argsort(values[:, 0], kind='stable')]
+    return [values[:, i] for i in range(len(list_of_variables))]
   list_get = staticmethod(list_get)
 
+  def __list_get_bunch(job):
+    """Return list of variables for one bunch, sharing the covariance matrix between them"""
+    bunch, list_of_variables, list_of_axis_lists = job
+    n_shared = len([var for var in list_of_variables if var in Bunch.__shared_moment_list])
+    share = n_shared > 1 and not bunch.covariances_set()
+    if share:
+      bunch.set_covariance_matrix(True)
+    try:
+      return [bunch.get(var, axes) for var, axes in zip(list_of_variables, list_of_axis_lists)]
+    finally:
+      if share:
+        bunch.set_covariance_matrix(False)
+  __list_get_bunch = staticmethod(__list_get_bunch)
+
   def get_variables():
     """Return a list of variables suitable for calls to Bunch.get"""
     return Bunch.__get_list
@@ -1880,7 +2241,7 @@ class Bunch:
 
   def __cov_mat_picker(self, axis_list):
     config.has_numpy()
-    if self.__covs == None: return None
+    if self.__covs is None: return None
     covs      = numpy.zeros( (2*len(axis_list),2*len(axis_list) ))
     ind = []
     for axis in axis_list:
@@ -1893,6 +2254,24 @@ class Bunch:
         covs[2*i,  2*j+1] = self.__covs[2*ind[i],   2*ind[j]+1]
     return covs
 
+  def __axis_covariance_matrix(self):
+    """
+    Return the covariance matrix and means of all axes and their conjugate
+    momenta. ct is a scaled copy of t; its moments are scaled from those of t
+    so that the matrix can be calculated in a single pass over the hits.
+    """
+    cov_list  = Bunch.axis_list_to_covariance_list(Bunch.__axis_list)
+    scale     = numpy.ones(len(cov_list))
+    core_list = []
+    for i, var in enumerate(cov_list):
+      if var in Bunch.__scaled_variables:
+        var, scale[i] = Bunch.__scaled_variables[var]
+      core_list.append(var)
+    means = self.mean(core_list)
+    covs  = matrix(numpy.asarray(self.covariance_matrix(core_list, means))*numpy.outer(scale, scale))
+    means = dict([(var, means[core_var]*scale[i]) for i, (var, core_var) in enumerate(zip(cov_list, core_list))])
+    return covs, means
+
   def __mean_picker(self, var_list):
     if self.__means == None or self.__means == {}: return {}
     means = {}
@@ -1909,6 +2288,11 @@ class Bunch:
                              'dispersion_prime':__dispersion_prime_for_get, 'beta':get_beta, 'alpha':get_alpha, 'gamma':get_gamma, 
                              'moment':moment, 'mean':__mean_for_get, 'bunch_weight':__weight_for_get, 'standard_deviation':standard_deviation}
   __geometric_momentum     = False
+  __scaled_variables       = {'ct':('t', Common.constants['c_light'])}
+  __shared_moment_list     = ['emittance', 'beta', 'alpha', 'gamma', 'dispersion', 'dispersion_prime', 'moment', 'standard_deviation']
+  __bootstrap_list         = ['emittance', 'beta', 'alpha', 'gamma', 'mean', 'standard_deviation', 'bunch_weight']
+  __bootstrap_batch_size   = 64
+  __bootstrap_batch_hits   = 2**22
 
   __get_list               = []
   for key,value in __get_dict.items():
@@ -1921,9 +2305,9 @@ class Bunch:
     'initialise' : ['new_dict_from_read_builtin', 'new_from_hits', 'new_from_read_builtin', 'new_from_read_user', 'new_list_from_read_builtin', 'new_hit_shell', 'copy', 'deepcopy'],    
     'transforms' : ['abelian_transformation', 'period_transformation', 'transform_to', 'translate'],
     'hit'        : ['get', 'get_hit_variable', 'get_hits', 'hit_equality', 'list_get', 'list_get_hit_variable', 'append', 'hits', 'hit_get_variables', 'get_variables', 'get_amplitude'],
-    'moments'    : ['mean', 'moment', 'covariance_matrix'],
-    'weights'    : ['bunch_weight', 'clear_global_weights', 'clear_local_weights', 'clear_weights', 'cut', 'transmission_cut', 'conditional_remove'],  
-    'twiss'      : ['get_emittance', 'get_beta', 'get_alpha', 'get_gamma', 'get_emittance', 'get_canonical_angular_momentum', 'get_dispersion', 'get_dispersion_prime','get_dispersion_rsquared', 'get_kinetic_angular_momentum'],
+    'moments'    : ['mean', 'moment', 'covariance_matrix', 'quantile', 'bootstrap', 'compare_distribution', 'list_compare_distribution'],
+    'weights'    : ['bunch_weight', 'clear_global_weights', 'clear_local_weights', 'clear_weights', 'set_weights', 'cut', 'transmission_cut', 'conditional_remove'],  
+    'twiss'      : ['get_emittance', 'fractional_emittance', 'get_beta', 'get_alpha', 'get_gamma', 'get_emittance', 'get_canonical_angular_momentum', 'get_dispersion', 'get_dispersion_prime','get_dispersion_rsquared', 'get_kinetic_angular_momentum'],
     'twiss_help' : ['convert_string_to_axis_list', 'covariances_set', 'means_set', 'momentum_variable', 'set_geometric_momentum', 'set_covariance_matrix', 'get_axes', 'get_geometric_momentum', 'axis_list_to_covariance_list'],
     'io'         : ['hit_write_builtin', 'hit_write_builtin_from_dict', 'hit_write_user', 'setup_file', 'read_maus_file'],
     'ellipse'    : ['build_ellipse_2d', 'build_ellipse_from_transfer_matrix', 'build_penn_ellipse'], #, 'build_ET_ellipse', 'build_MR_ellipse'
@@ -24,6 +24,10 @@ Implemented within this module:
 \li \link xboa::bunch::weighting::_voronoi_weighting::VoronoiWeighting
     VoronoiWeighting \endlink: class to apply weights based on a Voronoi
     tesselation.
+\li \link xboa::bunch::weighting::_nearest_neighbour_weighting::NearestNeighbourWeighting
+    NearestNeighbourWeighting \endlink: class to apply weights based on the
+    distance to nearest neighbours; a faster alternative to VoronoiWeighting
+    in many dimensions.
 \li \link xboa::bunch::weighting::_bounding_ellipse::BoundingEllipse
     BoundingEllipse \endlink: defines a BoundingEllipse for the VoronoiWeighting
 \li \link xboa::bunch::weighting::_hull_content::HullContent
@@ -35,5 +39,7 @@ from xboa.bunch.weighting._voronoi_weighting import VoronoiWeighting
 from xboa.bunch.weighting._bounding_ellipse import BoundingEllipse
 from xboa.bunch.weighting._hull_content import HullContent
 from xboa.bunch.weighting._multipole_weighting import MultipoleWeighting
+from xboa.bunch.weighting._nearest_neighbour_weighting import NearestNeighbourWeighting
 
-__all__ = ["VoronoiWeighting", "BoundingEllipse", "HullContent"]
+__all__ = ["VoronoiWeighting", "BoundingEllipse", "HullContent",
+           "NearestNeighbourWeighting"]
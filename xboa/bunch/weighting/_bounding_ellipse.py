@@ -77,29 +77,18 @@ class BoundingEllipse(object):
 
     def cut_on_bound(self, points_in):
         """
-        Iterate over the points, and delete items that are outside the ellipse.
+        Delete points that are outside the ellipse.
         - points_in. Set of n points in form of a numpy array with shape
           (n, dimension).
         Returns a tuple of (points_out, not_cut_indices) where points_out is a
         numpy array of shape (m, dimension) containing all points that sit on or
-        inside the ellipse boundary and not_cut_indices is a list of integers
-        of length m corresponding to the position in points_in of each of the m
-        points_out.
+        inside the ellipse boundary and not_cut_indices is a numpy array of
+        integers of length m corresponding to the position in points_in of each
+        of the m points_out.
         """
-        points = points_in
-        i = 0
-        index = 0
-        not_cut_indices = []
-        while i < len(points):
-            point = points[i]
-            delta = point - self.mean
-            delta_t = numpy.transpose(delta)
-            arg = delta.dot(self.ellipse_inv.dot(delta_t))
-            if arg > 1.:
-                points = numpy.delete(points, i, 0)
-            else:
-                not_cut_indices.append(index)
-                i += 1
-            index += 1
-        return points, not_cut_indices
+        points = numpy.asarray(points_in)
+        delta = points - self.mean
+        arg = numpy.einsum('ij,jk,ik->i', delta, self.ellipse_inv, delta)
+        not_cut = arg <= 1.
+        return points[not_cut], numpy.flatnonzero(not_cut)
 
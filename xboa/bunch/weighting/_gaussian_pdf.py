@@ -0,0 +1,45 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see
+#<http://www.gnu.org/licenses/>.
+
+"""
+Helper functions shared by the weighting classes; used internally by
+xboa.bunch.weighting
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    pass
+
+def gaussian_pdf_array(points, mean, ellipse_inv, ellipse_det):
+    """
+    Calculate a multivariate gaussian at many points.
+    - points: numpy.array of shape (n, dimension)
+    - mean: numpy.array of length dimension; mean of the gaussian
+    - ellipse_inv: numpy.array of shape (dimension, dimension); inverse of the
+      covariance matrix of the gaussian
+    - ellipse_det: float; determinant of the covariance matrix
+    Returns a numpy.array of length n holding the value of the gaussian at
+    each point.
+    """
+    dim = len(mean)
+    points = numpy.asarray(points, dtype=float).reshape(-1, dim)
+    norm = (2.*math.pi)**dim*ellipse_det
+    delta = points - mean
+    arg = -0.5*numpy.einsum('ij,jk,ik->i', delta, ellipse_inv, delta)
+    return numpy.exp(arg)/norm**0.5
@@ -20,6 +20,7 @@ HullContent class should be imported directly from xboa.bunch.weighting
 
 import multiprocessing
 import signal
+import math
 import os
 
 try:
@@ -27,7 +28,12 @@ try:
 except ImportError:
     pass
 try:
-    import scipy
+    import scipy.spatial
+except ImportError:
+    pass
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
 except ImportError:
     pass
 
@@ -38,90 +44,194 @@ class HullContent(object):
     """
     HullContent class is used for parallelised calculation of convex hull
     contents from a Voronoi tesselation.
+
+    Each tile is split into simplices by joining the (triangulated) facets of
+    its convex hull to the tile centroid. The simplices from a batch of tiles
+    are stacked and their contents are calculated together, each as the
+    determinant of the matrix of edge vectors from one vertex. Batches of tiles
+    are shared between processes.
     """
-    def __init__(self, tesselation, region_list, n_procs = 1):
+    def __init__(self, tesselation, region_list, n_procs = 1, pool = None):
         """
         Calculate the contents of the tesselation and store in tile_content_list
         - tesselation: object of type scipy.spatial.Voronoi containing the
           convex hulls (tiles) which need content calculated
         - region_list: list of regions over which hulls should be calculated.
-        - n_procs: number of processes to use.
+        - n_procs: number of processes to use. If n_procs is 1 and no pool is
+          given, the calculation is done in the calling process.
+        - pool: a multiprocessing.Pool to use for the calculation. The pool is
+          not closed by HullContent, so it can be reused for many
+          tesselations. If None, a pool of n_procs processes is created and
+          closed again once the contents are calculated.
+
+        When a pool is used, the tesselation vertices are placed in shared
+        memory once and only the vertex indices of each tile are sent to the
+        worker processes.
         """
         config.has_numpy()
         config.has_scipy()
-        try:
-            self.tesselation = tesselation
-            self.region_list = region_list
+        self.tesselation = tesselation
+        self.region_list = region_list
+        self.tile_content_list = None
+        self.pool = pool
+        self.n_procs = n_procs
+        own_pool = pool is None and n_procs > 1
+        if own_pool:
             self.pool = multiprocessing.Pool(n_procs, _init_worker)
-            self.tile_content_list = None
+        try:
             self.recalculate()
         except:
-            self.pool.terminate()
+            if own_pool:
+                self.pool.terminate()
             raise
-      
+        if own_pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
 
     def recalculate(self):
         """
-        Recalculate the tile content list
+        Recalculate the tile content list; tile_content_list is a numpy array
+        with one element for each item in region_list
         """
-        job_list = [None]*len(self.region_list)
+        region_list = []
         for i in self.region_list:
             tile_index = self.tesselation.point_region[i]
             region = self.tesselation.regions[tile_index]
-            tile_index = self.tesselation.point_region[i]
-            region = self.tesselation.regions[tile_index]
-            points = numpy.array([self.tesselation.vertices[j] for j in region])
-            job_list[i] = (region, points)
-        self.tile_content_list = self.pool.map(_tile_content, job_list)
+            if -1 in region or len(region) == 0: # points at infinity
+                region_list.append(None)
+            else:
+                region_list.append(numpy.array(region, dtype=int))
+        vertices = numpy.ascontiguousarray(self.tesselation.vertices,
+                                           dtype=float)
+        if self.pool is None:
+            tile_list = [None if region is None else vertices[region] \
+                                                    for region in region_list]
+            self.tile_content_list = _tile_content(tile_list)
+            return
+        # several small batches per process, so that the load is balanced
+        # when some batches are slower than others
+        batch_size = len(region_list)//(self.n_procs*self.batches_per_process)
+        batch_size = min(max(batch_size, 1), self.batch_size)
+        shared = shared_memory.SharedMemory(create=True,
+                                            size=max(vertices.nbytes, 1))
+        shared_vertices = None
+        try:
+            shared_vertices = numpy.ndarray(vertices.shape, dtype=float,
+                                            buffer=shared.buf)
+            shared_vertices[:] = vertices
+            job_list = [(shared.name, vertices.shape,
+                         region_list[i:i+batch_size]) \
+                              for i in range(0, len(region_list), batch_size)]
+            content_list = self.pool.map(_tile_content_shared, job_list, 1)
+        finally:
+            del shared_vertices # release the buffer before closing
+            shared.close()
+            shared.unlink()
+        self.tile_content_list = numpy.zeros([0])
+        if len(content_list) > 0:
+            self.tile_content_list = numpy.hstack(content_list)
+
+    @staticmethod
+    def simplex_content(points, simplices):
+        """
+        Calculate the content of a set of simplices
+        - points: numpy array with shape (number of points, dimension)
+        - simplices: integer numpy array with shape (number of simplices,
+          dimension+1); each row holds the indices in points of the vertices
+          of one simplex
+
+        The content of a simplex with vertices v_0 ... v_d is
+        |det(v_1-v_0, ..., v_d-v_0)|/d!. All of the determinants are calculated
+        in a single call to numpy.
+
+        Returns a numpy array of contents, one for each simplex.
+        """
+        points = numpy.asarray(points, dtype=float)
+        simplices = numpy.asarray(simplices, dtype=int)
+        dimension = points.shape[1]
+        if len(simplices) == 0:
+            return numpy.zeros([0])
+        edges = points[simplices[:, 1:]]-points[simplices[:, :1]]
+        content = numpy.abs(numpy.linalg.det(edges))/math.factorial(dimension)
+        content[numpy.logical_not(numpy.isfinite(content))] = 0. # underflow
+        return content
+
+    batch_size = 256
+    batches_per_process = 4
 
 def _init_worker():
     pass
 
-def _get_cm_matrix(simplex, triangulation, dimension):
-    elements = numpy.zeros([dimension+2, dimension+2])
-    for i in range(1, dimension+2):
-        elements[i, 0] = 1.
-        elements[0, i] = 1.
-    for i, vertex_i in enumerate(simplex):
-        for j, vertex_j in enumerate(simplex[i+1:]):
-            j += i+1
-            point_i = triangulation.points[vertex_i]
-            point_j = triangulation.points[vertex_j]
-            square = [(point_i[d] - point_j[d])**2 \
-                                             for d in xrange(dimension)]
-            length_sq = sum(square)
-            elements[i+1, j+1] = length_sq
-            elements[j+1, i+1] = length_sq
-    return elements
-
-def _tile_content(args):
+_worker_vertices = {}
+
+def _tile_content_shared(args):
     """
-    Calculate the tile content for the index at point_index
+    Calculate the tile content for a batch of tiles, taking the vertices from
+    shared memory
+    - args: tuple of (shared memory name, vertex array shape, region list)
+      where region list is a list of integer arrays indexing the vertices of
+      each tile, or None for tiles that extend to infinity
 
-    Use Cayler-Menger determinant to calculate content of an arbitrary
-    dimensional simplex.
+    The most recent shared memory block is kept attached between calls.
+    """
+    name, shape, region_list = args
+    if name not in _worker_vertices:
+        for shared, vertices in _worker_vertices.values():
+            shared.close()
+        _worker_vertices.clear()
+        shared = shared_memory.SharedMemory(name=name)
+        try: # the parent process owns the memory and unlinks it
+            resource_tracker.unregister(shared._name, "shared_memory")
+        except Exception:
+            pass
+        vertices = numpy.ndarray(shape, dtype=float, buffer=shared.buf)
+        _worker_vertices[name] = (shared, vertices)
+    vertices = _worker_vertices[name][1]
+    tile_list = [None if region is None else vertices[region] \
+                                                    for region in region_list]
+    return _tile_content(tile_list)
+
+def _tile_content(tile_list):
+    """
+    Calculate the tile content for a batch of tiles
+    - tile_list: list of numpy arrays, each holding the vertices of one tile,
+      or None for tiles that extend to infinity (which are given 0 content)
+
+    Returns a numpy array of contents, one for each tile.
     """
     try:
-        region, points = args
-        if -1 in region or len(region) == 0: # points at infinity
-            return 0.
-        dimension = numpy.shape(points)[1]
-        content = 0.
-        triangulation = scipy.spatial.Delaunay(points)
-        coefficient = (-1)**(dimension+1)/2.**dimension
-        coefficient /= numpy.math.factorial(dimension)**2.
-        for simplex in triangulation.simplices:
-            elements = _get_cm_matrix(simplex, triangulation, dimension)
-            det = numpy.linalg.det(elements)
-            if det != det: # underflow
-                det = 0.
-            this_content = (coefficient*det)**0.5
-            if this_content == this_content:
-                content += this_content
+        content = numpy.zeros([len(tile_list)])
+        points_list, simplices_list, tile_index_list = [], [], []
+        n_points = 0
+        for i, points in enumerate(tile_list):
+            if points is None:
+                continue
+            dimension = numpy.shape(points)[1]
+            if len(points) <= dimension: # flat tile has no content
+                continue
+            try:
+                facets = scipy.spatial.ConvexHull(points).simplices
+            except scipy.spatial.QhullError: # flat tile has no content
+                continue
+            # join each facet to the centroid, which is inside the tile
+            centre_index = numpy.ones([len(facets), 1], dtype=int)*len(points)
+            simplices = numpy.hstack([centre_index, facets])
+            points = numpy.vstack([points, numpy.mean(points, axis=0)])
+            points_list.append(points)
+            simplices_list.append(simplices+n_points)
+            tile_index_list.append(numpy.ones(len(simplices), dtype=int)*i)
+            n_points += len(points)
+        if len(points_list) == 0:
+            return content
+        simplex_content = HullContent.simplex_content(
+                                                numpy.vstack(points_list),
+                                                numpy.vstack(simplices_list))
+        content += numpy.bincount(numpy.hstack(tile_index_list),
+                                  simplex_content, len(tile_list))
     # python bug - can't handle KeyboardInterrupt so we convert to a 
     # RuntimeError instead
     except KeyboardInterrupt:
         raise RuntimeError("KeyboardInterrupt helper")
     return content
 
-
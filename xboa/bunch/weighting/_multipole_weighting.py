@@ -19,7 +19,6 @@
 MultipoleWeighting class
 """
 
-import bisect
 import numpy
 
 class MultipoleWeighting(object):
@@ -33,6 +32,13 @@ class MultipoleWeighting(object):
                  target_ellipse, target_mean):
         """
         Multipole weighting algorithm
+        - maximum_pole: maximum order (sum of powers) of the target moments
+        - weight_variables: list of string variable names for call to
+          Bunch.get_hit_variable(...)
+        - target_ellipse: numpy.array of shape (dimension, dimension) holding
+          the target second moments
+        - target_mean: numpy.array of shape (dimension) holding the target
+          first moments
         """
         self.maximum_moment = maximum_pole
         self.weight_variables = weight_variables
@@ -40,6 +46,7 @@ class MultipoleWeighting(object):
         self.v_g_list = None
         self.v_f_index_by_power = None
         self.v_g_index_by_power = None
+        self._v_f_keys = None
         self._moments_from_ellipse(target_mean, target_ellipse)
 
     def apply_weights(self, bunch, global_cut):
@@ -56,23 +63,41 @@ class MultipoleWeighting(object):
             weight_var = 'global_weight'
 
         # apply weights
-        hit_data = bunch.list_get_hit_variable(self.weight_variables)
-        sum_weights = 0.
-        for i, hit in enumerate(bunch):
-            w_i = 1.
-            for j, coeff in enumerate(coefficients):
-                this_w = coeff # coeff is a_j
-                index = self.v_g_index_by_power[j]
-                for k, power in enumerate(index):
-                    this_w *= hit_data[k][i]**power # this_w is a_j*x_k^power
-                w_i += this_w
-            sum_weights += w_i/len(bunch)
-            bunch[i][weight_var] *= w_i
+        hit_data = numpy.array(bunch.list_get_hit_variable(
+                                              self.weight_variables)).transpose()
+        monomials = self.monomial_matrix(hit_data, self.v_g_index_by_power)
+        w_i = 1.+numpy.dot(monomials, coefficients)
         # normalise to length of bunch
-        for hit in bunch:
-            hit[weight_var] /= sum_weights
+        w_i /= numpy.mean(w_i)
+        old_weights = numpy.array(bunch.list_get_hit_variable([weight_var])[0])
+        bunch.set_weights(old_weights*w_i, global_cut)
         return bunch
 
+    @staticmethod
+    def monomial_matrix(points, index_by_power):
+        """
+        Evaluate monomials at each point
+        - points: numpy.array of shape (n, dimension)
+        - index_by_power: list of m indices, each a list of dimension integers,
+          such that [2, 0, 1] corresponds to x_0^2*x_1^0*x_2^1
+        Returns a numpy.array of shape (n, m) where element [i, j] is monomial
+        j evaluated at point i.
+        """
+        points = numpy.asarray(points, dtype=float)
+        index_by_power = numpy.asarray(index_by_power, dtype=int)
+        n_points, n_axes = numpy.shape(points)
+        if len(index_by_power) == 0:
+            return numpy.zeros([n_points, 0])
+        max_power = numpy.amax(index_by_power)
+        # power_table[k, i, j] = points[i, j]^k
+        power_table = numpy.ones([max_power+1, n_points, n_axes])
+        for k in range(1, max_power+1):
+            power_table[k] = power_table[k-1]*points
+        monomials = numpy.ones([n_points, len(index_by_power)])
+        for j in range(n_axes):
+            monomials *= power_table[index_by_power[:, j], :, j].transpose()
+        return monomials
+
     def set_target_moments(self, moment_index_list, moment_list):
         """
         Set the desired moments
@@ -85,7 +110,8 @@ class MultipoleWeighting(object):
           moment index of [1, 1] for <x^1*px^1>
 
           So should be a list of list of ints; all list of ints should have the 
-          same length as weight_variables; each element should be unique; 
+          same length as weight_variables; each element should be unique; the
+          sum of each list of ints should be no more than maximum_pole.
         - moment_list: list of the raw, uncentred moments that the algorithm 
           will attempt to set (i.e. don't subtract the mean). Each list element
           should correspond to a moment from moment_index_list. 
@@ -101,12 +127,15 @@ class MultipoleWeighting(object):
             for index in item:
                 if type(index) != type(0):
                     raise ValueError("Index type is non-integer")
-
-        for i, item in enumerate(moment_index_list[1:]):
-            if item == moment_index_list[i]:
-               raise ValueError("Indices should be unique")
+            if sum(item) > self.maximum_moment:
+                raise ValueError("Index "+str(item)+" has order greater "+\
+                                 "than maximum_pole "+str(self.maximum_moment))
         # zip and sort
-        sorted_list = sorted(zip(moment_index_list, moment_list))
+        sorted_list = sorted(zip([list(item) for item in moment_index_list],
+                                 moment_list))
+        for i, item in enumerate(sorted_list[1:]):
+            if item[0] == sorted_list[i][0]:
+               raise ValueError("Indices should be unique")
         # unzip
         self.v_g_index_by_power, self.v_g_list = zip(*sorted_list)
 
@@ -115,47 +144,48 @@ class MultipoleWeighting(object):
         Calculate multipole coefficients
         """
         self._setup(bunch)
-        m_matrix = numpy.zeros([len(self.v_g_index_by_power),
-                                len(self.v_g_index_by_power)])
-        for i, list_i in enumerate(self.v_g_index_by_power):
-            for j, list_j in enumerate(self.v_g_index_by_power):
-                list_ij = [list_i[i1]+list_j[i1] \
-                                           for i1, index_i in enumerate(list_i)]
-                m_matrix[i, j] = \
-                      self._v_f(list_ij) - self._v_f(list_i) * self._v_g(list_j)
-        m_inverse = numpy.linalg.inv(m_matrix)
-        u_vector = numpy.zeros([len(self.v_g_index_by_power)])
-        for i, list_i in enumerate(self.v_g_index_by_power):
-            u_vector[i] = self._v_g(list_i) - self._v_f(list_i)
-        a_vector = numpy.dot(m_inverse, u_vector)
+        index_g = numpy.array(self.v_g_index_by_power, dtype=int)
+        v_g = numpy.array(self.v_g_list)
+        v_f_i = self._v_f(index_g)
+        v_f_ij = self._v_f(index_g[:, numpy.newaxis, :]+index_g[numpy.newaxis])
+        m_matrix = v_f_ij - numpy.outer(v_f_i, v_g)
+        u_vector = v_g - v_f_i
+        a_vector = numpy.linalg.solve(m_matrix, u_vector)
         return a_vector
 
-    def _v_f(self, index_list):
+    def _v_f(self, index_array):
         """
-        Get the element in v_f corresponding to index_list
+        Get the elements in v_f corresponding to index_array, a numpy.array of
+        integers whose last axis has length of weight_variables. Returns an
+        array of moments with shape given by the other axes of index_array.
         """
-        index = bisect.bisect_left(self.v_f_index_by_power, index_list)
-        v_f_ = self.v_f_list[index]
-        return v_f_
+        index = numpy.searchsorted(self._v_f_keys, self._key(index_array))
+        return numpy.asarray(self.v_f_list)[index]
 
-    def _v_g(self, index_list):
+    def _key(self, index_array):
         """
-        Get the element in v_g corresponding to index_list
+        Encode each index as a single integer; powers are at most
+        order = 2*maximum_pole, so they are digits in base order+1
         """
-        index = bisect.bisect_left(self.v_g_index_by_power, index_list)
-        v_g_ = self.v_g_list[index]
-        return v_g_
+        base = 2*self.maximum_moment+1
+        radix = base**numpy.arange(len(self.weight_variables))
+        return numpy.dot(numpy.asarray(index_array, dtype=int), radix)
 
     def _setup(self, bunch):
         """
         Calculate v_f for the bunch
         """
+        order = max([sum(item) for item in self.v_g_index_by_power])
         self.v_f_index_by_power = bunch._Bunch__bunchcore.index_by_power\
-                         (2*self.maximum_moment, len(self.weight_variables))[1:]
+                                     (2*order, len(self.weight_variables))[1:]
         self.v_f_list = bunch._Bunch__bunchcore.moment_tensor\
-                             (self.weight_variables, 2*self.maximum_moment)[1:]
-        sorted_list = sorted(zip(self.v_f_index_by_power, self.v_f_list))
-        self.v_f_index_by_power, self.v_f_list = zip(*sorted_list)
+                                     (self.weight_variables, 2*order)[1:]
+        keys = self._key(self.v_f_index_by_power)
+        sort_order = numpy.argsort(keys)
+        self._v_f_keys = keys[sort_order]
+        self.v_f_list = numpy.array(self.v_f_list)[sort_order]
+        self.v_f_index_by_power = \
+                        numpy.array(self.v_f_index_by_power)[sort_order]
 
     def _moments_from_ellipse(self, target_mean, target_ellipse):
         """
@@ -174,9 +204,3 @@ class MultipoleWeighting(object):
               indices[-1][j] += 1
               moments.append(target_ellipse[i, j])
         self.set_target_moments(indices, moments)
-
-def index_by_power():
-    pass
-
-
-
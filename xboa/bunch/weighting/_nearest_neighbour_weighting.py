@@ -0,0 +1,194 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see
+#<http://www.gnu.org/licenses/>.
+
+"""
+NearestNeighbourWeighting class should be imported directly from
+xboa.bunch.weighting
+"""
+
+import math
+import numbers
+
+try:
+    import numpy
+except ImportError:
+    pass
+try:
+    import scipy.linalg
+    import scipy.spatial
+except ImportError:
+    pass
+
+import xboa.common.config as config
+from xboa.bunch.weighting._gaussian_pdf import gaussian_pdf_array
+
+class NearestNeighbourWeighting(object):
+    """
+    NearestNeighbourWeighting class enables the user to set statistical weights
+    of Hits in a Bunch based on the local density of Hits, in the same way as
+    VoronoiWeighting.
+
+    Rather than calculating the content of a Voronoi tile, the content
+    associated with each Hit is estimated from the distance \f$r_k\f$ to its
+    k-th nearest neighbour; the hypersphere of radius \f$r_k\f$ contains k
+    other Hits so the content per Hit is\n
+        \f$ c_i = V_D r_k^D / k \f$\n
+    where \f$V_D\f$ is the content of a unit hypersphere in \f$D\f$ dimensions.
+    Neighbours are found using a KD-tree, which is much faster than a Voronoi
+    tesselation in 4 or more dimensions and does not generate unbounded tiles
+    at the edge of the distribution. The estimate is noisier than the Voronoi
+    tile content; increasing k makes it smoother but less local.
+
+    Distances are measured after transforming the Hits so that weight_ellipse
+    becomes the identity matrix, so that variables with different units are
+    treated on an equal footing. Contents are returned in the original units.
+    """
+
+    def __init__(self, weight_variables, weight_ellipse,
+                 weight_mean = None, bound = None, n_neighbours = 16):
+        """
+        Initialise the NearestNeighbourWeighting
+        - weight_variables: list of string variable names for call to
+          Bunch.get_hit_variable(...). The NearestNeighbourWeighting dimension
+          is equal to the length of the list.
+        - weight_ellipse: numpy.array corresponding to the covariance matrix of
+          the desired multivariate gaussian. Should have numpy.shape like
+          (dimension, dimension).
+        - weight_mean: numpy.array corresponding to the mean of the desired
+          multivariate gaussian. If set to None, defaults to array of 0s. Should
+          have numpy.shape like (dimension).
+        - bound: BoundingEllipse, corresponding to the maximum bound at which
+          Hits are accepted. Hits outside this bound will have weight set to 0.
+        - n_neighbours: integer number k of neighbours used to estimate the
+          density.
+
+        Requires numpy and scipy to be installed.
+
+        Returns a NearestNeighbourWeighting object.
+        """
+        config.has_numpy()
+        config.has_scipy()
+        self.dim = len(weight_variables)
+        if weight_mean is None:
+            weight_mean = numpy.array([0.]*self.dim)
+        if (self.dim,) != numpy.shape(weight_mean):
+            raise ValueError("weight_mean shape "+\
+                str(numpy.shape(weight_mean))+" should be "+\
+                str((self.dim,))
+                )
+        if numpy.shape(weight_ellipse) != (self.dim, self.dim):
+            raise ValueError("weight_ellipse shape "+\
+                    str(numpy.shape(weight_ellipse))+" should be "+\
+                    str((self.dim, self.dim))
+                )
+        if not isinstance(n_neighbours, numbers.Integral) or n_neighbours < 1:
+            raise ValueError("n_neighbours should be an integer >= 1")
+        self.bound = None
+        if bound is not None:
+            if bound.dim != self.dim:
+                raise ValueError("bound dimension should be same as "+\
+                      "NearestNeighbourWeighting dimension")
+            self.bound = bound
+        self.weight_variables = weight_variables
+        self.weight_ellipse_inv = numpy.linalg.inv(weight_ellipse)
+        self.weight_ellipse_det = numpy.linalg.det(weight_ellipse)
+        # points are whitened by solving cholesky.y = x-mean
+        self.cholesky = numpy.linalg.cholesky(weight_ellipse)
+        self.weight_mean = weight_mean
+        self.n_neighbours = int(n_neighbours)
+        self.weight_list = None
+        self.content_list = None
+        self.real_points = None
+
+    def apply_weights(self, bunch, global_cut, number_of_processes = 1):
+        """
+        Apply a weighting \f$w_i\f$ to each Hit in bunch corresponding to\n
+                    \f$ w_i = c_i f(x_i) \f$\n
+        where \f$c_i\f$ is the content associated with each Hit and
+        \f$f(x_i)\f$ is the value of a multivariate gaussian evaluated at
+        \f$x_i\f$.
+        - bunch: xboa.bunch.Bunch object. Evaluate weights for all Hits in bunch
+        - global_cut: if set to True, weighting will be applied to the hit's
+          global_weight. If set to False, weighting will be applied to the hit's
+          local_weight.
+        - number_of_processes: number of threads used by the KD-tree for
+          neighbour queries; -1 uses all available processors.
+
+        Returns None (the bunch is weighted "in-place")
+        """
+        self.real_points = bunch.list_get_hit_variable(self.weight_variables)
+        self.real_points = numpy.array(self.real_points).transpose()
+        if self.bound is not None:
+            self.real_points, not_cut = self.bound.cut_on_bound(self.real_points)
+        else:
+            not_cut = numpy.arange(len(self.real_points))
+        self.content_list = self.get_content_array(self.real_points,
+                                                   number_of_processes)
+        self.weight_list = self.get_pdf_array(self.real_points)* \
+                           self.content_list
+        hit_weights = numpy.zeros([len(bunch)])
+        hit_weights[not_cut] = self.weight_list
+        bunch.set_weights(hit_weights, global_cut)
+
+    def get_content_array(self, points, number_of_processes = 1):
+        """
+        Estimate the content associated with each point.
+        - points: numpy.array of shape (n, dimension)
+        - number_of_processes: number of threads used for neighbour queries
+        Returns a numpy.array of length n. If there are n_neighbours or fewer
+        points, there are not enough neighbours to estimate the content and a
+        ValueError is raised.
+        """
+        points = numpy.asarray(points, dtype=float).reshape(-1, self.dim)
+        if len(points) <= self.n_neighbours:
+            raise ValueError("Need more than "+str(self.n_neighbours)+\
+                             " points to estimate density")
+        whitened = scipy.linalg.solve_triangular(self.cholesky,
+                       (points-self.weight_mean).transpose(),
+                       lower=True).transpose()
+        tree = scipy.spatial.cKDTree(whitened, leafsize = 32,
+                                     balanced_tree = False,
+                                     compact_nodes = False)
+        content = numpy.zeros([len(points)])
+        # querying in tree order keeps successive queries in nearby memory
+        order = tree.indices
+        for start in range(0, len(points), self.batch_size):
+            batch = order[start:start+self.batch_size]
+            # the nearest "neighbour" is the point itself
+            distance, index = tree.query(whitened[batch],
+                                         [self.n_neighbours+1],
+                                         eps = self.eps,
+                                         workers = number_of_processes)
+            content[batch] = distance[:, 0]**self.dim
+        unit_ball = math.pi**(self.dim/2.)/math.gamma(self.dim/2.+1.)
+        content *= unit_ball*self.weight_ellipse_det**0.5/self.n_neighbours
+        return content
+
+    def get_pdf_array(self, points):
+        """
+        Calculate a multivariate gaussian at many points.
+        - points: numpy.array of shape (n, dimension)
+        Returns a numpy.array of length n holding the value of the gaussian at
+        each point.
+        """
+        return gaussian_pdf_array(points, self.weight_mean,
+                                  self.weight_ellipse_inv,
+                                  self.weight_ellipse_det)
+
+    batch_size = 2**16
+    ## approximation parameter for the KD-tree query; the k-th neighbour
+    ## distance is found to within a factor (1+eps)
+    eps = 0.
@@ -38,6 +38,7 @@ except ImportError:
 
 import xboa.common as common
 import xboa.common.config as config
+from xboa.bunch.weighting._gaussian_pdf import gaussian_pdf_array
 
 import xboa.bunch.weighting
 
@@ -126,8 +127,11 @@ class VoronoiWeighting(object):
         self.tesselation = None
         self.tile_content_list = None
         self.real_points = None
+        self.pool = None
+        self.pool_size = None
 
-    def apply_weights(self, bunch, global_cut, number_of_processes = 1):
+    def apply_weights(self, bunch, global_cut, number_of_processes = 1,
+                      max_points_per_cell = None):
         """
         Apply a weighting \f$w_i\f$ to each Hit in bunch corresponding to\n
                     \f$ w_i = c_i f(x_i) \f$\n
@@ -139,13 +143,21 @@ class VoronoiWeighting(object):
           local_weight.
         - number_of_processes: number of processes to use for calculating tile 
           content. VoronoiWeighting will use multiprocessing module to make 
-          subprocesses to calculate tile content.
+          subprocesses to calculate tile content. The worker pool is kept
+          between calls, so that weighting many bunches (e.g. one for each
+          station) only starts the processes once; call close() to stop it.
+        - max_points_per_cell: if set to None, or if there are fewer than
+          min_partition_points points, a single tesselation is made
+          containing every point. Otherwise, phase space is split into cells
+          containing at most max_points_per_cell points, which are tesselated
+          independently (in parallel if number_of_processes > 1). See
+          partitioned_content. In this case the tesselation is not stored, so
+          plot_two_d_projection is not available.
 
         Returns None (the bunch is weighted "in-place")
         """
         self.real_points = bunch.list_get_hit_variable(self.weight_variables)
-        self.real_points = zip(*tuple(self.real_points))
-        self.real_points = numpy.array(self.real_points)
+        self.real_points = numpy.array(self.real_points).transpose()
         if self.voronoi_bound != None:
             self.real_points, not_cut = \
                                self.voronoi_bound.cut_on_bound(self.real_points)
@@ -153,31 +165,159 @@ class VoronoiWeighting(object):
                                    self.voronoi_bound.bounding_points))
         else:
             points = self.real_points
-            not_cut = range(len(self.real_points))
-        self.tesselation = scipy.spatial.Voronoi(points)
-        point_list = range(len(self.real_points))
-        self.tile_content_list =  xboa.bunch.weighting.HullContent(self.tesselation, point_list, number_of_processes).tile_content_list
-        if global_cut:
-            weight = 'global_weight'
+            not_cut = numpy.arange(len(self.real_points))
+        pool = self._get_pool(number_of_processes)
+        if max_points_per_cell is None or \
+           len(points) < self.min_partition_points:
+            self.tesselation = scipy.spatial.Voronoi(points)
+            point_list = range(len(self.real_points))
+            self.tile_content_list =  xboa.bunch.weighting.HullContent(self.tesselation, point_list, number_of_processes, pool).tile_content_list
         else:
-            weight = 'local_weight'
-        self.weight_list = [None]*len(bunch)
-        for i, hit_index in enumerate(not_cut):
-            hit = bunch[hit_index]
-            pdf_target = self.get_pdf(self.real_points[i])
-            self.weight_list[i] = pdf_target*self.tile_content_list[i]
-            hit[weight] = self.weight_list[i]
-        for i, hit in enumerate(bunch):
-            if i not in not_cut:
-                hit[weight] = 0.
+            self.tesselation = None
+            self.tile_content_list = self.partitioned_content(points,
+                      len(self.real_points), max_points_per_cell, pool)
+        self.weight_list = self.get_pdf_array(self.real_points)* \
+                           self.tile_content_list
+        hit_weights = numpy.zeros([len(bunch)])
+        hit_weights[not_cut] = self.weight_list
+        bunch.set_weights(hit_weights, global_cut)
+
+    def partitioned_content(self, points, n_content, max_points_per_cell,
+                            pool = None):
+        """
+        Calculate Voronoi tile contents by tesselating overlapping cells
+        - points: numpy array of shape (n, dimension) holding all of the
+          points in the tesselation
+        - n_content: the content is calculated for the first n_content points
+          (later points, e.g. bounding points, only shape the tiles)
+        - max_points_per_cell: phase space is split by recursively halving
+          cells at the median of the widest dimension until each cell holds
+          no more than this number of points
+        - pool: multiprocessing.Pool used to tesselate cells in parallel, or
+          None to tesselate cells in this process
+
+        Each cell is tesselated together with the points in a halo around the
+        cell. A tile calculated in this way is exact if, for each vertex of
+        the tile, the sphere about the vertex passing through the generating
+        point lies inside the cell plus halo; then no point outside the halo
+        can be closer to any part of the tile. Points that fail this test are
+        tesselated again, with the halo extended to contain those spheres (or
+        doubled, for tiles that were unbounded), until the test passes or the
+        halo contains every point. Tiles of points on the convex hull of all
+        points extend to infinity and are given 0 content, as for a global
+        tesselation. Memory usage scales with the size of the largest cell
+        plus halo rather than with the number of points.
+
+        In exact arithmetic the contents are identical to those of the global
+        tesselation. In practice Qhull works to finite precision and the local
+        and global tesselations can resolve nearly degenerate vertices
+        differently, so a small fraction of tiles may differ (e.g. at the
+        1e-3 relative level for a few tiles in 3000 in 4D). Tesselating the
+        halos repeats work, so in a single process partitioning is several
+        times slower than a global tesselation; it is worthwhile when the
+        global tesselation does not fit in memory, or to spread the work over
+        many processes. apply_weights only partitions bunches with at least
+        min_partition_points points.
+
+        Returns a numpy array of tile contents, one for each of the first
+        n_content points.
+        """
+        points = numpy.asarray(points, dtype=float)
+        content = numpy.zeros([n_content])
+        wanted = numpy.ones([len(points)], dtype=bool)
+        wanted[n_content:] = False
+        hull = scipy.spatial.ConvexHull(points)
+        wanted[hull.vertices] = False # infinite tiles
+        wanted[hull.coplanar[:, 0]] = False
+        global_lower = numpy.amin(points, axis=0)
+        global_upper = numpy.amax(points, axis=0)
+        cell_list = []
+        for lower, upper, indices in _kd_partition(points,
+                                                   numpy.arange(len(points)),
+                                                   global_lower, global_upper,
+                                                   max_points_per_cell):
+            indices = indices[wanted[indices]]
+            if len(indices) > 0:
+                halo = self.halo_start*(upper-lower)/len(indices)**(1./self.dim)
+                cell_list.append((indices, lower-halo, upper+halo))
+        while len(cell_list) > 0:
+            job_list = []
+            for indices, halo_lower, halo_upper in cell_list:
+                in_halo = numpy.all((points >= halo_lower) & \
+                                    (points <= halo_upper), axis=1)
+                halo_indices = numpy.flatnonzero(in_halo)
+                local_indices = numpy.searchsorted(halo_indices, indices)
+                # beyond the outermost points there is nothing to find
+                halo_lower = numpy.where(halo_lower <= global_lower,
+                                         -numpy.inf, halo_lower)
+                halo_upper = numpy.where(halo_upper >= global_upper,
+                                         numpy.inf, halo_upper)
+                job_list.append((points[halo_indices], local_indices,
+                                 halo_lower, halo_upper))
+            if pool is None:
+                result_list = [_cell_content(job) for job in job_list]
+            else:
+                result_list = pool.map(_cell_content, job_list, 1)
+            retry_list = []
+            for cell, result in zip(cell_list, result_list):
+                indices, halo_lower, halo_upper = cell
+                cell_content, exact, ball_lower, ball_upper = result
+                content[indices[exact]] = cell_content[exact]
+                if numpy.all(exact):
+                    continue
+                indices = indices[~exact]
+                ball_lower, ball_upper = ball_lower[~exact], ball_upper[~exact]
+                lower = numpy.amin(points[indices], axis=0)
+                upper = numpy.amax(points[indices], axis=0)
+                # region that must be searched for points cutting the tiles
+                new_lower = numpy.amin(ball_lower, axis=0)
+                new_upper = numpy.amax(ball_upper, axis=0)
+                unbounded = numpy.logical_not(numpy.all(numpy.isfinite(
+                                       numpy.hstack([new_lower, new_upper]))))
+                if unbounded or numpy.all(new_lower >= halo_lower) and \
+                                numpy.all(new_upper <= halo_upper):
+                    new_lower = lower-2.*(lower-halo_lower)
+                    new_upper = upper+2.*(halo_upper-upper)
+                retry_list.append((indices, new_lower, new_upper))
+            cell_list = retry_list
+        return content
+
+    halo_start = 2.
+    ## apply_weights uses a global tesselation for fewer points than this,
+    ## even if max_points_per_cell is set
+    min_partition_points = 100000
+
+    def close(self):
+        """
+        Stop the worker processes used for calculating tile content, if any.
+        Further calls to apply_weights will start a new pool if required.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        self.pool = None
+        self.pool_size = None
+
+    def _get_pool(self, number_of_processes):
+        """
+        Return a multiprocessing.Pool with number_of_processes workers,
+        reusing the existing pool if it has the right size; return None if
+        number_of_processes is 1 or less
+        """
+        if number_of_processes <= 1:
+            return None
+        if self.pool is not None and self.pool_size != number_of_processes:
+            self.close()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(number_of_processes)
+            self.pool_size = number_of_processes
+        return self.pool
 
     def get_pdf(self, point):
         """
         Calculate a multivariate gaussian at point.
-        - bunch: xboa.bunch.Bunch object. Evaluate weights for all Hits in bunch
-        - global_cut: if set to True, weighting will be applied to the hit's
-          global_weight. If set to False, weighting will be applied to the hit's
-          local_weight.
+        - point: numpy.array of length dimension
+        Returns the value of the gaussian as a float.
         """
         norm = (2.*math.pi)**numpy.shape(point)[0]*self.weight_ellipse_det
         delta = point - self.weight_mean
@@ -186,6 +326,17 @@ class VoronoiWeighting(object):
         gauss = math.exp(arg)/norm**0.5
         return gauss
 
+    def get_pdf_array(self, points):
+        """
+        Calculate a multivariate gaussian at many points.
+        - points: numpy.array of shape (n, dimension)
+        Returns a numpy.array of length n holding the value of the gaussian at
+        each point.
+        """
+        return gaussian_pdf_array(points, self.weight_mean,
+                                  self.weight_ellipse_inv,
+                                  self.weight_ellipse_det)
+
     def plot_two_d_projection(self, projection_axes, fill_option = None,
                               lower = None, upper = None):
         """
@@ -270,8 +421,7 @@ class VoronoiWeighting(object):
         elif fill_option == "content":
             fill_data = self.tile_content_list[lower:upper]
         elif fill_option == "pdf":
-            fill_data = [self.get_pdf(point) for point in self.real_points]\
-                                                                   [lower:upper]
+            fill_data = self.get_pdf_array(self.real_points[lower:upper])
         elif fill_option == "none" or fill_option == None:
             return [0]*len(self.real_points) # always white
         else:
@@ -284,3 +434,66 @@ class VoronoiWeighting(object):
         fill_colors = [ROOT.TColor.GetColorPalette(i) for i in fill_colors]
         return fill_colors
 
+def _kd_partition(points, indices, lower, upper, max_points):
+    """
+    Recursively split the box lower, upper at the median of the dimension with
+    the largest extent, until each box contains at most max_points points.
+    Returns a list of tuples (lower, upper, indices) where indices are the
+    indices of points in the box.
+    """
+    if len(indices) <= max_points:
+        return [(lower, upper, indices)]
+    cell_points = points[indices]
+    extent = numpy.amax(cell_points, axis=0)-numpy.amin(cell_points, axis=0)
+    axis = numpy.argmax(extent)
+    if extent[axis] == 0.: # all points are identical
+        return [(lower, upper, indices)]
+    values = cell_points[:, axis]
+    median = numpy.median(values)
+    below = values <= median
+    if numpy.all(below): # many points at the maximum value
+        below = values < median
+    split_upper, split_lower = upper.copy(), lower.copy()
+    split_upper[axis] = median
+    split_lower[axis] = median
+    return _kd_partition(points, indices[below], lower, split_upper,
+                         max_points)+\
+           _kd_partition(points, indices[~below], split_lower, upper,
+                         max_points)
+
+def _cell_content(args):
+    """
+    Tesselate the points in one cell plus halo
+    - args: tuple of (points, local_indices, halo_lower, halo_upper); the
+      tile content is calculated for points[local_indices]
+
+    Returns a tuple of (content, exact, ball_lower, ball_upper) where content
+    is a numpy array of tile contents for each of local_indices, exact is a
+    boolean numpy array that is True where the tile is guaranteed to be the
+    same as in the global tesselation and ball_lower, ball_upper bound the
+    region in which points could change each tile (infinite if the tile is
+    unbounded).
+    """
+    points, local_indices, halo_lower, halo_upper = args
+    tesselation = scipy.spatial.Voronoi(points)
+    content = xboa.bunch.weighting.HullContent(tesselation, local_indices,
+                                               1).tile_content_list
+    dimension = numpy.shape(points)[1]
+    exact = numpy.zeros([len(local_indices)], dtype=bool)
+    ball_lower = numpy.ones([len(local_indices), dimension])*-numpy.inf
+    ball_upper = numpy.ones([len(local_indices), dimension])*numpy.inf
+    if numpy.all(halo_lower == -numpy.inf) and numpy.all(halo_upper == numpy.inf):
+        exact[:] = True # halo contains every point
+        return content, exact, ball_lower, ball_upper
+    for i, point_index in enumerate(local_indices):
+        region = tesselation.regions[tesselation.point_region[point_index]]
+        if -1 in region or len(region) == 0:
+            continue
+        vertices = tesselation.vertices[region]
+        radius = numpy.sum((vertices-points[point_index])**2, axis=1)**0.5
+        radius = radius[:, numpy.newaxis]
+        ball_lower[i] = numpy.amin(vertices-radius, axis=0)
+        ball_upper[i] = numpy.amax(vertices+radius, axis=0)
+        exact[i] = numpy.all(ball_lower[i] >= halo_lower) and \
+                   numpy.all(ball_upper[i] <= halo_upper)
+    return content, exact, ball_lower, ball_upper
@@ -296,6 +296,88 @@ def multisort(list_of_lists):
       list_of_lists[i][j] = horizontal_list[j][i]
   return list_of_lists
 
+def weighted_quantile(values, quantile_list, weights=None):
+  """
+  Return the weighted quantiles of a set of values, without sorting the values
+
+  - values        = list or numpy array of floats
+  - quantile_list = list of floats in the range [0, 1]; the fraction of the
+                    total weight that should lie at or below each quantile
+  - weights       = list or numpy array of statistical weights, one for each
+                    value. Values with weight <= 0 are ignored. Set to None to
+                    give every value a weight of 1.
+
+  The quantile q is the smallest value x such that the sum of weights of values
+  <= x is at least q times the total weight. Quantiles are found by recursively
+  partitioning about the (unweighted) median, so that the calculation takes
+  linear time for each quantile rather than requiring a full sort.
+
+  e.g. common.weighted_quantile([3., 1., 2., 4.], [0.5], [1., 1., 1., 5.]) will
+  return [4.]
+
+  Return value is a list of floats, one for each element of quantile_list
+  """
+  config.has_numpy()
+  values = numpy.asarray(values, dtype=float).flatten()
+  if weights is None:
+    weights = numpy.ones(values.shape)
+  else:
+    weights = numpy.asarray(weights, dtype=float).flatten()
+  if weights.shape != values.shape:
+    raise ValueError("weights should have the same length as values")
+  for quantile in quantile_list:
+    if not 0. <= quantile <= 1.:
+      raise ValueError("Quantile "+str(quantile)+" should be in range [0, 1]")
+  values, weights = values[weights > 0.], weights[weights > 0.]
+  total_weight = numpy.sum(weights)
+  if len(values) == 0 or total_weight <= 0.:
+    raise ZeroDivisionError("Trying to find quantile of data with 0 weight")
+  order = sorted(range(len(quantile_list)), key=lambda i: quantile_list[i])
+  targets = [quantile_list[i]*total_weight for i in order]
+  selected = _weighted_select(values, weights, targets)
+  quantiles_out = [None]*len(quantile_list)
+  for i, value in zip(order, selected):
+    quantiles_out[i] = value
+  return quantiles_out
+
+def _weighted_select(values, weights, targets):
+  """
+  Return the values at which the cumulative weight first reaches each target
+  (targets should be sorted in ascending order). Each step is an O(n)
+  partition of values about the median value, so the recursion halves the
+  problem size on each pass.
+  """
+  if len(values) <= 32:
+    order = numpy.argsort(values, kind='stable')
+    cumulative = numpy.cumsum(weights[order])
+    index = numpy.searchsorted(cumulative, targets, side='left')
+    index = numpy.minimum(index, len(values)-1) # floating point overrun
+    return [float(x) for x in values[order][index]]
+  pivot = numpy.partition(values, len(values)//2)[len(values)//2]
+  lower = values < pivot
+  upper = values > pivot
+  weight_lower = numpy.sum(weights[lower])
+  weight_pivot = numpy.sum(weights[values == pivot])
+  targets_lower, targets_upper, n_pivot = [], [], 0
+  for target in targets:
+    if target <= weight_lower and weight_lower > 0.:
+      targets_lower.append(target)
+    elif target <= weight_lower+weight_pivot:
+      n_pivot += 1
+    else:
+      targets_upper.append(target-weight_lower-weight_pivot)
+  selected = []
+  if len(targets_lower):
+    selected += _weighted_select(values[lower], weights[lower], targets_lower)
+  selected += [float(pivot)]*n_pivot
+  if len(targets_upper):
+    if not numpy.any(upper): # floating point overrun on the total weight
+      selected += [float(pivot)]*len(targets_upper)
+    else:
+      selected += _weighted_select(values[upper], weights[upper],
+                                   targets_upper)
+  return selected
+
 def n_bins(n_points, nx_bins=None, ny_bins=None, nz_bins=None, n_dimensions=1):
   """
   Dynamically decide a number of bins depending on the number of points in the histogram
@@ -801,23 +883,138 @@ def kill_all_subprocesses():
   for pid in __fk_subprocesses:
     os.kill(pid, signal.SIGKILL)
 
-def kolmogorov_smirnov_test(list_1, list_2):
+def kolmogorov_smirnov_test(list_1, list_2, weights_1=None, weights_2=None):
   """
-  Convenience wrapper for ROOT kolmogorov-smirnov test.
+  Kolmogorov-Smirnov test that two samples have the same parent distribution.
   - list_1 = list of floats that are sampled from some parent probability distribution
   - list_2 = list of floats that are sampled from other some parent distribution
+  - weights_1 = statistical weights for list_1, or None to weight every value by 1
+  - weights_2 = statistical weights for list_2, or None to weight every value by 1
   Returns double between 0. and 1. giving probability that list_1 and list_2 have the same parent distribution.
+
+  The probability is calculated in the same way as ROOT's TMath.KolmogorovTest,
+  but ROOT is not required. See two_sample_test for details.
   """
-  list_1 = sorted(list_1)
-  list_2 = sorted(list_2)
-  c_array_1 = ctypes.c_double*len(list_1)
-  c_array_2 = ctypes.c_double*len(list_2)
-  ca1 = c_array_1()
-  ca2 = c_array_2()
-  for i in range(len(list_1)): ca1[i]=ctypes.c_double(list_1[i])
-  for i in range(len(list_2)): ca2[i]=ctypes.c_double(list_2[i])
-  ks = ROOT.TMath.KolmogorovTest(len(list_1), ca1, len(list_2), ca2, '')
-  return ks
+  return float(two_sample_test(list_1, list_2, weights_1, weights_2)['ks_probability'])
+
+def two_sample_test(values_1, values_2, weights_1=None, weights_2=None):
+  """
+  Weighted two-sample Kolmogorov-Smirnov and Anderson-Darling tests.
+  - values_1 = list or numpy array of floats sampled from some parent
+               distribution. May be two dimensional, with one row for each
+               variable, in which case every row is tested in one call.
+  - values_2 = list or numpy array of floats sampled from some other parent
+               distribution. Should have the same number of rows as values_1
+               but may have a different number of columns.
+  - weights_1 = statistical weights for values_1; either one weight for each
+               column (shared by all rows) or the same shape as values_1. Set
+               to None to weight every value by 1. Values with weight <= 0 are
+               ignored.
+  - weights_2 = statistical weights for values_2, as weights_1.
+
+  The samples are merged and sorted once for each row and the weighted
+  empirical cumulative distributions F_1, F_2 and the pooled distribution H
+  are accumulated over the sorted values. Then
+    D   = max |F_1-F_2|
+    A^2 = n_1 n_2/(n_1+n_2) Sum (F_1-F_2)^2/(H (1-H)) dH
+  where the sum runs over distinct values and n_i is the effective number of
+  entries in each sample, (Sum w)^2/(Sum w^2), which is the number of values
+  for unweighted samples. Probabilities are taken from the asymptotic
+  distributions of the statistics; the Kolmogorov-Smirnov probability uses
+  z = D sqrt(n_1 n_2/(n_1+n_2)) in the same way as ROOT's TMath.KolmogorovTest.
+
+  Returns a dict like
+    {'ks_statistic':D, 'ks_probability':P(D), 'ad_statistic':A^2, 'ad_probability':P(A^2)}
+  where each value is a float, or a numpy array with one element for each row
+  if values_1 is two dimensional. Small probabilities indicate that the
+  samples come from different distributions.
+  """
+  config.has_numpy()
+  by_row = numpy.ndim(values_1) == 2
+  values_1, weights_1 = _two_sample_arrays(values_1, weights_1)
+  values_2, weights_2 = _two_sample_arrays(values_2, weights_2)
+  if values_1.shape[0] != values_2.shape[0]:
+    raise ValueError("values_1 and values_2 should have the same number of rows")
+  n_rows = values_1.shape[0]
+  weights_1 = numpy.where(weights_1 > 0., weights_1, 0.)
+  weights_2 = numpy.where(weights_2 > 0., weights_2, 0.)
+  sum_1 = numpy.sum(weights_1, axis=1)
+  sum_2 = numpy.sum(weights_2, axis=1)
+  if numpy.any(sum_1 <= 0.) or numpy.any(sum_2 <= 0.):
+    raise ZeroDivisionError("Trying to compare distribution with 0 weight")
+  n_1 = sum_1**2/numpy.sum(weights_1**2, axis=1)
+  n_2 = sum_2**2/numpy.sum(weights_2**2, axis=1)
+  # merge and sort; the weight of each entry goes either to sample 1 or 2
+  values = numpy.hstack([values_1, values_2])
+  frac_1 = numpy.hstack([weights_1/sum_1[:, None], numpy.zeros(weights_2.shape)])
+  frac_2 = numpy.hstack([numpy.zeros(weights_1.shape), weights_2/sum_2[:, None]])
+  order = numpy.argsort(values, axis=1, kind='stable')
+  values = numpy.take_along_axis(values, order, axis=1)
+  cdf_1 = numpy.cumsum(numpy.take_along_axis(frac_1, order, axis=1), axis=1)
+  cdf_2 = numpy.cumsum(numpy.take_along_axis(frac_2, order, axis=1), axis=1)
+  # only the last of a set of tied values is a step in the distributions
+  distinct = numpy.ones(values.shape, dtype=bool)
+  distinct[:, :-1] = values[:, 1:] != values[:, :-1]
+  delta = numpy.where(distinct, cdf_1-cdf_2, 0.)
+  ks_statistic = numpy.max(numpy.abs(delta), axis=1)
+  pooled = (n_1[:, None]*cdf_1+n_2[:, None]*cdf_2)/(n_1+n_2)[:, None]
+  pooled_step = numpy.where(distinct, pooled, 0.)
+  pooled_step -= numpy.hstack([numpy.zeros((n_rows, 1)),
+                               numpy.maximum.accumulate(pooled_step, axis=1)[:, :-1]])
+  inside = distinct & (pooled > 0.) & (pooled < 1.-1e-12)
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    integrand = numpy.where(inside, delta**2/(pooled*(1.-pooled))*pooled_step, 0.)
+  ad_statistic = n_1*n_2/(n_1+n_2)*numpy.sum(integrand, axis=1)
+  result = {
+    'ks_statistic':ks_statistic,
+    'ks_probability':_kolmogorov_probability(ks_statistic*(n_1*n_2/(n_1+n_2))**0.5),
+    'ad_statistic':ad_statistic,
+    'ad_probability':_anderson_darling_probability(ad_statistic),
+  }
+  if by_row:
+    return result
+  return dict([(key, float(value[0])) for key, value in result.items()])
+
+def _two_sample_arrays(values, weights):
+  """Return values and weights as two dimensional float arrays with one row for each variable"""
+  values = numpy.asarray(values, dtype=float)
+  if values.ndim == 1:
+    values = values[None, :]
+  if weights is None:
+    weights = numpy.ones(values.shape)
+  weights = numpy.asarray(weights, dtype=float)
+  weights = numpy.broadcast_to(weights, values.shape)
+  return values, weights
+
+def _kolmogorov_probability(z_array):
+  """
+  Return the probability that the Kolmogorov distance times sqrt(n) is
+  greater than z, Q(z) = 2 Sum_{j>0} (-1)^(j-1) exp(-2 j^2 z^2)
+  """
+  z_array = numpy.asarray(z_array, dtype=float)
+  j = numpy.arange(1, 101)[:, None]
+  terms = 2.*(-1.)**(j-1)*numpy.exp(-2.*j**2*z_array[None, :]**2)
+  # for small z the series converges slowly, use the theta function form;
+  # Q(z) is 1 to double precision below z = 0.05
+  z_small = numpy.maximum(z_array, 0.05)
+  small = (2.*math.pi)**0.5/z_small* \
+          numpy.sum(numpy.exp(-(2*j-1)**2*math.pi**2/8./z_small[None, :]**2), axis=0)
+  probability = numpy.where(z_array < 1., 1.-small, numpy.sum(terms, axis=0))
+  return numpy.clip(probability, 0., 1.)
+
+def _anderson_darling_probability(a_squared):
+  """
+  Return the probability that the asymptotic Anderson-Darling statistic is
+  greater than a_squared, using the approximation of Marsaglia and Marsaglia,
+  J. Stat. Soft. 9 (2004)
+  """
+  z = numpy.maximum(numpy.asarray(a_squared, dtype=float), 1e-300)
+  with numpy.errstate(over='ignore', under='ignore'):
+    low = numpy.exp(-1.2337141/z)/z**0.5*(2.00012+(0.247105-(0.0649821- \
+          (0.0347962-(0.011672-0.00168691*z)*z)*z)*z)*z)
+    high = numpy.exp(-numpy.exp(1.0776-(2.30695-(0.43424-(0.082433- \
+           (0.008056-0.0003146*z)*z)*z)*z)*z))
+  return numpy.clip(1.-numpy.where(z < 2., low, high), 0., 1.)
 
 def __atexit():
   """Calls some functions automatically at exit"""
@@ -951,39 +1148,109 @@ def process_list(function_call, list_of_args, max_n_processes):
   pool.close()
   return out_list
 
-def _sum_weight(weights, in_cut):
-  n_points = len(in_cut)
-  return sum([weights[i] for i in range(n_points) if in_cut[i]])
-
-def _get_fit_ellipse_covariance_matrix(points, weights, in_cut):
-    n_points = len(points)
-    sum_weight = _sum_weight(weights, in_cut)
-    dimension = len(points[0])
-    mean = numpy.zeros(dimension)
-    cov = numpy.zeros([dimension, dimension])
-    for i in range(n_points):
-        if in_cut[i]:
-            a_point = points[i]
-            for j in range(dimension):
-                mean[j] += a_point[j]/sum_weight*weights[i]
-                for k in range(dimension):
-                    cov[j, k] += a_point[j]*a_point[k]/sum_weight*weights[i]
-    for i in range(dimension):
-        for j in range(dimension):
-            cov[i, j] -= mean[i]*mean[j]
-    return mean, cov
-
-def _update_fit_ellipse_cut(points, cov_inv, mean, eps_cut):
-    n_points = len(points)
-    n_dim = 2
-    in_cut = [True for i in range(n_points)]
-    sqrt_det_inv = numpy.linalg.det(cov_inv)**(1./float(n_dim))
-    for i in range(n_points):
-        vec = numpy.array(points[i])-mean
-        vec_t = numpy.transpose(vec)
-        eps = numpy.dot(vec_t, numpy.dot(cov_inv, vec))/sqrt_det_inv
-        in_cut[i] = eps < eps_cut
-    return in_cut
+class EllipseFitter(object):
+    """
+    Fit an ellipse of arbitrary dimension n to a set of points by iteratively
+    cutting on a normalised chi-squared and recalculating the weighted
+    covariance matrix of the points that pass the cut. This is the engine
+    behind fit_ellipse.
+
+    Points are held in an (n_points, n) numpy array; each iteration is a
+    masked weighted covariance over the array and a vectorised calculation of
+    eps for every point. Iteration stops when the set of points in the cut no
+    longer changes, as further iterations would give the same ellipse.
+    """
+    def __init__(self, points, weights=None):
+        """
+        Initialise the fitter
+
+        - points iterable of points; each point should be an iterable of floats
+                 of length n
+        - weights list of floats, one for each point; use statistically
+                 weighted particles for the fit. Set to None to ignore weights.
+
+        The points are only converted to a numpy array once, so the fitter can
+        be reused for several fits, e.g. with different cut values.
+        """
+        config.has_numpy()
+        self.points = numpy.array(points, dtype=float)
+        if self.points.ndim != 2:
+            raise ValueError("points should be a list of points, each of "+\
+                             "the same length")
+        if weights is None:
+            weights = numpy.ones(self.points.shape[0])
+        self.weights = numpy.array(weights, dtype=float)
+        if self.weights.shape != (self.points.shape[0],):
+            raise ValueError("weights should have one value for each point")
+        self.in_cut = numpy.ones(self.points.shape[0], dtype=bool)
+        self.mean = None
+        self.cov = None
+        self.iterations = 0
+
+    def moments(self, in_cut=None):
+        """
+        Return the weighted mean vector and covariance matrix of points
+
+        - in_cut boolean numpy array, one element for each point; only points
+                 for which in_cut is True are included. Set to None to include
+                 all points.
+        """
+        weights = self.weights
+        if in_cut is not None:
+            weights = numpy.where(in_cut, weights, 0.)
+        sum_weight = numpy.sum(weights)
+        if sum_weight == 0.:
+            raise ZeroDivisionError("No weight in the ellipse cut")
+        mean = numpy.dot(weights, self.points)/sum_weight
+        delta = self.points-mean
+        cov = numpy.dot(delta.transpose()*weights, delta)/sum_weight
+        return mean, cov
+
+    def eps(self, mean, cov):
+        """
+        Return a numpy array of the normalised chi-squared for every point
+
+        - mean centre vector of the ellipse
+        - cov matrix defining the ellipse
+
+        eps = (x-mean)^T*V^{-1}*(x-mean)*|V|**{1/n}
+        """
+        n_dim = len(mean)
+        delta = self.points-mean
+        cov_inv = numpy.linalg.inv(cov)
+        chi_squared = numpy.einsum('ij,jk,ik->i', delta, cov_inv, delta)
+        return chi_squared*numpy.linalg.det(cov)**(1./n_dim)
+
+    def sum_weight(self):
+        """Return the sum of weights of points in the cut"""
+        return float(numpy.sum(self.weights[self.in_cut]))
+
+    def fit(self, eps_cut, max_number_of_iterations=10):
+        """
+        Fit the ellipse
+
+        - eps_cut float cut value; only particles with 
+                  eps = x^T*V^{-1}*x*|V|**{1/n} < eps_{cut}
+                  are considered. The cut value is a normalised chi-squared.
+                  It should be positive.
+        - max_number_of_iterations integer maximum number of iterations
+
+        Returns ellipse centre vector <x> and defining matrix V. After each
+        iteration, mean, cov, in_cut and iterations are updated, so if an
+        iteration fails (e.g. a singular matrix is found) the last good
+        iteration can be recovered.
+        """
+        self.in_cut = numpy.ones(self.points.shape[0], dtype=bool)
+        self.mean, self.cov, self.iterations = None, None, 0
+        while self.iterations < max_number_of_iterations:
+            self.iterations += 1
+            self.mean, self.cov = self.moments(self.in_cut)
+            in_cut = self.eps(self.mean, self.cov) < eps_cut
+            converged = numpy.array_equal(in_cut, self.in_cut)
+            self.in_cut = in_cut
+            if converged:
+                break
+        return self.mean, self.cov
 
 def fit_ellipse(points, eps_cut, weights=None, max_number_of_iterations = 10, verbose = True):
     """
@@ -999,41 +1266,31 @@ def fit_ellipse(points, eps_cut, weights=None, max_number_of_iterations = 10, ve
               particles for the fit. Set to None to ignore weights.
     - max_number_of_iterations integer number of iterations; the ellipse fitting
               procedure is repeated several times to attempt to improve the
-              fit of the ellipse. This sets a maximum number of repetitions.
+              fit of the ellipse. This sets a maximum number of repetitions;
+              fitting stops early if the points in the cut do not change.
     - verbose set to True to provide some verbose output during fitting
 
     Returns ellipse centre vector <x> and defining matrix V. The ensemble of 
     points on the ellipse is given by (x-<x>)^T*V^{-1}*(x-<x>) where x is a
-    particle vector and V is the defining matrix.
+    particle vector and V is the defining matrix. See EllipseFitter for a
+    reusable version.
     """
-    n_points = len(points)
-    old_det = 1.
-    mean, cov = numpy.ones([2]), numpy.ones([2, 2])
-    in_cut = [True for i in range(n_points)]
-    if weights == None:
-        weights = [1.,]*n_points
-    iterations = 0
+    fitter = EllipseFitter(points, weights)
     try:
-        while abs(numpy.linalg.det(cov)-old_det) > float_tolerance and \
-              iterations < max_number_of_iterations:
-            iterations += 1
-            my_sum = 0
-            for i in in_cut:
-                if i == True:
-                    my_sum += 1
-            old_det = numpy.linalg.det(cov)
-            mean, cov = _get_fit_ellipse_covariance_matrix(points, weights, in_cut)
-            mat_inv = numpy.linalg.inv(cov)
-            in_cut = _update_fit_ellipse_cut(points, mat_inv, mean, eps_cut)
+        fitter.fit(eps_cut, max_number_of_iterations)
     except Exception:
         if verbose:
             print("xboa.common.fit_ellipse(...) failed to converge; final iteration as follows.")
             sys.excepthook(*sys.exc_info())
+    mean, cov = fitter.mean, fitter.cov
+    if mean is None:
+        n_dim = fitter.points.shape[1]
+        mean, cov = numpy.ones([n_dim]), numpy.ones([n_dim, n_dim])
     if verbose:
-        print('Weight in cut:\n', _sum_weight(weights, in_cut))
+        print('Weight in cut:\n', fitter.sum_weight())
         print("Means:\n", mean)
         print("Ellipse:\n", cov)
-        print("Number of iterations:\n", iterations)
+        print("Number of iterations:\n", fitter.iterations)
     return mean, cov
 
 def make_root_ellipse_function(mean, cov, contours=None, xmin=-1e3, xmax=1e3, ymin=-1e3, ymax=1e3):
@@ -1084,10 +1341,10 @@ def common_overview_doc(verbose = False):
 
   name_list = ['math', 'root', 'matplot', 'data', 'defaults', 'other_stuff']
   function_list = {
-  'math'        : ['min_max', 'multisort', 'nd_newton_raphson1', 'nd_newton_raphson2'],
+  'math'        : ['min_max', 'multisort', 'weighted_quantile', 'nd_newton_raphson1', 'nd_newton_raphson2'],
   'root'        : ['make_root_graph', 'make_root_histogram', 'make_root_multigraph', 'clear_root',  'wait_for_root', 'make_root_canvas'],
   'matplot'     : ['make_matplot_graph', 'make_matplot_histogram', 'make_matplot_multigraph', 'make_matplot_scatter', 'wait_for_matplot', 'matplot_show_and_continue'],
-  'other_stuff' : ['get_bin_edges', 'histogram', 'substitute', 'build_installation', 'make_grid', 'make_shell', 'normalise_vector', 'kolmogorov_smirnov_test', 'kill_all_subprocesses'],
+  'other_stuff' : ['get_bin_edges', 'histogram', 'substitute', 'build_installation', 'make_grid', 'make_shell', 'normalise_vector', 'kolmogorov_smirnov_test', 'two_sample_test', 'kill_all_subprocesses'],
   'data'        : ['constants', 'pdg_pid_to_icool', 'pdg_pid_to_mars', 'pdg_pid_to_mass', 'pdg_pid_to_name', 'pdg_pid_to_charge', 'icool_pid_to_pdg', 'mars_pid_to_pdg', 'units'],
   'defaults'    : ['canvas_fill_color', 'canvas_highlight_color', 'default_margin', 'float_tolerance', 'graph_margin', 'histo_margin', 'python_version', 'xboa_version', 'kill_subprocesses_at_exit']
   }
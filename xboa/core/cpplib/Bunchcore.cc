@@ -250,5 +250,33 @@ bool Bunchcore::cut_double(const std::string cut_variable,
     }
     return true;
 }
+
+bool Bunchcore::set_weights(const std::vector<double>& weights,
+                            const bool is_global) {
+    if (weights.size() != hitcores_.size())
+        return false;
+    if (!is_global) {
+        for (size_t i = 0; i < hitcores_.size(); ++i) {
+            Hitcore* hc = hitcores_[i].get();
+            if (hc != NULL)
+                hc->set_local_weight(weights[i]);
+        }
+        return true;
+    }
+    std::vector<WeightContext::HitId> ids;
+    std::vector<double> global_weights;
+    ids.reserve(hitcores_.size());
+    global_weights.reserve(hitcores_.size());
+    for (size_t i = 0; i < hitcores_.size(); ++i) {
+        Hitcore* hc = hitcores_[i].get();
+        if (hc == NULL)
+            continue;
+        ids.push_back(WeightContext::HitId(hc->spill(), hc->event(),
+                                           hc->particle()));
+        global_weights.push_back(weights[i]);
+    }
+    Hitcore::weightContext->setWeights(ids, global_weights);
+    return true;
+}
 }
 }
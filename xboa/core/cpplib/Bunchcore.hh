@@ -110,6 +110,15 @@ public:
                     const double cut_value,
                     const bool is_global);
 
+    /** Set statistical weights of all hitcores in the bunch
+     *  - weights: vector of weights, one for each hitcore (including NULL
+     *    hitcores, which are ignored)
+     *  - is_global: set to true to set global weights, in a single bulk
+     *    update of the current weight context; or false to set local weights
+     *  Return true on success, false if weights has the wrong length
+     */
+    bool set_weights(const std::vector<double>& weights, const bool is_global);
+
     /** Optimisation when getting many moments. Get all natural moments up to
      *  some maximum order "max_order".
      *  - axes: set of variables for which moments will be calculated; should be
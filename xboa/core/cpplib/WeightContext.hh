@@ -15,8 +15,11 @@
  *  <http://www.gnu.org/licenses/>.
 **/
 
+#include <algorithm>
 #include <map>
+#include <memory>
 #include <stdexcept>
+#include <vector>
 #include "utils/SmartPointer.hh"
 
 #ifndef xboa_core_cpplib_WeightContext_hh
@@ -35,6 +38,9 @@ namespace core {
  *  Weight contexts can be combined arithmetically , for example multiplied together
  *  or added.
  *
+ *  Copies of a weight context share the underlying weights map until one of
+ *  them is modified ("copy-on-write"), so that taking a snapshot of a context
+ *  is cheap however many weights it holds.
  */
 class WeightContext {
   public:
@@ -64,9 +70,20 @@ class WeightContext {
     /** Get the weight for a hit id.
      */
     inline void setWeight(const HitId& id, const double& weight);
+    /** Set the weight for many hit ids. ids and weights should have the same
+     *  length; if an id appears more than once, the last weight is used.
+     *  Inserting in sorted order makes this O(N) for a new context.
+     */
+    inline void setWeights(const std::vector<HitId>& ids,
+                           const std::vector<double>& weights);
+    /** Get the weight for many hit ids.
+     */
+    inline std::vector<double> getWeights(const std::vector<HitId>& ids) const;
     /** Clear all weights.
      */
     inline void clearWeights();
+    /** Return true if this shares its weights map with another context */
+    inline bool isShared() const;
 
     /** Add hitIds in rhs to *this::globalWeightsContext_ and set the new
      *  weights to the default. To be explicit, we don't set the weights from
@@ -101,7 +118,10 @@ class WeightContext {
     inline void setDefaultWeight(const double& weight);
 
   private:
-    std::map<HitId, double> globalWeightsContext_;
+    /** Make a private copy of the weights map if it is shared */
+    inline void detach();
+
+    std::shared_ptr<std::map<HitId, double> > globalWeightsContext_;
     double defaultWeight_ = 1.0;
     //static SmartPointer<WeightContext> currentContext;
 };
@@ -18,7 +18,8 @@
 namespace xboa {
 namespace core {
 
-WeightContext::WeightContext() {
+WeightContext::WeightContext()
+    : globalWeightsContext_(new std::map<HitId, double>()) {
 }
 
 WeightContext::~WeightContext() {
@@ -43,106 +44,148 @@ WeightContext& WeightContext::operator=(const WeightContext& rhs) {
     return *this;
 }
 
+void WeightContext::detach() {
+    if (globalWeightsContext_.use_count() > 1) {
+        globalWeightsContext_.reset(
+                         new std::map<HitId, double>(*globalWeightsContext_));
+    }
+}
+
+bool WeightContext::isShared() const {
+    return globalWeightsContext_.use_count() > 1;
+}
+
 double WeightContext::getWeight(const HitId& id) const {
-    std::map<HitId, double>::const_iterator it = globalWeightsContext_.find(id);
-    if (it == globalWeightsContext_.end()) {
+    std::map<HitId, double>::const_iterator it = globalWeightsContext_->find(id);
+    if (it == globalWeightsContext_->end()) {
         return defaultWeight_;
     }
     return it->second;
 }
 
 void WeightContext::setWeight(const HitId& id, const double& weight) {
-    globalWeightsContext_[id] = weight;
+    detach();
+    (*globalWeightsContext_)[id] = weight;
 }
 
-void WeightContext::clearWeights() {
-    globalWeightsContext_.clear();
+void WeightContext::setWeights(const std::vector<HitId>& ids,
+                               const std::vector<double>& weights) {
+    if (ids.size() != weights.size()) {
+        throw std::invalid_argument("ids and weights have different length");
+    }
+    detach();
+    // sort so that each insertion can use the previous one as a hint
+    std::vector<size_t> order(ids.size());
+    for (size_t i = 0; i < order.size(); ++i) {
+        order[i] = i;
+    }
+    std::stable_sort(order.begin(), order.end(),
+                     [&ids](size_t i, size_t j) {return ids[i] < ids[j];});
+    std::map<HitId, double>& weights_map = *globalWeightsContext_;
+    std::map<HitId, double>::iterator hint = weights_map.begin();
+    for (size_t i = 0; i < order.size(); ++i) {
+        hint = weights_map.insert_or_assign(hint, ids[order[i]],
+                                            weights[order[i]]);
+    }
+}
 
+std::vector<double> WeightContext::getWeights(
+                                      const std::vector<HitId>& ids) const {
+    std::vector<double> weights(ids.size());
+    for (size_t i = 0; i < ids.size(); ++i) {
+        weights[i] = getWeight(ids[i]);
+    }
+    return weights;
+}
+
+void WeightContext::clearWeights() {
+    globalWeightsContext_.reset(new std::map<HitId, double>());
 }
 
 void WeightContext::adoptHits(const WeightContext& rhs) {
-    std::map<HitId, double>::iterator hint = globalWeightsContext_.begin();
-    for (std::map<HitId, double>::const_iterator it = rhs.globalWeightsContext_.begin(); it != rhs.globalWeightsContext_.end(); ++it) {
+    detach();
+    std::map<HitId, double>::iterator hint = globalWeightsContext_->begin();
+    for (std::map<HitId, double>::const_iterator it = rhs.globalWeightsContext_->begin(); it != rhs.globalWeightsContext_->end(); ++it) {
         // should only insert if not found in the map (according to c++.com)
-        globalWeightsContext_.insert(hint, std::pair<HitId, double>(it->first, defaultWeight_));
+        globalWeightsContext_->insert(hint, std::pair<HitId, double>(it->first, defaultWeight_));
     }
 }
 
 void WeightContext::add(const WeightContext& rhs) {
     adoptHits(rhs); // SHOULD now have all of rhs hits in this->globalWeightsContext_
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
         const HitId& id = it->first;
-        globalWeightsContext_[id] += rhs.getWeight(id);
+        it->second += rhs.getWeight(id);
     }
     defaultWeight_ += rhs.defaultWeight_;
 }
 
 void WeightContext::subtract(const WeightContext& rhs) {
     adoptHits(rhs); // SHOULD now have all of rhs hits in this->globalWeightsContext_
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
         const HitId& id = it->first;
-        globalWeightsContext_[id] -= rhs.getWeight(id);
+        it->second -= rhs.getWeight(id);
     }
     defaultWeight_ -= rhs.defaultWeight_;
 }
 
 void WeightContext::multiply(const WeightContext& rhs) {
     adoptHits(rhs); // SHOULD now have all of rhs hits in this->globalWeightsContext_
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
         const HitId& id = it->first;
-        globalWeightsContext_[id] *= rhs.getWeight(id);
+        it->second *= rhs.getWeight(id);
     }
     defaultWeight_ *= rhs.defaultWeight_;
 }
 
 void WeightContext::divide(const WeightContext& rhs) {
     adoptHits(rhs); // SHOULD now have all of rhs hits in this->globalWeightsContext_
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
         const HitId& id = it->first;
-        globalWeightsContext_[id] /= rhs.getWeight(id);
+        it->second /= rhs.getWeight(id);
     }
     defaultWeight_ /= rhs.defaultWeight_;
 }
 
 void WeightContext::add(const double& rhs) {
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
-        const HitId& id = it->first;
-        globalWeightsContext_[id] += rhs;
+    detach();
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
+        it->second += rhs;
     }
     defaultWeight_ += rhs;
 }
 
 void WeightContext::subtract(const double& rhs) {
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
-        const HitId& id = it->first;
-        globalWeightsContext_[id] -= rhs;
+    detach();
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
+        it->second -= rhs;
     }
     defaultWeight_ -= rhs;
 }
 
 void WeightContext::multiply(const double& rhs) {
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
-        const HitId& id = it->first;
-        globalWeightsContext_[id] *= rhs;
+    detach();
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
+        it->second *= rhs;
     }
     defaultWeight_ *= rhs;
 }
 
 void WeightContext::divide(const double& rhs) {
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
-        const HitId& id = it->first;
-        globalWeightsContext_[id] /= rhs;
+    detach();
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
+        it->second /= rhs;
     }
     defaultWeight_ /= rhs;
 }
 
 void WeightContext::op_not() {
-    for (std::map<HitId, double>::const_iterator it = globalWeightsContext_.begin(); it != globalWeightsContext_.end(); ++it) {
-        const HitId& id = it->first;
+    detach();
+    for (std::map<HitId, double>::iterator it = globalWeightsContext_->begin(); it != globalWeightsContext_->end(); ++it) {
         if (it->second == 0.0) {
-            globalWeightsContext_[id] = defaultWeight_;
+            it->second = defaultWeight_;
         } else {
-            globalWeightsContext_[id] = 0.0;
+            it->second = 0.0;
         }
     }
     defaultWeight_ = 0.0;
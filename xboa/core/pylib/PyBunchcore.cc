@@ -34,6 +34,13 @@ namespace xboa {
 namespace core {
 namespace PyBunchcore {
 
+/** Hitcore::weightContext in this library is separate from the one in
+ *  _hitcore, so it is updated from _hitcore before weights are used, in case
+ *  the context was changed by Hitcore.set_weight_context. Returns false on
+ *  failure and sets a Python error.
+ */
+bool setWeightContext();
+
 PyObject *alloc(PyTypeObject *type, Py_ssize_t nitems) {
     PyBunchcore* bc = new PyBunchcore();
     Py_SET_REFCNT(bc, 1);
@@ -206,6 +213,8 @@ std::string moment_docstring =
     std::string("Return value is a float.\n");
 
 PyObject* moment(PyObject* self, PyObject *args, PyObject *kwds) {
+    if (!setWeightContext())
+        return NULL;
     Bunchcore* bc = reinterpret_cast<PyBunchcore*>(self)->bunchcore_;
     if (bc == NULL) { // not possible! (Haha)
         PyErr_SetString(PyExc_TypeError,
@@ -261,6 +270,8 @@ std::string covariance_matrix_docstring =
     std::string("Return value is a list of list of floats.\n");
 
 PyObject* covariance_matrix(PyObject* self, PyObject *args, PyObject *kwds) {
+    if (!setWeightContext())
+        return NULL;
     Bunchcore* bc = reinterpret_cast<PyBunchcore*>(self)->bunchcore_;
     if (bc == NULL) { // not possible! (Haha)
         PyErr_SetString(PyExc_TypeError,
@@ -318,6 +329,8 @@ std::string cut_double_docstring =
     std::string("Returns None\n");
 
 PyObject* cut_double(PyObject* self, PyObject *args, PyObject *kwds) {
+    if (!setWeightContext())
+        return NULL;
     Bunchcore* bc = reinterpret_cast<PyBunchcore*>(self)->bunchcore_;
     if (bc == NULL) { // not possible! (Haha)
         PyErr_SetString(PyExc_TypeError,
@@ -361,10 +374,51 @@ PyObject* cut_double(PyObject* self, PyObject *args, PyObject *kwds) {
     Py_RETURN_NONE;
 }
 
+std::string set_weights_docstring =
+    std::string("Set statistical weights of all hits in the bunch.\n")+
+    std::string(" - weights: sequence of floats (e.g. a numpy array), one\n")+
+    std::string("   for each hit.\n")+
+    std::string(" - is_global: set to True to change global_weight, in a\n")+
+    std::string("   single update of the current weight context; or False\n")+
+    std::string("   to change local_weight\n")+
+    std::string("Returns None\n");
+
+PyObject* set_weights(PyObject* self, PyObject *args, PyObject *kwds) {
+    if (!setWeightContext())
+        return NULL;
+    Bunchcore* bc = reinterpret_cast<PyBunchcore*>(self)->bunchcore_;
+    if (bc == NULL) { // not possible! (Haha)
+        PyErr_SetString(PyExc_TypeError,
+                        "Failed to interpret self as a Bunchcore");
+        return NULL;
+    }
+    // Extract arguments
+    static char *kwlist[] = {const_cast<char*>("weights"),
+                             const_cast<char*>("is_global"),
+                             NULL};
+    PyObject *py_weights = NULL;
+    PyObject *py_is_global = NULL;
+    if (PyArg_ParseTupleAndKeywords(args, kwds, "OO|", kwlist,
+                                    &py_weights, &py_is_global) == 0)
+        return NULL;
+    std::vector<double> weights;
+    if (!PyCppSequenceToVectorConverter<double>().convert(py_weights, &weights))
+        return NULL;
+    bool is_global = PyObject_IsTrue(py_is_global) == 1;
+    if (!bc->set_weights(weights, is_global)) {
+        PyErr_SetString(PyExc_ValueError,
+                        "Length of weights should be the same as the bunch");
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
 std::string moment_tensor_docstring =
     std::string("\n");
 
 PyObject* moment_tensor(PyObject* self, PyObject *args, PyObject *kwds) {
+    if (!setWeightContext())
+        return NULL;
     Bunchcore* bc = reinterpret_cast<PyBunchcore*>(self)->bunchcore_;
     if (bc == NULL) { // not possible! (Haha)
         PyErr_SetString(PyExc_TypeError,
@@ -454,6 +508,7 @@ static PyMethodDef Bunchcore_methods[] = {
     {"moment",    (PyCFunction)moment, METH_VARARGS|METH_KEYWORDS, moment_docstring.c_str()},
     {"covariance_matrix", (PyCFunction)covariance_matrix, METH_VARARGS|METH_KEYWORDS, covariance_matrix_docstring.c_str()},
     {"cut_double", (PyCFunction)cut_double, METH_VARARGS|METH_KEYWORDS, cut_double_docstring.c_str()},
+    {"set_weights", (PyCFunction)set_weights, METH_VARARGS|METH_KEYWORDS, set_weights_docstring.c_str()},
     {"moment_tensor", (PyCFunction)moment_tensor, METH_VARARGS|METH_KEYWORDS, moment_tensor_docstring.c_str()},
     {"index_by_power", (PyCFunction)index_by_power, METH_VARARGS|METH_KEYWORDS, index_by_power_docstring.c_str()},
     {NULL}
@@ -526,14 +581,28 @@ static struct PyModuleDef bunchcoredef = {
     NULL,                /* m_free */
 };
 
-void setWeightContext() {
-    PyObject* hc_module = PyImport_ImportModule("xboa.core._hitcore");
-    PyObject* hc_class = PyObject_GetAttrString(hc_module, "Hitcore");
-    PyObject* get_context = PyObject_GetAttrString(hc_class, "get_weight_context");
-    PyObject* empty_tuple = PyTuple_New(0);
-    PyObject* pyobj_wc = PyObject_CallObject(get_context, empty_tuple);
+bool setWeightContext() {
+    static PyObject* get_context = NULL;
+    if (get_context == NULL) {
+        PyObject* hc_module = PyImport_ImportModule("xboa.core._hitcore");
+        if (hc_module == NULL)
+            return false;
+        PyObject* hc_class = PyObject_GetAttrString(hc_module, "Hitcore");
+        Py_DECREF(hc_module);
+        if (hc_class == NULL)
+            return false;
+        get_context = PyObject_GetAttrString(hc_class, "get_weight_context");
+        Py_DECREF(hc_class);
+        if (get_context == NULL)
+            return false;
+    }
+    PyObject* pyobj_wc = PyObject_CallNoArgs(get_context);
+    if (pyobj_wc == NULL)
+        return false;
     PyWeightContext::PyWeightContext* pywc = reinterpret_cast<PyWeightContext::PyWeightContext*>(pyobj_wc);
     Hitcore::weightContext = pywc->cppcontext_;
+    Py_DECREF(pyobj_wc);
+    return true;
 }
 
 
@@ -566,7 +635,8 @@ PyMODINIT_FUNC PyInit__bunchcore(void) {
     PyDict_SetItemString(bc_dict, "C_API_CREATE_EMPTY_BUNCHCORE", ceb_c_api);
     PyDict_SetItemString(bc_dict, "C_API_GET_BUNCHCORE", gbc_c_api);
     PyDict_SetItemString(bc_dict, "C_API_SET_BUNCHCORE", sbc_c_api);
-    setWeightContext();
+    if (!setWeightContext())
+        return NULL;
     return module;
 }
 
@@ -127,6 +127,108 @@ PyObject* getWeight(PyObject* self, PyObject *args, PyObject *kwds) {
     return Py_BuildValue("d", weight); // success, return a double
 }
 
+/** Convert three python sequences of spill, event and particle numbers to ids
+ */
+bool getHitIds(PyObject* py_spill, PyObject* py_event, PyObject* py_particle,
+               std::vector<HitId>* ids) {
+    std::vector<int> spill, event, particle;
+    PyCppSequenceToVectorConverter<int> int_conv;
+    if (!int_conv.convert(py_spill, &spill) ||
+        !int_conv.convert(py_event, &event) ||
+        !int_conv.convert(py_particle, &particle)) {
+        return false;
+    }
+    if (spill.size() != event.size() || spill.size() != particle.size()) {
+        PyErr_SetString(PyExc_ValueError,
+                        "spill, event and particle should have the same length");
+        return false;
+    }
+    ids->clear();
+    ids->reserve(spill.size());
+    for (size_t i = 0; i < spill.size(); ++i) {
+        ids->push_back(HitId(spill[i], event[i], particle[i]));
+    }
+    return true;
+}
+
+PyObject* setWeights(PyObject* self, PyObject *args, PyObject *kwds) {
+    // self was not initialised - something horrible happened
+    if (!C_API::is_PyWeightContext(self)) {
+        PyErr_SetString(PyExc_TypeError, "Failed to parse self as a PyWeightContext");
+        return NULL;
+    }
+    PyWeightContext* pywc = reinterpret_cast<PyWeightContext*>(self);
+    PyObject *py_spill, *py_event, *py_particle, *py_weight;
+    std::vector<char*> c_argnames = {
+        cstring("spill"), cstring("event_number"), cstring("particle_number"),
+        cstring("weight"), NULL
+    };
+    int err = PyArg_ParseTupleAndKeywords(args, kwds, "OOOO",
+               &c_argnames[0],
+               &py_spill, &py_event, &py_particle, &py_weight);
+    if(err == 0) {
+        return NULL;
+    }
+    std::vector<HitId> ids;
+    std::vector<double> weights;
+    if (!getHitIds(py_spill, py_event, py_particle, &ids)) {
+        return NULL;
+    }
+    if (!PyCppSequenceToVectorConverter<double>().convert(py_weight, &weights)) {
+        return NULL;
+    }
+    if (weights.size() != ids.size()) {
+        PyErr_SetString(PyExc_ValueError,
+                        "weight should have the same length as spill");
+        return NULL;
+    }
+    pywc->cppcontext_->setWeights(ids, weights);
+    Py_RETURN_NONE; // success, return None
+}
+
+PyObject* getWeights(PyObject* self, PyObject *args, PyObject *kwds) {
+    // self was not initialised - something horrible happened
+    if (!C_API::is_PyWeightContext(self)) {
+        PyErr_SetString(PyExc_TypeError, "Failed to parse self as a PyWeightContext");
+        return NULL;
+    }
+    PyWeightContext* pywc = reinterpret_cast<PyWeightContext*>(self);
+    PyObject *py_spill, *py_event, *py_particle;
+    std::vector<char*> c_argnames = {
+        cstring("spill"), cstring("event_number"), cstring("particle_number"),
+        NULL
+    };
+    int err = PyArg_ParseTupleAndKeywords(args, kwds, "OOO",
+               &c_argnames[0],
+               &py_spill, &py_event, &py_particle);
+    if(err == 0) {
+        return NULL;
+    }
+    std::vector<HitId> ids;
+    if (!getHitIds(py_spill, py_event, py_particle, &ids)) {
+        return NULL;
+    }
+    std::vector<double> weights = pywc->cppcontext_->getWeights(ids);
+    PyObject* py_list = PyList_New(weights.size());
+    for (size_t i = 0; i < weights.size(); ++i) {
+        PyList_SET_ITEM(py_list, i, PyFloat_FromDouble(weights[i]));
+    }
+    return py_list;
+}
+
+PyObject* snapshot(PyObject* self, PyObject* args) {
+    // self was not initialised - something horrible happened
+    if (!C_API::is_PyWeightContext(self)) {
+        PyErr_SetString(PyExc_TypeError, "Failed to parse self as a PyWeightContext");
+        return NULL;
+    }
+    PyWeightContext* pywc = reinterpret_cast<PyWeightContext*>(self);
+    PyWeightContext* pywc_copy = C_API::create_empty_weightcontext();
+    // copy shares the weights map until one of the contexts is changed
+    pywc_copy->cppcontext_.set(new WeightContext(*(pywc->cppcontext_)));
+    return reinterpret_cast<PyObject*>(pywc_copy);
+}
+
 PyObject* printAddress(PyObject* self, PyObject* args) {
     // self was not initialised - something horrible happened
     if (!C_API::is_PyWeightContext(self)) {
@@ -153,6 +255,20 @@ static PyMethodDef _methods[] = {
 {"set_default_weight", (PyCFunction)setDefaultWeight,  METH_VARARGS|METH_KEYWORDS, NULL},
 {"get_weight", (PyCFunction)getWeight,  METH_VARARGS|METH_KEYWORDS, NULL},
 {"set_weight", (PyCFunction)setWeight,  METH_VARARGS|METH_KEYWORDS, NULL},
+{"set_weights", (PyCFunction)setWeights,  METH_VARARGS|METH_KEYWORDS,
+ "Set weights for many hits.\n"
+ " - spill, event_number, particle_number: sequences (e.g. numpy arrays)\n"
+ "   of integers identifying each hit\n"
+ " - weight: sequence of floats, one for each hit\n"
+ "Returns None"},
+{"get_weights", (PyCFunction)getWeights,  METH_VARARGS|METH_KEYWORDS,
+ "Get weights for many hits.\n"
+ " - spill, event_number, particle_number: sequences (e.g. numpy arrays)\n"
+ "   of integers identifying each hit\n"
+ "Returns a list of floats"},
+{"snapshot", (PyCFunction)snapshot,  METH_NOARGS,
+ "Return a copy of the weight context. The copy is cheap; weights are only\n"
+ "copied when either context is next changed"},
 {"print_address", (PyCFunction)printAddress,  METH_VARARGS, NULL},
 {NULL} // sentinel
 };
@@ -90,6 +90,128 @@ bool PyCppListToVectorConverter<ELEMENT>::convert(
     return true;
 }
 
+template <class NUMBER>
+bool PyCppSequenceToVectorConverter<NUMBER>::convert(
+                                   PyObject* py_seq,
+                                   std::vector<NUMBER>* std_vector) const {
+    if (py_seq == NULL || std_vector == NULL) {
+        PyErr_SetString(PyExc_TypeError, "Bad input to conversion");
+        return false;
+    }
+    if (PyObject_CheckBuffer(py_seq)) {
+        Py_buffer view;
+        if (PyObject_GetBuffer(py_seq, &view,
+                               PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) == 0) {
+            int success = convert_buffer(&view, std_vector);
+            PyBuffer_Release(&view);
+            if (success != 0) {
+                return success > 0;
+            }
+        }
+        PyErr_Clear(); // fall back to the sequence protocol
+    }
+    PyObject* fast = PySequence_Fast(py_seq, "Failed to parse argument as a sequence");
+    if (fast == NULL) {
+        return false;
+    }
+    Py_ssize_t size = PySequence_Fast_GET_SIZE(fast);
+    PyObject** items = PySequence_Fast_ITEMS(fast);
+    std_vector->resize(size);
+    for (Py_ssize_t i = 0; i < size; ++i) {
+        if (!convert_item(items[i], &(*std_vector)[i])) {
+            Py_DECREF(fast);
+            return false;
+        }
+    }
+    Py_DECREF(fast);
+    return true;
+}
+
+template <class NUMBER>
+int PyCppSequenceToVectorConverter<NUMBER>::convert_buffer(
+                                   Py_buffer* view,
+                                   std::vector<NUMBER>* std_vector) const {
+    if (view->ndim != 1 || view->format == NULL) {
+        return 0;
+    }
+    // strip native byte order/alignment character
+    const char* format = view->format;
+    if (format[0] == '@' || format[0] == '=') {
+        ++format;
+    }
+    if (format[0] == '\0' || format[1] != '\0') {
+        return 0;
+    }
+    bool is_float = format[0] == 'd' || format[0] == 'f';
+    bool is_int = format[0] == 'i' || format[0] == 'l' || format[0] == 'q';
+    if (!is_float && !is_int) {
+        return 0;
+    }
+    if (is_float && std::numeric_limits<NUMBER>::is_integer) {
+        PyErr_SetString(PyExc_TypeError,
+                 "Expected a buffer of integers but found floating point data");
+        return -1;
+    }
+    Py_ssize_t size = view->shape[0];
+    std_vector->resize(size);
+    const char* buf = reinterpret_cast<const char*>(view->buf);
+    for (Py_ssize_t i = 0; i < size; ++i) {
+        const char* item = buf+i*view->itemsize;
+        if (is_float) {
+            if (format[0] == 'd') {
+                (*std_vector)[i] = *reinterpret_cast<const double*>(item);
+            } else {
+                (*std_vector)[i] = *reinterpret_cast<const float*>(item);
+            }
+            continue;
+        }
+        long long value = 0;
+        switch (format[0]) {
+            case 'i':
+                value = *reinterpret_cast<const int*>(item);
+                break;
+            case 'l':
+                value = *reinterpret_cast<const long*>(item);
+                break;
+            case 'q':
+                value = *reinterpret_cast<const long long*>(item);
+                break;
+        }
+        if (std::numeric_limits<NUMBER>::is_integer &&
+            (value < std::numeric_limits<NUMBER>::min() ||
+             value > std::numeric_limits<NUMBER>::max())) {
+            PyErr_SetString(PyExc_TypeError,
+                            "Integer in buffer is out of range for an int");
+            return -1;
+        }
+        (*std_vector)[i] = value;
+    }
+    return 1;
+}
+
+template <class NUMBER>
+bool PyCppSequenceToVectorConverter<NUMBER>::convert_item(
+                                               PyObject* item, double* value) {
+    *value = PyFloat_AsDouble(item);
+    return !(*value == -1. && PyErr_Occurred());
+}
+
+template <class NUMBER>
+bool PyCppSequenceToVectorConverter<NUMBER>::convert_item(
+                                               PyObject* item, int* value) {
+    long long_value = PyLong_AsLong(item);
+    if (long_value == -1 && PyErr_Occurred()) {
+        return false;
+    }
+    if (long_value < std::numeric_limits<int>::min() ||
+        long_value > std::numeric_limits<int>::max()) {
+        PyErr_SetString(PyExc_TypeError, "Integer is out of range for an int");
+        return false;
+    }
+    *value = long_value;
+    return true;
+}
+
 template <class KEY, class VALUE>
 bool PyCppDictToMapConverter<KEY, VALUE>::convert(
                                       PyObject* py_dict,
@@ -18,6 +18,7 @@
 #ifndef xboa_core_utils_TypeConversions_hh
 #define xboa_core_utils_TypeConversions_hh
 
+#include <limits>
 #include <map>
 #include <vector>
 #include <string>
@@ -135,6 +136,35 @@ class PyCppListToVectorConverter : public PyCppConverter<std::vector<ELEMENT> >
     const PyCppConverter<ELEMENT>* converter_;
 };
 
+/** Converts a Python sequence of numbers to a vector of NUMBER
+ *
+ *  NUMBER should be a double or an int. Objects supporting the buffer
+ *  protocol (e.g. one dimensional numpy arrays) are read directly from
+ *  memory; other sequences are converted element by element. Values are
+ *  never narrowed silently: converting a floating point buffer to int, or an
+ *  integer that does not fit in an int, raises a TypeError.
+ */
+template <class NUMBER>
+class PyCppSequenceToVectorConverter
+                                : public PyCppConverter<std::vector<NUMBER> > {
+  public:
+    /** Constructor does nothing */
+    PyCppSequenceToVectorConverter() {}
+    /** Destructor does nothing */
+    virtual ~PyCppSequenceToVectorConverter() {}
+    /** Convert the sequence from python to std::vector */
+    bool convert(PyObject* py_seq, std::vector<NUMBER>* std_vector) const;
+
+  private:
+    /** Returns 1 on success, 0 if the buffer format is not handled (the
+     *  caller should fall back to the sequence protocol) or -1 with a Python
+     *  error set if the buffer can not be converted.
+     */
+    int convert_buffer(Py_buffer* view, std::vector<NUMBER>* std_vector) const;
+    static bool convert_item(PyObject* item, double* value);
+    static bool convert_item(PyObject* item, int* value);
+};
+
 /** Converts a generic pointer to object type PTR to a PyLong
  */
 template <class PTR>
@@ -661,6 +661,21 @@ class Hit(object):
     Hitcore.clear_global_weights()
   clear_global_weights = staticmethod(clear_global_weights)
 
+  def set_weight_context(context):
+    """
+    Set the xboa.core.WeightContext that holds global weights. Global weights
+    are read from and written to the new context from now on; the previous
+    context is unchanged. Switching context does not depend on the number of
+    weights.
+    """
+    Hitcore.set_weight_context(context)
+  set_weight_context = staticmethod(set_weight_context)
+
+  def get_weight_context():
+    """Return the xboa.core.WeightContext that holds global weights"""
+    return Hitcore.get_weight_context()
+  get_weight_context = staticmethod(get_weight_context)
+
   def delete_global_weights():
     """Clear memory allocated to global weights - also resets global weights to 1"""
     raise NotImplementedError("delete_global_weights is deprecated - please use clear_global_weights")
@@ -945,7 +960,7 @@ class Hit(object):
     'set'        : ['set', 'set_ct', 'set_ek', 'set_local_weight', 'set_p', 'set_tP', 'set_variables', 'set_xP', 'set_yP', 'set_global_weight'],
     'transform'  : ['abelian_transformation', 'translate', 'mass_shell_condition'],
     'io'         : ['file_header', 'file_types', 'set_g4bl_unit', 'write_builtin_formatted', 'write_list_builtin_formatted', 'write_user_formatted', 'open_filehandle_for_writing', 'get_maus_dict', 'get_maus_paths', 'get_maus_tree'],
-    'ancillary'  : ['check','clear_global_weights', 'delete_global_weights', 'get_bad_pids', 'set_bad_pids', 'dict_from_hit', 'mass_shell_variables', 'get_variables']
+    'ancillary'  : ['check','clear_global_weights', 'delete_global_weights', 'set_weight_context', 'get_weight_context', 'get_bad_pids', 'set_bad_pids', 'dict_from_hit', 'mass_shell_variables', 'get_variables']
     }
     function_doc = {
     'initialise':'Functions that can be used to initialise a Hit in various different ways:',
@@ -141,6 +141,49 @@ class FFTTuneTestCase(unittest.TestCase):
                     did_pass[n_turns] = False
         self.assertEqual(sum(did_pass.values()), len(did_pass))
 
+    def test_sft_array(self):
+        # test vectorised slow fourier transform against explicit sum
+        co, tracking = matrix(math.pi/4., 100)
+        fft = FFTTuneFinder()
+        fft.run_tracking('x', 1.0, co, tracking)
+        k_x_list = [i/50. for i in range(26)]
+        for use_hanning_filter in False, True:
+            fft.use_hanning_filter = use_hanning_filter
+            k_y_array = fft._sft_array(k_x_list)
+            n = float(len(fft.u))
+            for k_x, k_y in zip(k_x_list, k_y_array):
+                y_point, z_point = 0., 0.
+                for m, a_m in enumerate(fft.u):
+                    hanning = 1.
+                    if use_hanning_filter:
+                        hanning = 2.*math.sin(math.pi*m/n)**2.
+                    f = 2.*math.pi*m*k_x*(n+1)/n
+                    y_point += hanning*a_m*math.cos(f)
+                    z_point += hanning*a_m*math.sin(f)
+                self.assertAlmostEqual(k_y, (y_point**2+z_point**2)**0.5, 6)
+                self.assertAlmostEqual(fft._sft(k_x), k_y)
+        # stored data is refreshed when u changes
+        old_k_y = fft._sft(0.125)
+        fft.u = [2.*u for u in fft.u]
+        self.assertAlmostEqual(fft._sft(0.125), 2.*old_k_y)
+
+    def test_get_tune_naff(self):
+        co, tracking = matrix(math.pi/4., 1000)
+        tunes = {}
+        for refine_mode in "recursive", "naff":
+            fft = FFTTuneFinder(use_hanning_filter = True,
+                                refine_mode = refine_mode)
+            fft.run_tracking('x', 1.0, co, tracking)
+            tunes[refine_mode] = fft.get_tune(1e-9)
+            self.assertTrue(abs(tunes[refine_mode]*2.*math.pi-math.pi/4.) < 1e-2)
+            self.assertEqual(fft.k_mag_x, sorted(fft.k_mag_x))
+        self.assertAlmostEqual(tunes["recursive"], tunes["naff"], 6)
+        try:
+            FFTTuneFinder(refine_mode = "fit")
+            self.assertTrue(False, msg="Should have raised")
+        except ValueError:
+            pass
+
     def _ft_test(self, fft):
         fft._fft_find_peaks()
         peak_index = fft._get_max_peak()
@@ -4,6 +4,7 @@ import operator
 import bisect
 import sys
 import copy
+import math
 
 try:
   import numpy
@@ -1043,6 +1044,216 @@ class BunchTestCase(unittest.TestCase):
         passes, fails, warns = test_bunch()
         self.assertEqual(fails, 0)
 
+class BunchQuantileTestCase(unittest.TestCase):
+    def setUp(self):
+        Hit.clear_global_weights()
+        numpy.random.seed(1)
+        mass = Common.pdg_pid_to_mass[13]
+        self.bunch = Bunch()
+        for i in range(1001):
+            x, px, y, py = numpy.random.normal(0., 10., 4)
+            hit = Hit.new_from_dict({'x':x, 'px':px, 'y':y, 'py':py, 'pz':200.,
+                                     'mass':mass, 'pid':13, 'event_number':i,
+                                     'local_weight':1.+i%3}, 'energy')
+            self.bunch.append(hit)
+
+    def tearDown(self):
+        Hit.clear_global_weights()
+
+    def test_quantile_unweighted(self):
+        x_list = sorted(self.bunch.list_get_hit_variable(['x'])[0])
+        self.assertAlmostEqual(self.bunch.quantile('x', 0.5, False), x_list[500])
+        self.assertAlmostEqual(self.bunch.quantile('x', 0., False), x_list[0])
+        self.assertAlmostEqual(self.bunch.quantile('x', 1., False), x_list[-1])
+        quartiles = self.bunch.quantile('x', [0.75, 0.25], False)
+        self.assertAlmostEqual(quartiles[0], x_list[750])
+        self.assertAlmostEqual(quartiles[1], x_list[250])
+
+    def test_quantile_weighted(self):
+        x_list = self.bunch.list_get_hit_variable(['x'])[0]
+        weights = self.bunch.list_get_hit_variable(['weight'])[0]
+        ordered = sorted(zip(x_list, weights))
+        cumulative = numpy.cumsum([item[1] for item in ordered])
+        for quantile in [0.01, 0.09, 0.5, 0.9]:
+            index = bisect.bisect_left(cumulative, quantile*cumulative[-1])
+            self.assertAlmostEqual(self.bunch.quantile('x', quantile),
+                                   ordered[index][0])
+        # hits with 0 weight are ignored
+        self.bunch.cut({'x':ordered[0][0]}, operator.le)
+        self.assertAlmostEqual(self.bunch.quantile('x', 0.), ordered[1][0])
+        self.assertRaises(ValueError, self.bunch.quantile, 'x', 1.1)
+
+    def test_quantile_amplitude(self):
+        amplitudes = self.bunch.list_get_hit_variable(['amplitude x y'])[0]
+        for i in range(0, 1001, 100):
+            ref = Bunch.get_amplitude(self.bunch, self.bunch[i], ['x', 'y'])
+            self.assertAlmostEqual(amplitudes[i], ref, 6)
+        amplitudes = sorted(amplitudes)
+        self.assertAlmostEqual(self.bunch.quantile('amplitude x y', 0.09, False),
+                               amplitudes[90])
+
+    def test_fractional_emittance(self):
+        # for a 4D gaussian, chi2 with 4 degrees of freedom contains 9 % of the
+        # beam at chi2 ~ 0.999
+        emittance = self.bunch.get_emittance(['x', 'y'])
+        frac_emit = self.bunch.fractional_emittance(['x', 'y'], 0.09, False)
+        ref_emit = math.pi**2/2.*(0.999*emittance)**2
+        self.assertLess(abs(frac_emit/ref_emit-1.), 0.3)
+        amplitude = self.bunch.quantile('amplitude x y', [0.09, 0.5])
+        frac_list = self.bunch.fractional_emittance(['x', 'y'], [0.09, 0.5])
+        for a_f, frac_emit in zip(amplitude, frac_list):
+            self.assertAlmostEqual(frac_emit, math.pi**2/2.*a_f**2)
+
+    def test_bootstrap_mean(self):
+        # error on the mean is sigma/sqrt(N_eff)
+        weights = numpy.array(self.bunch.list_get_hit_variable(['weight'])[0])
+        n_eff = numpy.sum(weights)**2/numpy.sum(weights**2)
+        sigma = self.bunch.get('standard_deviation', ['x'])
+        result = self.bunch.bootstrap('mean', ['x'], 400, seed=1)
+        self.assertEqual(len(result['samples']), 400)
+        self.assertLess(abs(result['mean']-self.bunch.get('mean', ['x'])),
+                        sigma/n_eff**0.5)
+        self.assertLess(abs(result['standard_deviation']*n_eff**0.5/sigma-1.), 0.2)
+        lower, upper = result['confidence_interval']
+        self.assertLess(lower, result['mean'])
+        self.assertGreater(upper, result['mean'])
+
+    def test_bootstrap_twiss(self):
+        for variable in ['emittance', 'beta', 'alpha', 'gamma']:
+            result = self.bunch.bootstrap(variable, ['x', 'y'], 100, seed=2)
+            value = self.bunch.get(variable, ['x', 'y'])
+            self.assertLess(abs(result['mean']-value),
+                            3.*result['standard_deviation'])
+            self.assertLess(result['standard_deviation'], 0.1*abs(value)+0.1)
+
+    def test_bootstrap_reproducible(self):
+        result_1 = self.bunch.bootstrap('emittance', ['x'], 150, 1, seed=3)
+        result_3 = self.bunch.bootstrap('emittance', ['x'], 150, 3, seed=3)
+        self.assertTrue(numpy.all(result_1['samples'] == result_3['samples']))
+        result_4 = self.bunch.bootstrap('emittance', ['x'], 150, 1, seed=4)
+        self.assertFalse(numpy.all(result_1['samples'] == result_4['samples']))
+        self.assertRaises(KeyError, self.bunch.bootstrap, 'dispersion', ['x'])
+        self.assertRaises(ValueError, self.bunch.bootstrap, 'mean', ['x'], 10,
+                          1, 1.5)
+
+class BunchListGetTestCase(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(2)
+        mass = Common.pdg_pid_to_mass[13]
+        self.bunch_dict = {}
+        for station in range(5):
+            bunch = Bunch()
+            for i in range(101):
+                x, px, y, py, t = numpy.random.normal(0., 10., 5)
+                hit = Hit.new_from_dict({'x':x, 'px':px+0.1*x, 'y':y, 'py':py,
+                                         't':t, 'z':1000.*(5-station),
+                                         'pz':200.+px, 'mass':mass, 'pid':13,
+                                         'event_number':i}, 'energy')
+                bunch.append(hit)
+            self.bunch_dict[station] = bunch
+        self.var_list = ['mean', 'emittance', 'beta', 'alpha', 'standard_deviation']
+        self.axis_list = [['z'], ['x', 'y'], ['x', 'y'], ['x', 'y'], ['x']]
+
+    def test_list_get(self):
+        values = Bunch.list_get(self.bunch_dict, self.var_list, self.axis_list)
+        self.assertEqual(len(values), len(self.var_list))
+        for i, station in enumerate(reversed(range(5))):
+            bunch = self.bunch_dict[station]
+            self.assertFalse(bunch.covariances_set())
+            for j, var in enumerate(self.var_list):
+                ref = bunch.get(var, self.axis_list[j])
+                self.assertAlmostEqual(values[j][i]/ref, 1., 12)
+        threaded = Bunch.list_get(self.bunch_dict, self.var_list,
+                                  self.axis_list, 3)
+        for j in range(len(self.var_list)):
+            self.assertTrue(numpy.all(threaded[j] == values[j]))
+
+    def test_list_get_repeated_bunch(self):
+        # the same bunch under several keys is calculated once per call
+        bunch_dict = {'a':self.bunch_dict[0], 'b':self.bunch_dict[0],
+                      'c':self.bunch_dict[1]}
+        values = Bunch.list_get(bunch_dict, self.var_list, self.axis_list, 3)
+        self.assertEqual(len(values[0]), 3)
+        for bunch in bunch_dict.values():
+            self.assertFalse(bunch.covariances_set())
+        single = Bunch.list_get(bunch_dict, self.var_list, self.axis_list)
+        for j, var in enumerate(self.var_list):
+            self.assertTrue(numpy.all(values[j] == single[j]))
+            ref = self.bunch_dict[0].get(var, self.axis_list[j])
+            self.assertEqual(sum([abs(value/ref-1.) < 1e-12 \
+                                                   for value in values[j]]), 2)
+
+    def test_set_covariance_matrix(self):
+        bunch = self.bunch_dict[0]
+        cov_list = Bunch.axis_list_to_covariance_list(Bunch.get_axes())
+        ref_means = bunch.mean(cov_list)
+        ref_covs = [[bunch.moment([var_1, var_2]) for var_1 in cov_list]
+                                                  for var_2 in cov_list]
+        bunch.set_covariance_matrix(True)
+        for i, var_1 in enumerate(cov_list):
+            self.assertAlmostEqual(bunch.mean([var_1])[var_1], ref_means[var_1])
+            for j, var_2 in enumerate(cov_list):
+                self.assertLess(abs(bunch.moment([var_1, var_2])-ref_covs[i][j]),
+                                1e-9*(abs(ref_covs[i][j])+1.))
+        bunch.set_covariance_matrix(False)
+
+    def test_compare_distribution(self):
+        bunch_0, bunch_1 = self.bunch_dict[0], self.bunch_dict[1]
+        test_out = bunch_0.compare_distribution(bunch_1, 'x')
+        ref_out = Common.two_sample_test(bunch_0.list_get_hit_variable(['x'])[0],
+                                         bunch_1.list_get_hit_variable(['x'])[0])
+        self.assertEqual(test_out, ref_out)
+        # z is different at every station
+        test_out = bunch_0.compare_distribution(bunch_1, ['px', 'z'])
+        self.assertGreater(test_out['ks_probability'][0], 1e-3)
+        self.assertAlmostEqual(test_out['ks_statistic'][1], 1.)
+        test_out = Bunch.list_compare_distribution(self.bunch_dict,
+                      {0:bunch_1, 1:bunch_1, 'a':bunch_1}, ['x', 'z'], True, 2)
+        self.assertEqual(sorted(test_out.keys()), [0, 1])
+        self.assertEqual(test_out[1]['ks_statistic'][0], 0.)
+        self.assertAlmostEqual(test_out[0]['ks_statistic'][1], 1.)
+
+class BunchSetWeightsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bunch = Bunch()
+        for i in range(10):
+            hit = Hit.new_from_dict({'x':float(i), 'spill':1,
+                                     'event_number':i, 'particle_number':i%3})
+            self.bunch.append(hit)
+        self.context = Hit.get_weight_context()
+        Hit.set_weight_context(WeightContext())
+
+    def tearDown(self):
+        Hit.set_weight_context(self.context)
+
+    def test_set_weights(self):
+        weights = numpy.arange(10)/10.
+        self.bunch.set_weights(weights, False)
+        for i, hit in enumerate(self.bunch):
+            self.assertEqual(hit['local_weight'], weights[i])
+            self.assertEqual(hit['global_weight'], 1.)
+        self.bunch.set_weights([2.]*10, True)
+        for i, hit in enumerate(self.bunch):
+            self.assertEqual(hit['local_weight'], weights[i])
+            self.assertEqual(hit['global_weight'], 2.)
+        self.assertAlmostEqual(self.bunch.bunch_weight(), 2*sum(weights))
+        self.assertRaises(ValueError, self.bunch.set_weights, [1.]*9, True)
+
+    def test_switch_weight_context(self):
+        weights = numpy.arange(10)/10.
+        self.bunch.set_weights(weights, True)
+        context = Hit.get_weight_context()
+        self.assertEqual(context.get_weights([1]*10, range(10),
+                                             [i%3 for i in range(10)]),
+                         weights.tolist())
+        snapshot = context.snapshot()
+        self.bunch.set_weights(numpy.zeros(10), True)
+        self.assertEqual(self.bunch.bunch_weight(), 0.)
+        Hit.set_weight_context(snapshot)
+        self.assertAlmostEqual(self.bunch.bunch_weight(), sum(weights))
+        Hit.set_weight_context(context)
+        self.assertEqual(self.bunch.bunch_weight(), 0.)
+
 if __name__ == "__main__":
   unittest.main()
 
@@ -55,6 +55,19 @@ class BoundingEllipseTestCase(unittest.TestCase):
             self.assertLess(abs(point[2]-limit_mean[2]), 3.0)
             self.assertLess(abs(point[3]-limit_mean[3]), 4.0)
 
+    def test_cut_on_bound_indices(self):
+        numpy.random.seed(1)
+        points_in = numpy.random.randn(1000, 3)*2.
+        limit_ellipse = numpy.array([[4., 1., 0.], [1., 3., 0.], [0., 0., 2.]])
+        limit_mean = numpy.array([0.5, -0.5, 0.])
+        bound = BoundingEllipse(limit_ellipse, limit_mean, 3)
+        points_out, not_cut = bound.cut_on_bound(points_in)
+        inverse = numpy.linalg.inv(limit_ellipse)
+        expected = [i for i, point in enumerate(points_in) if \
+                   (point-limit_mean).dot(inverse.dot(point-limit_mean)) <= 1.]
+        self.assertEqual(list(not_cut), expected)
+        self.assertEqual(points_out.tolist(), points_in[expected].tolist())
+
     def test_bounding_points(self):
         limit_ellipse = numpy.zeros([4, 4])
         for i in range(4):
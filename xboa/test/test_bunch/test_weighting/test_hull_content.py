@@ -0,0 +1,94 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+import unittest
+import math
+
+import numpy
+
+import xboa.common as common
+from xboa.bunch.weighting import HullContent
+
+class HullContentTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            common.config.has_scipy()
+            import scipy.spatial
+        except ImportError:
+            self.skipTest("Need scipy library for hull content")
+
+    def test_simplex_content(self):
+        for dim in range(1, 5):
+            points = numpy.vstack([numpy.zeros([1, dim]), numpy.identity(dim)])
+            simplices = numpy.array([range(dim+1)])
+            content = HullContent.simplex_content(points*2., simplices)
+            self.assertAlmostEqual(content[0], 2.**dim/math.factorial(dim))
+        # unit square split into two triangles; vertex order does not matter
+        points = numpy.array([[0., 0.], [1., 0.], [1., 1.], [0., 1.]])
+        simplices = numpy.array([[0, 1, 2], [0, 3, 2]])
+        content = HullContent.simplex_content(points, simplices)
+        self.assertEqual(content.tolist(), [0.5, 0.5])
+        self.assertEqual(len(HullContent.simplex_content(points, [])), 0)
+
+    def test_tile_content(self):
+        import scipy.spatial
+        numpy.random.seed(7)
+        points = numpy.random.normal(0., 1., [200, 3])
+        tesselation = scipy.spatial.Voronoi(points)
+        content = HullContent(tesselation, range(200), 1)
+        self.assertEqual(len(content.tile_content_list), 200)
+        n_finite = 0
+        for i in range(200):
+            region = tesselation.regions[tesselation.point_region[i]]
+            if -1 in region or len(region) == 0:
+                self.assertEqual(content.tile_content_list[i], 0.)
+            else:
+                n_finite += 1
+                ref = scipy.spatial.ConvexHull(tesselation.vertices[region]).volume
+                self.assertAlmostEqual(content.tile_content_list[i]/ref, 1., 9)
+        self.assertGreater(n_finite, 10)
+        content_2 = HullContent(tesselation, range(200), 2)
+        self.assertTrue(numpy.array_equal(content.tile_content_list,
+                                          content_2.tile_content_list))
+        self.assertEqual(content_2.pool, None)
+
+    def test_shared_pool(self):
+        import scipy.spatial
+        import multiprocessing
+        numpy.random.seed(8)
+        pool = multiprocessing.Pool(3)
+        try:
+            for i in range(3):
+                points = numpy.random.normal(0., 1., [100+i*50, 2])
+                tesselation = scipy.spatial.Voronoi(points)
+                content = HullContent(tesselation, range(len(points)), 3, pool)
+                ref = HullContent(tesselation, range(len(points)), 1)
+                self.assertTrue(numpy.array_equal(content.tile_content_list,
+                                                  ref.tile_content_list))
+                self.assertIs(content.pool, pool)
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_grid_content(self):
+        import scipy.spatial
+        points = [[x, y] for x in range(-2, 3) for y in range(-2, 3)]
+        tesselation = scipy.spatial.Voronoi(numpy.array(points, dtype=float))
+        content = HullContent(tesselation, range(len(points)), 1)
+        self.assertAlmostEqual(sum(content.tile_content_list), 9., 9)
+
+if __name__ == "__main__":
+    unittest.main()
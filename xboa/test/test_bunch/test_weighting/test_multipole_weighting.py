@@ -103,6 +103,43 @@ class TestMultipoleWeighting(unittest.TestCase):
         print(test_bunch.mean(["x", "px"]))
         print(test_bunch.covariance_matrix(["x", "px"]))
 
+    def test_monomial_matrix(self):
+        points = numpy.array([[1., 2., 3.], [-1., 0.5, 2.]])
+        index_by_power = [[0, 0, 0], [1, 0, 0], [2, 1, 0], [0, 3, 2]]
+        monomials = MultipoleWeighting.monomial_matrix(points, index_by_power)
+        self.assertEqual(numpy.shape(monomials), (2, 4))
+        for i, point in enumerate(points):
+            for j, index in enumerate(index_by_power):
+                test_value = numpy.prod(point**numpy.array(index))
+                self.assertAlmostEqual(monomials[i, j], test_value)
+
+    def test_set_target_moments(self):
+        ellipse = numpy.array([[1.0, 0.], [0., 0.5]])
+        mean = numpy.array([0., 0.])
+        multipole_weighting = MultipoleWeighting(2, ["x", "y"], ellipse, mean)
+        self.assertRaises(ValueError, multipole_weighting.set_target_moments,
+                          [[1, 0], [0, 1], [1, 0]], [0., 0., 0.])
+        self.assertRaises(ValueError, multipole_weighting.set_target_moments,
+                          [[1, 2]], [0.])
+        self.assertRaises(ValueError, MultipoleWeighting, 1, ["x", "y"],
+                          ellipse, mean)
+
+    def test_apply_weights_higher_order(self):
+        """
+        Check that weighting can target moments above second order
+        """
+        test_bunch = self._generate_bunch(["x"], 10000)
+        multipole_weighting = MultipoleWeighting(4, ["x"],
+                                                 numpy.array([[1.]]),
+                                                 numpy.array([0.]))
+        multipole_weighting.set_target_moments([[1], [2], [3], [4]],
+                                               [0., 1., 0., 2.5])
+        for i in range(3):
+            multipole_weighting.apply_weights(test_bunch, False)
+        self.assertAlmostEqual(test_bunch.moment(['x', 'x'], {'x':0.}), 1., 3)
+        self.assertAlmostEqual(
+                  test_bunch.moment(['x', 'x', 'x', 'x'], {'x':0.}), 2.5, 3)
+
 if __name__ == "__main__":
     unittest.main()
 
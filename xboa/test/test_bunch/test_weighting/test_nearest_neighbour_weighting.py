@@ -0,0 +1,91 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy
+
+import xboa.common as common
+from xboa.hit import Hit
+from xboa.bunch import Bunch
+from xboa.bunch.weighting import NearestNeighbourWeighting
+from xboa.bunch.weighting import BoundingEllipse
+
+class NearestNeighbourWeightingTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            common.config.has_scipy()
+            import scipy.spatial
+        except ImportError:
+            self.skipTest("Need scipy library for nearest neighbour weighting")
+        numpy.random.seed(1)
+
+    def test_init(self):
+        self.assertRaises(ValueError, NearestNeighbourWeighting, ['x', 'y'],
+                          numpy.identity(3))
+        self.assertRaises(ValueError, NearestNeighbourWeighting, ['x', 'y'],
+                          numpy.identity(2), numpy.zeros([3]))
+        self.assertRaises(ValueError, NearestNeighbourWeighting, ['x', 'y'],
+                          numpy.identity(2), n_neighbours = 0)
+        self.assertRaises(ValueError, NearestNeighbourWeighting, ['x', 'y'],
+                          numpy.identity(2), n_neighbours = 4.)
+        weighting = NearestNeighbourWeighting(['x', 'y'], numpy.identity(2),
+                                              n_neighbours = numpy.int64(4))
+        self.assertEqual(weighting.n_neighbours, 4)
+        bound = BoundingEllipse(numpy.identity(3), numpy.zeros([3]), 3)
+        self.assertRaises(ValueError, NearestNeighbourWeighting, ['x', 'y'],
+                          numpy.identity(2), bound = bound)
+
+    def test_content_uniform(self):
+        # uniform density in a 2x5 box; content per point should be 10/n
+        points = numpy.random.rand(20000, 2)*numpy.array([2., 5.])
+        for ellipse in [numpy.identity(2), numpy.array([[1., 0.5], [0.5, 4.]])]:
+            my_weights = NearestNeighbourWeighting(['x', 'y'], ellipse,
+                                                   n_neighbours = 32)
+            content = my_weights.get_content_array(points)
+            self.assertEqual(numpy.shape(content), (20000,))
+            self.assertAlmostEqual(numpy.median(content)*20000/10., 1., 1)
+        self.assertRaises(ValueError, my_weights.get_content_array,
+                          points[:32])
+
+    def test_apply_weights(self):
+        test_bunch = Bunch()
+        for i, (x, y, px) in enumerate(numpy.random.randn(10000, 3)*2.):
+            test_bunch.append(Hit.new_from_dict({'x':x, 'y':y, 'px':px,
+                                                 'event_number':i}))
+        my_weights = NearestNeighbourWeighting(['x', 'y', 'px'],
+                                               numpy.identity(3),
+                                               n_neighbours = 32)
+        my_weights.apply_weights(test_bunch, False)
+        self.assertEqual(len(my_weights.weight_list), len(test_bunch))
+        covariances = test_bunch.covariance_matrix(['x', 'y', 'px'])
+        for i in range(3):
+            self.assertAlmostEqual(covariances[i, i], 1., delta = 0.2)
+        # with a bound, hits outside get 0 weight
+        bound = BoundingEllipse(numpy.identity(3)*9., numpy.zeros([3]), 3)
+        my_weights = NearestNeighbourWeighting(['x', 'y', 'px'],
+                                               numpy.identity(3),
+                                               bound = bound)
+        my_weights.apply_weights(test_bunch, True)
+        for hit in test_bunch:
+            radius_sq = hit['x']**2+hit['y']**2+hit['px']**2
+            if radius_sq > 9.:
+                self.assertEqual(hit['global_weight'], 0.)
+            else:
+                self.assertGreater(hit['global_weight'], 0.)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,12 +20,14 @@ import math
 import datetime
 
 import numpy
+import scipy.spatial
 import ROOT
 
 from xboa.hit import Hit
 from xboa.bunch import Bunch
 from xboa.bunch.weighting import VoronoiWeighting
 from xboa.bunch.weighting import BoundingEllipse
+from xboa.bunch.weighting import HullContent
 import xboa.common as common
 
 class VoronoiWeightingTestCase(unittest.TestCase):
@@ -174,6 +176,19 @@ class VoronoiWeightingTestCase(unittest.TestCase):
         self.assertAlmostEqual(fit_function.GetParameter(1), 1, 3)
         self.assertAlmostEqual(fit_function.GetParameter(2), 0.5, 3) # why 0.5?
 
+    def test_get_pdf_array(self):
+        for i in range(4):
+            self.diag[i, i] = (i+1.)**2.
+        self.diag[0, 1] = self.diag[1, 0] = 0.5
+        my_weights = VoronoiWeighting(['x', 'y', 'px', 'py'],
+                                      self.diag,
+                                      numpy.array([1., 2., 3., 4.]))
+        points = numpy.random.randn(100, 4)*3.
+        pdf_array = my_weights.get_pdf_array(points)
+        self.assertEqual(numpy.shape(pdf_array), (100,))
+        for point, pdf in zip(points, pdf_array):
+            self.assertAlmostEqual(my_weights.get_pdf(point), pdf, 12)
+
     def test_content_circle(self):
         test_bunch = Bunch()
         n_events = 361
@@ -248,6 +263,30 @@ class VoronoiWeightingTestCase(unittest.TestCase):
         self.assertEqual(len(my_weights.tile_content_list), len(test_bunch))
         self.assertAlmostEqual(sum(my_weights.tile_content_list), 81., 3)
     
+    def test_pool(self):
+        my_weights = VoronoiWeighting(['x', 'y'],
+                                      numpy.array([[2., 0.],[0., 1.]]))
+        self.assertEqual(my_weights._get_pool(1), None)
+        pool = my_weights._get_pool(2)
+        self.assertIs(my_weights._get_pool(2), pool)
+        self.assertIsNot(my_weights._get_pool(3), pool)
+        self.assertEqual(my_weights.pool_size, 3)
+        my_weights.close()
+        self.assertEqual(my_weights.pool, None)
+
+    def test_partitioned_content(self):
+        numpy.random.seed(1)
+        for dim in [2, 3]:
+            points = numpy.random.randn(2000, dim)
+            my_weights = VoronoiWeighting(['x', 'y', 'z'][:dim],
+                                          numpy.identity(dim))
+            content = my_weights.partitioned_content(points, 1500, 100)
+            tesselation = scipy.spatial.Voronoi(points)
+            reference = HullContent(tesselation, range(1500)).tile_content_list
+            self.assertEqual(len(content), 1500)
+            for test, ref in zip(content, reference):
+                self.assertAlmostEqual(test, ref, delta=1e-9*(1.+ref))
+
     def test_content_square(self):
         test_bunch = Bunch()
         for x in range(-2, 3):
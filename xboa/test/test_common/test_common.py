@@ -599,6 +599,133 @@ class CommonTestCase(unittest.TestCase):
         passes, fails, warns = test_common()
         self.assertEqual(fails, 0)
 
+class WeightedQuantileTestCase(unittest.TestCase):
+    def test_weighted_quantile(self):
+        self.assertEqual(common.weighted_quantile([3., 1., 2., 4.], [0.5],
+                                                  [1., 1., 1., 5.]), [4.])
+        numpy.random.seed(2)
+        values = numpy.random.normal(0., 1., 10000)
+        # lots of repeated values exercise the pivot bookkeeping
+        values = numpy.round(values, 1)
+        weights = numpy.random.uniform(0., 2., 10000)
+        order = numpy.argsort(values)
+        cumulative = numpy.cumsum(weights[order])
+        quantile_list = [0.9, 0., 0.5, 0.1, 1., 0.123]
+        test_out = common.weighted_quantile(values, quantile_list, weights)
+        for quantile, value in zip(quantile_list, test_out):
+            index = numpy.searchsorted(cumulative, quantile*cumulative[-1])
+            index = min(index, len(values)-1)
+            self.assertEqual(value, values[order][index])
+        test_out = common.weighted_quantile(values, quantile_list)
+        ref_out = numpy.quantile(values, quantile_list, method='inverted_cdf')
+        for value, ref in zip(test_out, ref_out):
+            self.assertEqual(value, ref)
+
+    def test_weighted_quantile_bad_input(self):
+        self.assertRaises(ValueError, common.weighted_quantile,
+                          [1., 2.], [-0.1])
+        self.assertRaises(ValueError, common.weighted_quantile,
+                          [1., 2.], [0.5], [1.])
+        self.assertRaises(ZeroDivisionError, common.weighted_quantile,
+                          [1., 2.], [0.5], [0., 0.])
+
+class TwoSampleTestTestCase(unittest.TestCase):
+    def test_two_sample_test_unweighted(self):
+        # with no ties, A^2 = 1/(n_1 n_2) Sum_i (M_i N - n_1 i)^2/(i (N-i))
+        # where M_i is the number of values from sample 1 in the first i values
+        numpy.random.seed(3)
+        values_1 = numpy.random.normal(0., 1., 300)
+        values_2 = numpy.random.normal(0.5, 1., 200)
+        merged = numpy.hstack([values_1, values_2])
+        in_1 = numpy.hstack([numpy.ones(300), numpy.zeros(200)])
+        m_i = numpy.cumsum(in_1[numpy.argsort(merged)])[:-1]
+        i = numpy.arange(1, 500)
+        ad_ref = numpy.sum((m_i*500-300*i)**2/(i*(500-i)))/300./200.
+        ks_ref = numpy.max(numpy.abs(m_i/300.-(i-m_i)/200.))
+        test_out = common.two_sample_test(values_1, values_2)
+        self.assertAlmostEqual(test_out['ad_statistic'], ad_ref, 9)
+        self.assertAlmostEqual(test_out['ks_statistic'], ks_ref, 12)
+        self.assertLess(test_out['ks_probability'], 0.1)
+        self.assertLess(test_out['ad_probability'], 0.1)
+        self.assertAlmostEqual(common.kolmogorov_smirnov_test(values_1, values_1), 1.)
+
+    def test_two_sample_test_weighted(self):
+        # integer weights are the same as repeating values
+        numpy.random.seed(4)
+        values_1 = numpy.round(numpy.random.normal(0., 1., 200), 1)
+        values_2 = numpy.random.normal(0., 1., 100)
+        weights_1 = numpy.random.randint(0, 4, 200)
+        test_out = common.two_sample_test(values_1, values_2, weights_1)
+        ref_out = common.two_sample_test(numpy.repeat(values_1, weights_1), values_2)
+        self.assertAlmostEqual(test_out['ks_statistic'], ref_out['ks_statistic'], 12)
+        # normalisation of the weights does not matter
+        test_out = common.two_sample_test(values_1, values_2, None, numpy.ones(100)*2.)
+        ref_out = common.two_sample_test(values_1, values_2)
+        for key, value in ref_out.items():
+            self.assertAlmostEqual(test_out[key], value, 12)
+
+    def test_two_sample_test_rows(self):
+        numpy.random.seed(5)
+        values_1 = numpy.random.normal(0., 1., (3, 100))
+        values_2 = numpy.random.normal(0., 1., (3, 150))
+        test_out = common.two_sample_test(values_1, values_2)
+        for i in range(3):
+            row_out = common.two_sample_test(values_1[i], values_2[i])
+            for key, value in row_out.items():
+                self.assertAlmostEqual(test_out[key][i], value, 12)
+        self.assertRaises(ValueError, common.two_sample_test,
+                          values_1, values_2[:2])
+        self.assertRaises(ZeroDivisionError, common.two_sample_test,
+                          values_1, values_2, numpy.zeros(100))
+
+class EllipseFitterTestCase(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(6)
+        cov = numpy.array([[2., 1., 0.], [1., 3., 0.], [0., 0., 4.]])
+        self.points = numpy.random.multivariate_normal([1., 2., 3.], cov, 1000)
+        self.points[:10] *= 100. # outliers
+        self.weights = numpy.random.uniform(0., 2., 1000)
+
+    def test_moments(self):
+        fitter = common.EllipseFitter(self.points.tolist(), self.weights)
+        in_cut = self.weights > 0.5
+        mean, cov = fitter.moments(in_cut)
+        ref_mean = numpy.average(self.points[in_cut], axis=0,
+                                 weights=self.weights[in_cut])
+        ref_cov = numpy.cov(self.points[in_cut], rowvar=False, bias=True,
+                            aweights=self.weights[in_cut])
+        for i in range(3):
+            self.assertAlmostEqual(mean[i], ref_mean[i], 9)
+            for j in range(3):
+                self.assertAlmostEqual(cov[i, j], ref_cov[i, j], 6)
+        self.assertRaises(ZeroDivisionError, fitter.moments,
+                          numpy.zeros(1000, dtype=bool))
+        self.assertRaises(ValueError, common.EllipseFitter, self.points, [1.])
+
+    def test_eps(self):
+        fitter = common.EllipseFitter(self.points)
+        mean, cov = fitter.moments()
+        eps = fitter.eps(mean, cov)
+        cov_inv = numpy.linalg.inv(cov)
+        for i in range(0, 1000, 100):
+            delta = self.points[i]-mean
+            ref = numpy.dot(delta, numpy.dot(cov_inv, delta))* \
+                  numpy.linalg.det(cov)**(1./3.)
+            self.assertAlmostEqual(eps[i]/ref, 1., 9)
+
+    def test_fit(self):
+        fitter = common.EllipseFitter(self.points)
+        mean, cov = fitter.fit(30., 100)
+        # stops once the cut is unchanged; outliers are removed
+        self.assertLess(fitter.iterations, 100)
+        self.assertFalse(numpy.any(fitter.in_cut[:10]))
+        self.assertTrue(numpy.array_equal(fitter.eps(mean, cov) < 30.,
+                                          fitter.in_cut))
+        self.assertLess(abs(cov[2, 2]/cov[0, 0]-2.), 0.5)
+        mean_2, cov_2 = common.fit_ellipse(self.points, 30., None, 100, False)
+        self.assertTrue(numpy.array_equal(mean, mean_2))
+        self.assertTrue(numpy.array_equal(cov, cov_2))
+
 if __name__ == "__main__":
     unittest.main()
 
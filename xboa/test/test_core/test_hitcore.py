@@ -112,6 +112,23 @@ class HitcoreTest(unittest.TestCase):
             self.assertEqual(hitcore_1.get("global_weight"), 1.0)
 
 
+    def test_weight_context_hit_id(self):
+        context = WeightContext()
+        context.set_weight(0.5, 1, 2, 3) # spill, event, particle
+        hitcore = Hitcore()
+        hitcore.set('spill', 1)
+        hitcore.set('event_number', 2)
+        hitcore.set('particle_number', 3)
+        old_context = Hitcore.get_weight_context()
+        Hitcore.set_weight_context(context)
+        try:
+            self.assertEqual(hitcore.get('global_weight'), 0.5)
+            hitcore.set('particle_number', 2)
+            hitcore.set('event_number', 3)
+            self.assertEqual(hitcore.get('global_weight'), 1.0)
+        finally:
+            Hitcore.set_weight_context(old_context)
+
     def test_compare(self):
         hc1 = Hitcore()
         hc2 = Hitcore()
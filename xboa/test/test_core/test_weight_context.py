@@ -1,5 +1,7 @@
 import unittest
 
+import numpy
+
 from xboa.core import WeightContext
 
 class WeightContextTest(unittest.TestCase):
@@ -23,6 +25,58 @@ class WeightContextTest(unittest.TestCase):
         context.set_weight(0.5, 1, 2, 3)
         self.assertEqual(context.get_weight(1, 2, 3), 0.5)
 
+    def test_get_set_weights(self):
+        context = WeightContext()
+        context.set_weights([1, 1, 2, 1], [2, 3, 2, 2], [3, 3, 3, 3],
+                            [0.5, 0.6, 0.7, 0.8])
+        # last weight wins for a repeated id
+        self.assertEqual(context.get_weight(1, 2, 3), 0.8)
+        self.assertEqual(context.get_weight(1, 3, 3), 0.6)
+        self.assertEqual(context.get_weight(2, 2, 3), 0.7)
+        self.assertEqual(context.get_weights([1, 2, 4], [3, 2, 4], [3, 3, 4]),
+                         [0.6, 0.7, 1.0])
+        self.assertRaises(ValueError, context.set_weights, [1], [1], [1, 2],
+                          [1.])
+        self.assertRaises(ValueError, context.set_weights, [1], [1], [1],
+                          [1., 2.])
+        self.assertRaises(TypeError, context.set_weights, [1], [1], [1],
+                          ["cheese"])
+
+    def test_set_weights_buffer(self):
+        context = WeightContext()
+        context.set_weights(numpy.array([1, 2]),
+                            numpy.array([2, 2], dtype=numpy.int32),
+                            numpy.array([3, 3], dtype=numpy.int64),
+                            numpy.array([0.5, 0.6]))
+        self.assertEqual(context.get_weights([1, 2], [2, 2], [3, 3]),
+                         [0.5, 0.6])
+        # ids are not narrowed silently
+        for bad_ids in [numpy.array([1.5, 2.]), numpy.array([1., 2.]),
+                        numpy.array([2**40, 1]), [2**40, 1], [1.5, 2]]:
+            self.assertRaises(TypeError, context.set_weights, bad_ids,
+                              [1, 1], [1, 1], [1., 1.])
+
+    def test_snapshot(self):
+        context1 = WeightContext()
+        context1.set_default_weight(2)
+        context1.set_weight(4, 1, 1, 1)
+        context2 = context1.snapshot()
+        self.assertFalse(context1 == context2)
+        self.assertEqual(context2.get_default_weight(), 2)
+        self.assertEqual(context2.get_weight(1, 1, 1), 4)
+        # changes to one context do not change the other
+        context1.set_weight(5, 1, 1, 1)
+        context2.set_weights([2], [2], [2], [6])
+        self.assertEqual(context1.get_weight(1, 1, 1), 5)
+        self.assertEqual(context1.get_weight(2, 2, 2), 2)
+        self.assertEqual(context2.get_weight(1, 1, 1), 4)
+        self.assertEqual(context2.get_weight(2, 2, 2), 6)
+        context3 = context1.snapshot()
+        context4 = context3+context1
+        self.assertEqual(context4.get_weight(1, 1, 1), 10)
+        self.assertEqual(context3.get_weight(1, 1, 1), 5)
+        self.assertEqual(context1.get_weight(1, 1, 1), 5)
+
     def test_add(self):
         context1 = WeightContext()
         context2 = WeightContext()
@@ -0,0 +1,112 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of asyncio tracking interface
+"""
+
+import os
+import shutil
+import asyncio
+import tempfile
+import concurrent.futures
+import time
+import unittest
+
+import numpy
+
+from xboa.hit import Hit
+from xboa.tracking import TimeoutTracking
+from xboa.tracking import AsyncTrackingBase
+from xboa.tracking import ExecutorTracking
+from xboa.tracking import AsyncProcessTracking
+from xboa.tracking.tracking_process import ThisNodeProcess
+
+class AsyncTrackingTest(unittest.TestCase):
+    def setUp(self):
+        offset_in = numpy.matrix(numpy.zeros([1, 6]))
+        offset_out = [numpy.matrix(numpy.zeros([1, 6]))]
+        matrices = [numpy.matrix(numpy.zeros([6, 6]))]
+        for i in range(6):
+            matrices[0][i, i] = i
+        self.tracking = TimeoutTracking(matrices, offset_out, offset_in, 0)
+        self.hit_list = [Hit.new_from_dict({'x':i}) for i in range(10)]
+        self.ref_out = self.tracking.track_many(self.hit_list)
+
+    def test_base(self):
+        tracking = AsyncTrackingBase()
+        try:
+            asyncio.run(tracking.track_many(self.hit_list))
+            raise ValueError("Should have raised")
+        except NotImplementedError:
+            pass
+
+    def test_executor_threads(self):
+        self.tracking.timeout = 0.5
+        tracking = ExecutorTracking(self.tracking)
+        async def track():
+            return await asyncio.gather(*[tracking.track_many(self.hit_list)
+                                                          for i in range(4)])
+        start = time.time()
+        test_out = asyncio.run(track())
+        # four calls overlap
+        self.assertLess(time.time()-start, 1.5)
+        for hits_out in test_out:
+            self.assertEqual(hits_out, self.ref_out)
+        test_out = asyncio.run(tracking.track_one(self.hit_list[3]))
+        self.assertEqual(test_out, self.ref_out[3])
+        self.assertEqual(tracking.last, [self.ref_out[3]])
+
+    def test_executor_processes(self):
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            tracking = ExecutorTracking(self.tracking, executor)
+            test_out = asyncio.run(tracking.track_many(self.hit_list))
+        self.assertEqual(test_out, self.ref_out)
+
+    def test_process_tracking(self):
+        tmp_dir = tempfile.mkdtemp()
+        job = ThisNodeProcess(self.tracking)
+        job.tmp_dir = tmp_dir
+        tracking = AsyncProcessTracking(job, n_processes = 2, task_size = 3)
+        test_out = asyncio.run(tracking.track_many(self.hit_list))
+        self.assertEqual(test_out, self.ref_out)
+        self.assertEqual(tracking.last, self.ref_out)
+        # output directories are removed
+        self.assertEqual(os.listdir(tmp_dir), [])
+        shutil.rmtree(tmp_dir)
+        try:
+            AsyncProcessTracking(ThisNodeProcess(self.tracking), 0)
+            raise ValueError("Should have raised")
+        except ValueError:
+            pass
+
+    def test_process_tracking_cleanup(self):
+        tmp_dir = tempfile.mkdtemp()
+        job = ThisNodeProcess(self.tracking)
+        job.tmp_dir = tmp_dir
+        job.run_executable = "false" # exits without leaving a return value
+        tracking = AsyncProcessTracking(job, n_processes = 2, task_size = 3)
+        try:
+            asyncio.run(tracking.track_many(self.hit_list))
+            raise ValueError("Should have raised")
+        except RuntimeError:
+            pass
+        self.assertEqual(os.listdir(tmp_dir), [])
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
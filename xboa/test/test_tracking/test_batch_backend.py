@@ -0,0 +1,141 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of batch backends
+"""
+
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from xboa.tracking.tracking_process import BatchBackend
+from xboa.tracking.tracking_process import LocalQueueBackend
+from xboa.tracking.tracking_process import LSFBackend
+from xboa.tracking.tracking_process import SlurmBackend
+
+class LocalQueueBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.queue = LocalQueueBackend(2, os.path.join(self.tmp_dir, "spool"))
+
+    def tearDown(self):
+        for job_id in list(self.queue.running.keys()):
+            self.queue.kill(job_id)
+        shutil.rmtree(self.tmp_dir)
+
+    def submit(self, code):
+        job_id = self.queue.submit([sys.executable, "-c", code],
+                                   self.log_path(job_id = None, err = False),
+                                   self.log_path(job_id = None, err = True))
+        return job_id
+
+    def log_path(self, job_id, err):
+        if job_id == None:
+            job_id = self.queue.n_submitted
+        return os.path.join(self.tmp_dir, str(job_id)+[".out", ".err"][err])
+
+    def wait(self, job_id):
+        while self.queue.status(job_id)[0] in BatchBackend.active_states:
+            time.sleep(0.01)
+        return self.queue.status(job_id)
+
+    def test_slots(self):
+        job_ids = [self.submit("import time; time.sleep(1)") for i in range(3)]
+        self.assertEqual(self.queue.status(job_ids[0])[0], BatchBackend.RUNNING)
+        self.assertEqual(self.queue.status(job_ids[1])[0], BatchBackend.RUNNING)
+        self.assertEqual(self.queue.status(job_ids[2])[0], BatchBackend.PENDING)
+        self.assertEqual(self.wait(job_ids[0]), (BatchBackend.DONE, 0))
+        self.assertNotEqual(self.queue.status(job_ids[2])[0],
+                            BatchBackend.PENDING)
+        self.assertEqual(self.wait(job_ids[2]), (BatchBackend.DONE, 0))
+        self.assertEqual(self.queue.status(100), (BatchBackend.UNKNOWN, None))
+        # copies share the queue
+        self.assertIs(copy.deepcopy(self.queue), self.queue)
+
+    def test_exitcode_and_logs(self):
+        job_id = self.submit("import sys; print('hello'); "+\
+                             "sys.stderr.write('world'); sys.exit(3)")
+        self.assertEqual(self.wait(job_id), (BatchBackend.FAILED, 3))
+        with open(self.log_path(job_id, False)) as fin:
+            self.assertEqual(fin.read(), "hello\n")
+        with open(self.log_path(job_id, True)) as fin:
+            self.assertEqual(fin.read(), "world")
+        job_id = self.queue.submit(["/no/such/executable"],
+                                   self.log_path(None, False),
+                                   self.log_path(None, True))
+        self.assertEqual(self.wait(job_id)[0], BatchBackend.FAILED)
+
+    def test_kill(self):
+        job_ids = [self.submit("import time; time.sleep(100)") for i in range(3)]
+        self.queue.kill(job_ids[2]) # pending
+        self.assertEqual(self.queue.status(job_ids[2])[0], BatchBackend.FAILED)
+        self.queue.kill(job_ids[0]) # running
+        self.assertEqual(self.queue.status(job_ids[0])[0], BatchBackend.FAILED)
+        self.queue.kill(job_ids[1])
+
+    def test_clean_spool_dir(self):
+        spool_dir = self.queue.spool_dir
+        old_dir = tempfile.mkdtemp(dir = spool_dir)
+        age = LocalQueueBackend.spool_max_age+100
+        os.utime(old_dir, (time.time()-age, time.time()-age))
+        queue = LocalQueueBackend(1, spool_dir)
+        self.assertEqual(sorted(os.listdir(spool_dir)),
+                         sorted([os.path.basename(self.queue.queue_dir),
+                                 os.path.basename(queue.queue_dir)]))
+
+class ParseTest(unittest.TestCase):
+    def test_lsf(self):
+        self.assertEqual(LSFBackend.parse_submit(
+                "Job <1234> is submitted to queue <scarf-ibis>.\n"), 1234)
+        self.assertEqual(LSFBackend.parse_status(
+                "Job <1234>, User <me>, Project <default>, Status <RUN>"),
+                (BatchBackend.RUNNING, None))
+        self.assertEqual(LSFBackend.parse_status(
+                "Job <1234>, User <me>, Project <default>, Status <PEND>"),
+                (BatchBackend.PENDING, None))
+        self.assertEqual(LSFBackend.parse_status(
+                "Job <1234>, User <me>, Project <default>, Status <DONE>"),
+                (BatchBackend.DONE, 0))
+        self.assertEqual(LSFBackend.parse_status(
+                "Job <1234>, Status <EXIT>\n Exited with exit code 2."),
+                (BatchBackend.FAILED, 2))
+        self.assertEqual(LSFBackend.parse_status("Job <1234> is not found"),
+                (BatchBackend.UNKNOWN, None))
+
+    def test_slurm(self):
+        self.assertEqual(SlurmBackend.parse_submit("1234\n"), 1234)
+        self.assertEqual(SlurmBackend.parse_submit("1234;cluster\n"), 1234)
+        self.assertEqual(SlurmBackend.parse_status(""),
+                         (BatchBackend.UNKNOWN, None))
+        self.assertEqual(SlurmBackend.parse_status("PENDING|0:0\n"),
+                         (BatchBackend.PENDING, None))
+        self.assertEqual(SlurmBackend.parse_status("RUNNING|0:0\n"),
+                         (BatchBackend.RUNNING, None))
+        self.assertEqual(SlurmBackend.parse_status("COMPLETED|0:0\n"),
+                         (BatchBackend.DONE, 0))
+        self.assertEqual(SlurmBackend.parse_status("FAILED|3:0\n"),
+                         (BatchBackend.FAILED, 3))
+        self.assertEqual(SlurmBackend.parse_status("CANCELLED by 1000|0:15\n"),
+                         (BatchBackend.FAILED, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
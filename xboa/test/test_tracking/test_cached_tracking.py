@@ -0,0 +1,143 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of CachedTracking
+"""
+
+import shutil
+import tempfile
+import unittest
+import numpy
+
+from xboa.hit import Hit
+import xboa.common as Common
+from xboa.tracking import MatrixTracking
+from xboa.tracking import CachedTracking
+
+class CountingTracking(MatrixTracking):
+    """MatrixTracking that counts the number of hits tracked"""
+    def __init__(self, *args):
+        MatrixTracking.__init__(self, *args)
+        self.n_tracked = 0
+
+    def track_many(self, list_of_hits):
+        self.n_tracked += len(list_of_hits)
+        return MatrixTracking.track_many(self, list_of_hits)
+
+class TestCachedTracking(unittest.TestCase):
+    """
+    Test CachedTracking
+    """
+    def setUp(self):
+        matrix = numpy.matrix([[0.75**0.5, 0.5, 0.0, 0.0, 0.0, 0.0],
+                               [-0.5, 0.75**0.5, 0.0, 0.0, 0.0, 0.0],
+                               [0.0, 0.0, 1.0, 0.5, 0.0, 0.0],
+                               [0.0, 0.0, 0.0, 1.0, 0.0, 0.0],
+                               [0.0, 0.0, 0.0, 0.0, 1.0, 0.0],
+                               [0.0, 0.0, 0.0, 0.0, 0.0, 1.0]])
+        offset = numpy.matrix([0., 0., 0., 0., 0., 1000.])
+        self.tracking = CountingTracking([matrix**i for i in range(5)],
+                                         [offset]*5, offset)
+        self.hit_list = [Hit.new_from_dict({"mass":Common.pdg_pid_to_mass[2212],
+                                            "pid":2212, "x":float(i),
+                                            "energy":1001.}, "pz")
+                                                           for i in range(5)]
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_track_many(self):
+        cached = CachedTracking(self.tracking, "lattice_1")
+        ref_out = self.tracking.track_many(self.hit_list)
+        self.tracking.n_tracked = 0
+        test_out = cached.track_many(self.hit_list+self.hit_list[0:2])
+        self.assertEqual(test_out, ref_out+ref_out[0:2])
+        self.assertEqual(cached.last, test_out)
+        self.assertEqual(self.tracking.n_tracked, 5) # repeats tracked once
+        test_out = cached.track_many(self.hit_list)
+        self.assertEqual(test_out, ref_out)
+        self.assertEqual(self.tracking.n_tracked, 5)
+        self.assertEqual(cached.cache_info(),
+                      {"hits":7, "misses":5, "size":5, "max_size":10000})
+        # returned hits are copies of the cache
+        test_out[0][0]["x"] = 100.
+        self.assertEqual(cached.track_one(self.hit_list[0]), ref_out[0])
+        self.assertEqual(cached.last, [ref_out[0]])
+
+    def test_key(self):
+        cached = CachedTracking(self.tracking, "lattice_1", quantum = 1e-3)
+        hit = self.hit_list[0].deepcopy()
+        hit["x"] += 1e-5
+        self.assertEqual(cached.get_key(hit), cached.get_key(self.hit_list[0]))
+        hit["x"] += 1e-2
+        self.assertNotEqual(cached.get_key(hit),
+                            cached.get_key(self.hit_list[0]))
+        other = CachedTracking(self.tracking, "lattice_2", quantum = 1e-3)
+        self.assertNotEqual(other.get_key(self.hit_list[0]),
+                            cached.get_key(self.hit_list[0]))
+        # only listed variables are used
+        cached = CachedTracking(self.tracking, variables = ["x", "px"])
+        hit = self.hit_list[0].deepcopy()
+        hit["event_number"] = 10
+        self.assertEqual(cached.get_key(hit), cached.get_key(self.hit_list[0]))
+
+    def test_global_weight(self):
+        Hit.clear_global_weights()
+        cached = CachedTracking(self.tracking, "lattice_1")
+        hit_list = [hit.deepcopy() for hit in self.hit_list]
+        for i, hit in enumerate(hit_list):
+            hit["event_number"] = i+1
+            hit["global_weight"] = 1./(i+2)
+        key = cached.get_key(hit_list[0])
+        hit_list[0]["global_weight"] = 0.75
+        self.assertEqual(cached.get_key(hit_list[0]), key)
+        cached.track_many(hit_list)
+        cached.track_many(hit_list) # served from the cache
+        self.assertEqual(self.tracking.n_tracked, 5)
+        self.assertEqual(Hit.new_from_dict({"event_number":0})["global_weight"],
+                         1.)
+        self.assertEqual(Hit.new_from_dict({"event_number":3})["global_weight"],
+                         0.25)
+        Hit.clear_global_weights()
+
+    def test_eviction(self):
+        cached = CachedTracking(self.tracking, max_size = 3)
+        cached.track_many(self.hit_list)
+        self.assertEqual(cached.cache_info()["size"], 3)
+        self.tracking.n_tracked = 0
+        cached.track_many(self.hit_list[-3:]) # most recent are kept
+        self.assertEqual(self.tracking.n_tracked, 0)
+        cached.track_many(self.hit_list[0:1]) # oldest was evicted
+        self.assertEqual(self.tracking.n_tracked, 1)
+
+    def test_disk(self):
+        cached = CachedTracking(self.tracking, max_size = 1,
+                                cache_dir = self.tmp_dir)
+        ref_out = cached.track_many(self.hit_list)
+        self.tracking.n_tracked = 0
+        cached = CachedTracking(self.tracking, cache_dir = self.tmp_dir)
+        self.assertEqual(cached.track_many(self.hit_list), ref_out)
+        self.assertEqual(self.tracking.n_tracked, 0)
+        cached.clear(clear_disk = True)
+        self.assertEqual(cached.cache_info()["size"], 0)
+        self.assertEqual(cached.track_many(self.hit_list), ref_out)
+        self.assertEqual(self.tracking.n_tracked, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of MAUSTracking using FakeMAUS
+"""
+
+import json
+import pickle
+import unittest
+import numpy
+
+from xboa.hit import Hit
+from xboa.tracking import MatrixTracking
+from xboa.tracking import MAUSTracking
+from xboa.tracking import FakeMAUS
+
+class FakeMAUSTest(unittest.TestCase):
+    """
+    Test MAUSTracking, with tracking done by FakeMAUS
+    """
+    def setUp(self):
+        """Make a FakeMAUS and some hits"""
+        matrix = numpy.matrix([[1., 0.5, 0., 0., 0., 0.],
+                               [-0.5, 1., 0., 0., 0., 0.],
+                               [0., 0., 1., 0.5, 0., 0.],
+                               [0., 0., 0., 1., 0., 0.],
+                               [0., 0., 0., 0., 1., 0.],
+                               [0., 0., 0., 0., 0., 1.]])
+        offset = numpy.matrix([0., 0., 0., 0., 0., 226.])
+        self.matrix_tracking = MatrixTracking([matrix**i for i in range(1, 4)],
+                                              [offset]*3, offset)
+        self.fake = FakeMAUS(self.matrix_tracking, z_list=[100., 200., 300.])
+        self.hits = [Hit.new_from_dict({"x":float(i), "px":0.1*i, "y":-1.,
+                                        "py":2., "z":0., "t":0.5*i,
+                                        "pid":-13, "mass":105.6583668,
+                                        "charge":1., "energy":226.},
+                                       "pz") for i in range(7)]
+
+    def test_fake_maus(self):
+        """Test FakeMAUS emulates the maus_cpp interface"""
+        self.assertFalse(self.fake.globals.has_instance())
+        self.fake.globals.birth(json.dumps({}))
+        self.assertTrue(self.fake.globals.has_instance())
+        self.fake.globals.death()
+        self.assertFalse(self.fake.globals.has_instance())
+        try:
+            FakeMAUS(self.matrix_tracking, z_list=[1.])
+            self.assertTrue(False, msg="Should have raised")
+        except IndexError:
+            pass
+
+    def test_track_many(self):
+        """Test MAUSTracking track_many gives same output as MatrixTracking"""
+        reference = self.matrix_tracking.track_many(self.hits)
+        for batch_size in None, 1, 3, 7, 100:
+            tracking = MAUSTracking(batch_size=batch_size, maus=self.fake,
+                                    seed=10)
+            hits_out = tracking.track_many(self.hits)
+            self.assertEqual(len(hits_out), len(self.hits))
+            self.assertEqual(tracking.random_seed, 10+len(self.hits))
+            for event, hit_list in enumerate(hits_out):
+                self.assertEqual(len(hit_list), 4)
+                self.assertEqual([hit["station"] for hit in hit_list],
+                                 [-1, 1, 2, 3])
+                self.assertEqual([hit["z"] for hit in hit_list],
+                                 [0., 100., 200., 300.])
+                for i, hit in enumerate(hit_list):
+                    self.assertEqual(hit["event_number"], event)
+                    self.assertEqual(hit["spill"], 0)
+                    self.assertEqual(hit["pid"], -13)
+                    self.assertAlmostEqual(hit["mass"], 105.6583668)
+                    self.assertEqual(hit["charge"], 1.)
+                    for key in "x", "px", "y", "py", "pz", "t", "energy":
+                        self.assertAlmostEqual(hit[key],
+                                               reference[event][i][key], 6)
+        self.assertEqual(tracking.track_many([]), [])
+        self.assertEqual(tracking.spill, 2)
+
+    def test_batches(self):
+        """Test MAUSTracking calls track_particles once per batch"""
+        tracking = MAUSTracking(batch_size=3, maus=self.fake)
+        tracking.track_many(self.hits)
+        self.assertEqual(self.fake.n_calls, 3)
+        seeds = []
+        real_track_particles = self.fake.track_particles
+        def track_particles(primary_str):
+            seeds.extend([item["primary"]["random_seed"] \
+                                       for item in json.loads(primary_str)])
+            return real_track_particles(primary_str)
+        self.fake.track_particles = track_particles
+        tracking.track_one(self.hits[0])
+        tracking.track_many(self.hits)
+        self.assertEqual(seeds, list(range(7, 15)))
+        try:
+            MAUSTracking(batch_size=0, maus=self.fake)
+            self.assertTrue(False, msg="Should have raised")
+        except ValueError:
+            pass
+
+    def test_pickle(self):
+        """Test MAUSTracking can be pickled with a FakeMAUS"""
+        tracking = MAUSTracking(datacards={}, batch_size=2, maus=self.fake)
+        tracking.track_many(self.hits[0:2])
+        tracking = pickle.loads(pickle.dumps(tracking))
+        self.assertEqual(tracking.batch_size, 2)
+        self.assertEqual(tracking.spill, 1)
+        self.assertTrue(tracking.maus.globals.has_instance())
+        hit_list = tracking.track_one(self.hits[3])
+        self.assertAlmostEqual(hit_list[1]["x"],
+                               self.matrix_tracking.track_one(self.hits[3])[1]["x"])
+        # state with no batch_size, as pickled by older versions
+        state = tracking.__getstate__()
+        del state['batch_size']
+        tracking = MAUSTracking.__new__(MAUSTracking)
+        tracking.__setstate__(state)
+        self.assertEqual(tracking.batch_size, 1000)
+        self.assertEqual(tracking.spill, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of MapTracking
+"""
+
+import unittest
+import numpy
+
+from xboa.hit import Hit
+from xboa.bunch import Bunch
+import xboa.common as Common
+from xboa.tracking import MatrixTracking
+from xboa.tracking import MapTracking
+
+class TestMapTracking(unittest.TestCase):
+    """
+    Test MapTracking
+    """
+    def setUp(self):
+        numpy.random.seed(1)
+        data = [[0.75**0.5, 0.5,        0.0, 0.0, 0.0, 0.0],
+                [-0.5,      0.75**0.5, 0.0, 0.0, 0.0, 0.0],
+                [0.0, 0.0, 1.,  0.5, 0.0, 0.0],
+                [0.0, 0.0, 0.0, 1.0, 0.0, 0.0],
+                [0.0, 0.0, 0.0, 0.0, 1./0.9, 0.5],
+                [0.0, 0.0, 0.0, 0.0, 0.0, 0.9]]
+        self.matrix = numpy.matrix(data)
+        self.offset = numpy.matrix([0., 0., -3., 0., -5., 1000.-6.])
+        self.offset_in = numpy.matrix([0., 0., 0., 0., 0., 1000.])
+        self.hit_list = []
+        for i in range(20):
+            hit = Hit.new_from_dict({"mass":Common.pdg_pid_to_mass[2212],
+                                     "pid":2212, "event_number":i}, "")
+            for key, value in zip(MatrixTracking.variables,
+                                  numpy.random.randn(6)):
+                hit[key] = value
+            hit["energy"] += 1001.
+            hit.mass_shell_condition("pz")
+            self.hit_list.append(hit)
+
+    def symmetric(self, shape):
+        """Random tensor that is symmetric in all but the first index"""
+        tensor = numpy.random.randn(*shape)*1e-3
+        if len(shape) == 3:
+            tensor = (tensor + tensor.transpose(0, 2, 1))/2.
+        return tensor
+
+    def test_init(self):
+        for maps, offsets, offset_in in [
+                ([[self.matrix]], [], self.offset_in), # wrong length
+                ([[self.matrix]], [[0.]*5], self.offset_in), # offset size
+                ([[self.matrix]], [self.offset], [0.]*7), # offset_in size
+                ([[numpy.zeros((6, 5))]], [self.offset], self.offset_in),
+                ([[self.matrix, numpy.zeros((6, 6))]], [self.offset],
+                                                                self.offset_in),
+                ([[]], [self.offset], self.offset_in)]:
+            try:
+                MapTracking(maps, offsets, offset_in)
+                self.assertTrue(False, msg="Should have raised")
+            except (IndexError, TypeError):
+                pass
+
+    def test_first_order(self):
+        matrix_list = [self.matrix**i for i in range(5)]
+        offset_list = [self.offset*i for i in range(5)]
+        ref_tracking = MatrixTracking(matrix_list, offset_list, self.offset_in)
+        test_tracking = MapTracking([[tm] for tm in matrix_list],
+                                    offset_list, self.offset_in)
+        self.assertEqual(test_tracking.track_many(self.hit_list),
+                         ref_tracking.track_many(self.hit_list))
+        self.assertEqual(test_tracking.track_one(self.hit_list[0]),
+                         ref_tracking.track_one(self.hit_list[0]))
+
+    def test_track_array(self):
+        m2 = self.symmetric((6, 6, 6))
+        m3 = numpy.random.randn(6, 6, 6, 6)*1e-4
+        maps = [[self.matrix], [self.matrix, m2], [self.matrix, m2, m3]]
+        tracking = MapTracking(maps, [self.offset]*3, self.offset_in)
+        tracking.batch_size = 7 # check batching
+        coordinates = numpy.random.randn(20, 6)
+        test_out = tracking.track_array(coordinates)
+        self.assertEqual(test_out.shape, (20, 3, 6))
+        delta = coordinates - numpy.asarray(self.offset_in)
+        offset = numpy.asarray(self.offset).reshape(6)
+        ref_1 = numpy.einsum('ab,nb->na', numpy.asarray(self.matrix), delta)
+        ref_2 = numpy.einsum('abc,nb,nc->na', m2, delta, delta)
+        ref_3 = numpy.einsum('abcd,nb,nc,nd->na', m3, delta, delta, delta)
+        for i, ref in enumerate([ref_1, ref_1+ref_2, ref_1+ref_2+ref_3]):
+            self.assertLess(numpy.amax(abs(test_out[:, i]-ref-offset)), 1e-9)
+
+    def test_fit_map(self):
+        m2 = self.symmetric((6, 6, 6))
+        m3 = numpy.random.randn(6, 6, 6, 6)*1e-4
+        # symmetrise in the last three indices
+        m3 = sum([m3.transpose((0,)+perm) for perm in [(1, 2, 3), (1, 3, 2),
+                 (2, 1, 3), (2, 3, 1), (3, 1, 2), (3, 2, 1)]])/6.
+        offset_in = numpy.array([1., 2., 3., 4., 5., 1000.])
+        tracking = MapTracking([[self.matrix, m2, m3]], [self.offset],
+                               offset_in)
+        coordinates = numpy.random.randn(500, 6)+offset_in
+        bunch_in = Bunch.new_from_hits([Hit.new_from_dict(
+                                   dict(zip(MatrixTracking.variables, u)))
+                                                          for u in coordinates])
+        u_out = tracking.track_array(coordinates)[:, 0]
+        bunch_out = Bunch.new_from_hits([Hit.new_from_dict(
+                                   dict(zip(MatrixTracking.variables, u)))
+                                                          for u in u_out])
+        for order in [2, 3]:
+            transfer_map, offset_out, test_offset_in = MapTracking.fit_map(
+                               bunch_in, bunch_out, order, offset_in)
+            self.assertEqual(len(transfer_map), order)
+            fit_tracking = MapTracking([transfer_map], [offset_out],
+                                       test_offset_in)
+            residual = fit_tracking.track_array(coordinates)[:, 0]-u_out
+            if order == 3: # exact
+                self.assertLess(numpy.amax(abs(residual)), 1e-9)
+                self.assertLess(numpy.amax(abs(transfer_map[1]-m2)), 1e-9)
+                self.assertLess(numpy.amax(abs(transfer_map[2]-m3)), 1e-9)
+            else: # third order term is missing
+                self.assertGreater(numpy.amax(abs(residual)), 1e-9)
+                self.assertLess(numpy.amax(abs(residual)), 1e-1)
+        # default offset_in is the mean of bunch_in
+        test_offset_in = MapTracking.fit_map(bunch_in, bunch_out, 1)[2]
+        self.assertLess(numpy.amax(abs(test_offset_in -
+                                       numpy.mean(coordinates, axis=0))), 1e-9)
+        try:
+            MapTracking.fit_map(bunch_in, bunch_out, 4)
+            self.assertTrue(False, msg="Should have raised")
+        except ValueError:
+            pass
+
+    def test_monomials(self):
+        delta = numpy.random.randn(5, 3)
+        index_list, monomials = MapTracking.monomials(delta, 3)
+        self.assertEqual(len(index_list), 3+6+10)
+        for index, column in zip(index_list, monomials.transpose()):
+            ref = numpy.prod(delta[:, list(index)], axis=1)
+            self.assertLess(numpy.amax(abs(column-ref)), 1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -135,6 +135,46 @@ class TestMatrixTracking(unittest.TestCase):
         self.assertNotEqual(hit_list_of_lists[-1], hit_list_of_lists[0])
         self.assertEqual(tracking.last, hit_list_of_lists)
 
+    def test_track_many_reference(self):
+        """
+        Test MatrixTracking.track_many against a hit-by-hit calculation
+        """
+        tracking = MatrixTracking(self.matrix_list, self.offset_list,
+                                  self.offset_in)
+        numpy.random.seed(1)
+        hits_in = []
+        for i in range(20):
+            hit = Hit.new_from_dict({"mass":Common.pdg_pid_to_mass[2212],
+                                     "charge":1., "pid":2212,
+                                     "event_number":i}, "")
+            for key, value in zip(tracking.variables,
+                                  numpy.random.randn(6)):
+                hit[key] = value
+            hit["energy"] += 1001.
+            hit["global_weight"] = 0.1*(i+1)
+            hit.mass_shell_condition("pz")
+            hits_in.append(hit)
+        hit_list_of_lists = tracking.track_many(hits_in)
+        self.assertEqual(len(hit_list_of_lists), len(hits_in))
+        for hit_in, hit_list in zip(hits_in, hit_list_of_lists):
+            self.assertEqual(hit_list[0], hit_in)
+            for i, tm in enumerate(self.matrix_list):
+                vec_in = numpy.matrix([hit_in[key] \
+                                       for key in tracking.variables])
+                vec_out = tm * (vec_in - self.offset_in).transpose() + \
+                          self.offset_list[i].transpose()
+                hit_ref = hit_in.deepcopy()
+                for j, key in enumerate(tracking.variables):
+                    hit_ref[key] = float(vec_out[j, 0])
+                hit_ref.mass_shell_condition("pz")
+                for key, value in hit_ref.dict_from_hit().items():
+                    self.assertAlmostEqual(hit_list[i+1][key], value, 6,
+                                           msg=key)
+        u_out = tracking.track_array([[hit[key] for key in tracking.variables]
+                                                for hit in hits_in])
+        self.assertEqual(u_out.shape, (20, self.num_turns, 6))
+        self.assertEqual(tracking.track_many([]), [])
+
 
 if __name__ == "__main__":
     unittest.main()
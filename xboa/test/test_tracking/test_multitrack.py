@@ -14,6 +14,11 @@
 # along with xboa in the doc folder.  If not, see 
 # <http://www.gnu.org/licenses/>.
 
+import os
+import json
+import shutil
+import tempfile
+import time
 import unittest
 
 import numpy
@@ -21,7 +26,9 @@ import numpy
 from xboa.tracking import TimeoutTracking
 from xboa.hit import Hit
 from xboa.tracking import MultiTrack
+from xboa.tracking import Profiler
 from xboa.tracking.tracking_process import ThisNodeProcess
+from xboa.tracking.tracking_process import PipeProcess
 
 class MultiTrackTest(unittest.TestCase):
     def setUp(self):
@@ -59,6 +66,215 @@ class MultiTrackTest(unittest.TestCase):
         test_out = test_multi.track_many(self.hit_list)
         self.assertEqual(len(test_out), len(self.hit_list))
 
+    def test_track_many_pipe(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        test_multi = MultiTrack(3, PipeProcess(self.tracking))
+        test_out = test_multi.track_many(self.hit_list)
+        self.assertEqual(test_out, ref_out)
+        for job in test_multi.job_list:
+            job.close()
+
+    def test_profiler(self):
+        profiler = Profiler()
+        test_multi = MultiTrack(2, PipeProcess(self.tracking), task_size = 100,
+                                profiler = profiler)
+        test_multi.track_many(self.hit_list)
+        for job in test_multi.job_list:
+            job.close()
+        report = profiler.report()
+        self.assertEqual(report["events"]["start_pool"]["count"], 1)
+        for name in "dispatch", "task", "collect":
+            self.assertEqual(report["events"][name]["count"],
+                             len(test_multi.task_list))
+            self.assertEqual(report["events"][name]["n_hits"], 1000)
+        self.assertGreater(report["events"]["dispatch"]["n_bytes"], 0)
+        self.assertGreater(report["events"]["collect"]["n_bytes"], 0)
+        self.assertEqual(sorted(report["workers"].keys())[1:], [1, 2])
+        self.assertGreater(report["workers"][1]["utilisation"], 0.)
+
+    def test_task_size(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        for process in [ThisNodeProcess(self.tracking),
+                        PipeProcess(self.tracking)]:
+            test_multi = MultiTrack(3, process, task_size = 150)
+            test_out = test_multi.track_many(self.hit_list)
+            self.assertEqual(test_out, ref_out)
+            # tasks cover the input in order
+            self.assertEqual(test_multi.task_list[0][0], 0)
+            for task_0, task_1 in zip(test_multi.task_list[:-1],
+                                      test_multi.task_list[1:]):
+                self.assertEqual(task_0[1], task_1[0])
+            self.assertEqual(test_multi.task_list[-1][1], len(self.hit_list))
+            self.assertGreater(len(test_multi.task_list), 3)
+            for start, end in test_multi.task_list:
+                self.assertLessEqual(end-start, 150)
+            for task_time in test_multi.task_times:
+                self.assertGreater(task_time, 0.)
+            self.assertEqual(len(test_multi.job_list), 3)
+
+    def test_target_task_time(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        test_multi = MultiTrack(2, PipeProcess(self.tracking),
+                                task_size = 10, target_task_time = 0.5)
+        test_out = test_multi.track_many(self.hit_list)
+        self.assertEqual(test_out, ref_out)
+        # first tasks use task_size; later tasks are tuned
+        self.assertEqual(test_multi.task_list[0], (0, 10))
+        sizes = [end-start for start, end in test_multi.task_list]
+        self.assertGreater(max(sizes), 10)
+        try:
+            MultiTrack(2, PipeProcess(self.tracking), task_size = 0)
+            raise ValueError("Should have raised")
+        except ValueError:
+            pass
+
+    def test_checkpoint_resume(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            test_multi = MultiTrack(2, PipeProcess(self.tracking),
+                                    task_size = 100, checkpoint_dir = tmp_dir)
+            self.assertEqual(test_multi.track_many(self.hit_list), ref_out)
+            manifest_path = os.path.join(tmp_dir, "manifest.json")
+            with open(manifest_path) as fin:
+                manifest = json.load(fin)
+            self.assertEqual(manifest["pending"], [])
+            self.assertEqual(manifest["finished"][0], [0, 100, "task_0_100.npz"])
+            self.assertEqual(manifest["finished"][-1][1], len(self.hit_list))
+            # pretend that two tasks did not finish
+            start, end = manifest["finished"][3][0], manifest["finished"][4][1]
+            manifest["finished"] = manifest["finished"][0:3]+\
+                                   manifest["finished"][5:]
+            manifest["pending"] = [[start, end]]
+            with open(manifest_path, "w") as fout:
+                json.dump(manifest, fout)
+            test_multi = MultiTrack(2, PipeProcess(self.tracking))
+            self.assertEqual(test_multi.resume(tmp_dir), ref_out)
+            new_tasks = [task for task, task_time in \
+                         zip(test_multi.task_list, test_multi.task_times) \
+                                                     if task_time != None]
+            self.assertEqual(min(new_tasks)[0], start)
+            self.assertEqual(max(new_tasks)[1], end)
+            self.assertEqual(sum([task[1]-task[0] for task in new_tasks]),
+                             end-start)
+            with open(manifest_path) as fin:
+                manifest = json.load(fin)
+            self.assertEqual(manifest["pending"], [])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_checkpoint_resume_global_weight(self):
+        Hit.clear_global_weights()
+        hit_list = [Hit.new_from_dict({'x':i, 'event_number':i+1})
+                                                            for i in range(20)]
+        for i, hit in enumerate(hit_list):
+            hit['global_weight'] = 1./(i+2)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            test_multi = MultiTrack(2, PipeProcess(self.tracking),
+                                    task_size = 5, checkpoint_dir = tmp_dir)
+            test_multi.track_many(hit_list)
+            manifest_path = os.path.join(tmp_dir, "manifest.json")
+            with open(manifest_path) as fin:
+                manifest = json.load(fin)
+            manifest["pending"] = [manifest["finished"][1][0:2]]
+            manifest["finished"] = manifest["finished"][0:1]+\
+                                   manifest["finished"][2:]
+            with open(manifest_path, "w") as fout:
+                json.dump(manifest, fout)
+            test_multi = MultiTrack(2, PipeProcess(self.tracking))
+            hits_out = test_multi.resume(tmp_dir)
+            self.assertEqual(len(hits_out), len(hit_list))
+            for i, hits in enumerate(hits_out):
+                for hit in hits:
+                    self.assertEqual(hit['event_number'], i+1)
+                    self.assertAlmostEqual(hit['global_weight'], 1./(i+2))
+            event_zero = Hit.new_from_dict({'event_number':0})
+            self.assertEqual(event_zero['global_weight'], 1.)
+        finally:
+            shutil.rmtree(tmp_dir)
+            Hit.clear_global_weights()
+
+    def test_clean_tmp_dir(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            process = ThisNodeProcess(self.tracking)
+            old_dir = tempfile.mkdtemp(dir = tmp_dir)
+            new_dir = tempfile.mkdtemp(dir = tmp_dir)
+            os.makedirs(os.path.join(tmp_dir, "spool"))
+            os.utime(old_dir, (time.time()-100, time.time()-100))
+            removed = process.clean_tmp_dir(tmp_dir, 50)
+            self.assertEqual(removed, [old_dir])
+            self.assertEqual(sorted(os.listdir(tmp_dir)),
+                             sorted(["spool", os.path.basename(new_dir)]))
+            process.cleanup()
+            self.assertFalse(os.path.exists(process.out_dir))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_track_iter(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        test_multi = MultiTrack(2, PipeProcess(self.tracking), task_size = 100)
+        indices = []
+        for index, hits_out in test_multi.track_iter(self.hit_list):
+            self.assertEqual(hits_out, ref_out[index])
+            indices.append(index)
+        self.assertEqual(sorted(indices), list(range(len(self.hit_list))))
+        # output is not retained
+        self.assertEqual(test_multi.get_return_value(), [])
+        # closing the generator early kills the jobs
+        self.tracking.timeout = 0.5
+        test_multi = MultiTrack(2, PipeProcess(self.tracking), task_size = 100)
+        iterator = test_multi.track_iter(self.hit_list)
+        next(iterator)
+        self.assertTrue(test_multi.job_list[0].is_alive() or
+                        test_multi.job_list[1].is_alive())
+        iterator.close()
+        for job in test_multi.job_list:
+            self.assertFalse(job.is_alive())
+
+    def test_track_bunches(self):
+        ref_out = self.tracking.track_many(self.hit_list)
+        test_multi = MultiTrack(2, PipeProcess(self.tracking), task_size = 100)
+        bunches = test_multi.track_bunches(self.hit_list)
+        self.assertEqual(len(bunches), len(ref_out[0]))
+        for i, bunch in enumerate(bunches):
+            self.assertEqual(len(bunch), len(self.hit_list))
+            for j in [0, 10, 999]:
+                self.assertEqual(bunch[j], ref_out[j][i])
+
+    def test_track_one(self):
+        test_multi = MultiTrack(3, ThisNodeProcess(self.tracking))
+        test_out = test_multi.track_one(self.hit_list[1])
+        self.assertEqual(test_out, self.tracking.track_one(self.hit_list[1]))
+
+    def test_wait_jobs(self):
+        self.tracking.timeout = 1
+        test_multi = MultiTrack(3, ThisNodeProcess(self.tracking))
+        test_multi.track_many_async(self.hit_list)
+        start = time.time()
+        indices = []
+        for index, hits in test_multi.wait_jobs():
+            indices.append(index)
+            start, end = test_multi.task_list[index]
+            self.assertEqual(len(hits), end-start)
+        self.assertEqual(sorted(indices), [0, 1, 2])
+        self.assertEqual(len(test_multi.get_return_value()), len(self.hit_list))
+        self.assertEqual(test_multi.last[10], self.tracking.track_one(self.hit_list[10]))
+
+    def test_job_timeout(self):
+        self.tracking.timeout = 100
+        test_multi = MultiTrack(2, ThisNodeProcess(self.tracking),
+                                job_timeout = 1, max_retries = 1)
+        start = time.time()
+        try:
+            test_multi.track_many(self.hit_list)
+            raise ValueError("Timed out job should have raised")
+        except RuntimeError:
+            pass
+        self.assertLess(time.time()-start, 30.)
+        self.assertEqual(test_multi.task_retries[0], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,154 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+tests of ProfiledTracking and Profiler
+"""
+
+import os
+import json
+import time
+import tempfile
+import unittest
+import numpy
+
+from xboa.hit import Hit
+from xboa.tracking import TrackingBase
+from xboa.tracking import MatrixTracking
+from xboa.tracking import Profiler
+from xboa.tracking import ProfiledTracking
+
+class ProfilerTest(unittest.TestCase):
+    """
+    Test Profiler
+    """
+    def test_report(self):
+        """Test Profiler.report summarises the events"""
+        profiler = Profiler()
+        self.assertEqual(profiler.report()["total_wall_time"], 0.)
+        profiler.add_event("task", "tracking", 10., 2., None, 1, 100, 50)
+        profiler.add_event("task", "tracking", 12., 2., None, 1, 300, 50)
+        profiler.add_event("task", "tracking", 10., 1., None, 2, 100, 50)
+        profiler.add_event("wait", "idle", 10., 3.9, 0.1, 0)
+        report = profiler.report()
+        self.assertAlmostEqual(report["total_wall_time"], 4.)
+        task = report["events"]["task"]
+        self.assertEqual(task["count"], 3)
+        self.assertEqual(task["category"], "tracking")
+        self.assertAlmostEqual(task["wall_time"], 5.)
+        self.assertEqual(task["cpu_time"], None)
+        self.assertEqual(task["n_hits"], 500)
+        self.assertEqual(task["n_bytes"], 150)
+        self.assertAlmostEqual(task["hits_per_second"], 100.)
+        self.assertAlmostEqual(report["events"]["wait"]["cpu_time"], 0.1)
+        self.assertAlmostEqual(report["workers"][1]["utilisation"], 1.)
+        self.assertAlmostEqual(report["workers"][2]["utilisation"], 0.25)
+        self.assertAlmostEqual(report["workers"][0]["utilisation"], 0.)
+        profiler.clear()
+        self.assertEqual(profiler.events, [])
+
+    def test_chrome_trace(self):
+        """Test Profiler.write_chrome_trace"""
+        profiler = Profiler()
+        started = profiler.start()
+        profiler.stop(started, "start_pool", "setup")
+        profiler.add_event("task", "tracking", profiler.start_time+1., 0.5,
+                           None, 1, 10)
+        file_name = tempfile.mktemp(suffix=".json")
+        try:
+            profiler.write_chrome_trace(file_name)
+            with open(file_name) as fin:
+                trace = json.load(fin)
+        finally:
+            os.remove(file_name)
+        metadata = [event for event in trace["traceEvents"] \
+                                                     if event["ph"] == "M"]
+        self.assertEqual([event["args"]["name"] for event in metadata],
+                         ["main", "worker 0"])
+        events = [event for event in trace["traceEvents"] \
+                                                     if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in events],
+                         ["start_pool", "task"])
+        self.assertAlmostEqual(events[1]["ts"], 1e6)
+        self.assertAlmostEqual(events[1]["dur"], 5e5)
+        self.assertEqual(events[1]["tid"], 1)
+        self.assertEqual(events[1]["args"]["n_hits"], 10)
+
+class SlowPickle(object):
+    """Object that takes a long time to pickle"""
+    def __getstate__(self):
+        time.sleep(0.2)
+        return {}
+
+class SlowPickleTracking(TrackingBase):
+    """Tracking that returns objects that are slow to pickle"""
+    def track_one(self, hit):
+        return [SlowPickle()]
+
+    def track_many(self, list_of_hits):
+        return [[SlowPickle()] for hit in list_of_hits]
+
+class ProfiledTrackingTest(unittest.TestCase):
+    """
+    Test ProfiledTracking
+    """
+    def setUp(self):
+        """Make a MatrixTracking"""
+        offset = numpy.matrix(numpy.zeros([1, 6]))
+        matrix = numpy.matrix(numpy.identity(6))
+        self.tracking = MatrixTracking([matrix, matrix], [offset, offset],
+                                       offset)
+        self.hit_list = [Hit.new_from_dict({'x':i}) for i in range(10)]
+
+    def test_track(self):
+        """Test ProfiledTracking records each call"""
+        profiled = ProfiledTracking(self.tracking, measure_bytes = True)
+        self.assertEqual(profiled.track_many(self.hit_list),
+                         self.tracking.track_many(self.hit_list))
+        self.assertEqual(profiled.track_one(self.hit_list[0]),
+                         self.tracking.track_one(self.hit_list[0]))
+        self.assertEqual(len(profiled.last), 1)
+        report = profiled.report()
+        self.assertEqual(report["events"]["track_many"]["n_hits"], 10)
+        self.assertEqual(report["events"]["track_one"]["n_hits"], 1)
+        self.assertGreater(report["events"]["track_many"]["n_bytes"], 0)
+        self.assertNotEqual(report["events"]["track_one"]["cpu_time"], None)
+        self.assertEqual(list(report["workers"].keys()), [0])
+
+    def test_measure_bytes_not_timed(self):
+        """Test time spent measuring bytes is not counted as tracking time"""
+        profiled = ProfiledTracking(SlowPickleTracking(), measure_bytes = True)
+        profiled.track_one(self.hit_list[0])
+        profiled.track_many(self.hit_list[0:1])
+        report = profiled.report()
+        for name in "track_one", "track_many":
+            self.assertGreater(report["events"][name]["n_bytes"], 0)
+            self.assertLess(report["events"][name]["wall_time"], 0.1)
+
+    def test_shared_profiler(self):
+        """Test ProfiledTracking can share a Profiler"""
+        profiler = Profiler()
+        profiled_1 = ProfiledTracking(self.tracking, profiler, 1)
+        profiled_2 = ProfiledTracking(self.tracking, profiler, 2)
+        profiled_1.track_many(self.hit_list)
+        profiled_2.track_many(self.hit_list)
+        report = profiler.report()
+        self.assertEqual(report["events"]["track_many"]["count"], 2)
+        self.assertEqual(report["events"]["track_many"]["n_bytes"], 0)
+        self.assertEqual(sorted(report["workers"].keys()), [1, 2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,8 @@
 # along with xboa in the doc folder.  If not, see 
 # <http://www.gnu.org/licenses/>.
 
+import copy
+import pickle
 import time
 import unittest
 import subprocess
@@ -24,6 +26,10 @@ from xboa.hit import Hit
 from xboa.tracking import TimeoutTracking
 from xboa.tracking.tracking_process import ThisNodeProcess
 from xboa.tracking.tracking_process import BSubProcess
+from xboa.tracking.tracking_process import PipeProcess
+from xboa.tracking.tracking_process import BatchProcess
+from xboa.tracking.tracking_process import LocalQueueBackend
+from xboa.tracking.tracking_process import BatchBackend
 
 class TrackingProcessBaseTest(unittest.TestCase):
     def setUp(self):
@@ -191,6 +197,164 @@ class BSubTest(TrackingProcessBaseTest):
         self.time_constant = 20
         self.tracking_process = BSubProcess(self.tracking, 'scarf-ibis', '00:30')
 
+class LocalQueueTest(TrackingProcessBaseTest):
+    def setUp(self):
+        offset_in = numpy.matrix(numpy.zeros([1, 6]))
+        offset_out = [numpy.matrix(numpy.zeros([1, 6]))]
+        matrices = [numpy.matrix(numpy.zeros([6, 6]))]
+        for i in range(6):
+            matrices[0][i, i] = i
+        self.tracking = TimeoutTracking(matrices, offset_out, offset_in, 0)
+        self.hit_list = [Hit.new_from_dict({'x':1, 'y':2})]
+        self.tracking_process = BatchProcess(self.tracking,
+                                             LocalQueueBackend(2))
+        self.time_constant = 10
+
+class StubBackend(BatchBackend):
+    """Backend that returns a scripted list of states"""
+    def __init__(self, states):
+        self.states = states
+
+    def submit(self, command, log_path, err_path):
+        return "1"
+
+    def status(self, job_id):
+        if len(self.states) > 1:
+            return self.states.pop(0)
+        return self.states[0]
+
+    def kill(self, job_id):
+        pass
+
+class BatchProcessUnknownTest(unittest.TestCase):
+    def make_process(self, states):
+        process = BatchProcess(None, StubBackend(states))
+        process.min_poll_interval = 0.
+        process.max_poll_interval = 0.
+        process.start()
+        return process
+
+    def test_unknown_before_seen(self):
+        process = self.make_process([(BatchBackend.UNKNOWN, None),
+                                     (BatchBackend.UNKNOWN, None),
+                                     (BatchBackend.RUNNING, None),
+                                     (BatchBackend.DONE, 0)])
+        for i in range(3):
+            self.assertTrue(process.is_alive())
+            self.assertEqual(process.exitcode, None)
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.exitcode, 0)
+
+    def test_unknown_after_seen(self):
+        process = self.make_process([(BatchBackend.RUNNING, None),
+                                     (BatchBackend.UNKNOWN, None)])
+        self.assertTrue(process.is_alive())
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.exitcode, -1)
+
+    def test_unknown_timeout(self):
+        process = self.make_process([(BatchBackend.UNKNOWN, None)])
+        self.assertTrue(process.is_alive())
+        process.unknown_timeout = 0.
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.exitcode, -1)
+
+class PipeTest(TrackingProcessBaseTest):
+    def setUp(self):
+        offset_in = numpy.matrix(numpy.zeros([1, 6]))
+        offset_out = [numpy.matrix(numpy.zeros([1, 6]))]
+        matrices = [numpy.matrix(numpy.zeros([6, 6]))]
+        for i in range(6):
+            matrices[0][i, i] = i
+        self.tracking = TimeoutTracking(matrices, offset_out, offset_in, 0)
+        self.hit_list = [Hit.new_from_dict({'x':1, 'y':2})]
+        self.tracking_process = PipeProcess(self.tracking)
+        self.time_constant = 10
+
+    def tearDown(self):
+        if self.tracking_process.worker != None:
+            self.tracking_process.kill(10)
+
+    def test_pickle_unpickle(self):
+        process = self.tracking_process
+        process.set_hit_list(self.hit_list)
+        process.start()
+        process.join()
+        # handles on the worker are not copied
+        for test_process in [pickle.loads(pickle.dumps(process)),
+                             copy.deepcopy(process)]:
+            self.assertEqual(test_process.worker, None)
+            self.assertFalse(test_process.is_alive())
+            self.assertEqual(test_process.run(), process.run())
+
+    def test_start(self):
+        process = self.tracking_process
+        process.set_hit_list(self.hit_list)
+        ref_out = process.run()
+        process.start()
+        process.join()
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.get_return_value(), ref_out)
+        process.kill()
+        self.tracking.timeout = 10
+        process.start()
+        try:
+            process.start()
+            raise ValueError("start() while running didnt raise exception")
+        except RuntimeError:
+            pass
+
+    def test_many_batches(self):
+        process = self.tracking_process
+        hit_list = [Hit.new_from_dict({'x':i, 'pid':-13, 'event_number':i})
+                                                             for i in range(100)]
+        pid = None
+        for i in range(3):
+            process.set_hit_list(hit_list[i*10:i*10+20])
+            process.start()
+            process.join()
+            self.assertEqual(process.get_return_value(), process.run())
+            if pid != None:
+                self.assertEqual(process.pid, pid) # worker was reused
+            pid = process.pid
+        process.close()
+        self.assertEqual(process.worker, None)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_error(self):
+        process = self.tracking_process
+        self.tracking.tm_list = ["not a matrix"]
+        process.set_hit_list(self.hit_list)
+        process.start()
+        process.join()
+        try:
+            process.get_return_value()
+            raise ValueError("Worker exception should have raised")
+        except RuntimeError:
+            pass
+        self.assertEqual(process.exitcode, 1)
+
+    def test_columns(self):
+        hit_list = [Hit.new_from_dict({'x':i+0.5, 'pid':-13, 'event_number':i,
+                                       'energy':200., 'mass':105.658})
+                                                             for i in range(10)]
+        columns = PipeProcess.hits_to_columns(hit_list)
+        self.assertEqual(columns[0].shape[0], 10)
+        self.assertEqual(columns[1].shape[0], 10)
+        self.assertEqual(PipeProcess.columns_to_hits(columns), hit_list)
+        self.assertEqual(PipeProcess.columns_to_hits(
+                                  PipeProcess.hits_to_columns([])), [])
+
+    def test_columns_global_weight(self):
+        Hit.clear_global_weights()
+        hit = Hit.new_from_dict({'event_number':7, 'global_weight':0.25})
+        PipeProcess.columns_to_hits(PipeProcess.hits_to_columns([hit]))
+        self.assertEqual(Hit.new_from_dict({'event_number':0})['global_weight'],
+                         1.)
+        self.assertEqual(Hit.new_from_dict({'event_number':7})['global_weight'],
+                         0.25)
+        Hit.clear_global_weights()
+
 
 if __name__ == "__main__":
     unittest.main()
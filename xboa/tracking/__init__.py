@@ -26,21 +26,49 @@ Implemented within this module:
                 tracking module
 \li \link xboa::tracking::_maus_tracking::MAUSTracking MAUSTracking \endlink: a tracking class that provides an interface to the MAUS tracking
                 library
+\li \link xboa::tracking::_fake_maus::FakeMAUS FakeMAUS \endlink: stand-in for the MAUS tracking library, for use with MAUSTracking
+                when MAUS is not installed
 \li \link xboa::tracking::_matrix_tracking::MatrixTracking MatrixTracking \endlink: a tracking class that provides an interface to "tracking"
                 using simple transfer matrices
+\li \link xboa::tracking::_map_tracking::MapTracking MapTracking \endlink: a tracking class that provides an interface to "tracking"
+                using polynomial transfer maps of up to third order
+\li \link xboa::tracking::_cached_tracking::CachedTracking CachedTracking \endlink: a tracking class that wraps another tracking class, caching
+                the output so that repeated tracking of the same hits is fast
+\li \link xboa::tracking::_profiled_tracking::ProfiledTracking ProfiledTracking \endlink: a tracking class that wraps another tracking class,
+                recording timing and throughput of each tracking call in a
+                \link xboa::tracking::_profiled_tracking::Profiler Profiler \endlink
+\li \link xboa::tracking::_async_tracking_base::AsyncTrackingBase AsyncTrackingBase \endlink: base class that defines an asyncio interface for
+                tracking
+\li \link xboa::tracking::_executor_tracking::ExecutorTracking ExecutorTracking \endlink: wraps a TrackingBase in the asyncio interface, running
+                the tracking in a thread or process executor
+\li \link xboa::tracking::_async_process_tracking::AsyncProcessTracking AsyncProcessTracking \endlink: asyncio interface to tracking in subprocesses
+                on this node
 """
 
 from ._matrix_tracking import MatrixTracking
+from ._map_tracking import MapTracking
 from ._maus_tracking import MAUSTracking
+from ._fake_maus import FakeMAUS
 from ._tracking_base import TrackingBase
 from ._timeout_tracking import TimeoutTracking
 from ._multitrack import MultiTrack
+from ._cached_tracking import CachedTracking
+from ._profiled_tracking import Profiler
+from ._profiled_tracking import ProfiledTracking
+from ._async_tracking_base import AsyncTrackingBase
+from ._executor_tracking import ExecutorTracking
+from ._async_process_tracking import AsyncProcessTracking
 import xboa.tracking.tracking_process
 
 __all__ = ["MatrixTracking",
+           "MapTracking",
            "MAUSTracking",
            "TrackingBase",
            "TimeoutTracking",
-           "MultiTrack"]
+           "MultiTrack",
+           "CachedTracking",
+           "AsyncTrackingBase",
+           "ExecutorTracking",
+           "AsyncProcessTracking"]
 
 
@@ -0,0 +1,110 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_async_process_tracking
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import asyncio
+import copy
+
+from ._async_tracking_base import AsyncTrackingBase
+
+class AsyncProcessTracking(AsyncTrackingBase):
+    """
+    Native asyncio implementation of tracking in subprocesses on this node
+
+    Uses the same messaging as ThisNodeProcess, i.e. the TrackingProcess is
+    pickled to disk and TrackingProcess.run_executable is run in a subprocess,
+    but the subprocess is managed by asyncio so that the event loop is free
+    while the tracking runs. Hits may be split into tasks of task_size hits,
+    with at most n_processes subprocesses running at once, shared between all
+    concurrent calls to track_many.
+    """
+    def __init__(self, tracking_process, n_processes = 1, task_size = None):
+        """
+        Initialise the AsyncProcessTracking
+        - tracking_process: TrackingProcess, e.g. ThisNodeProcess, that wraps
+          the tracking object. A copy is made for each task.
+        - n_processes: maximum number of subprocesses to run at once
+        - task_size: if not None, split calls to track_many into tasks of at
+          most task_size hits, each of which runs in its own subprocess
+        """
+        AsyncTrackingBase.__init__(self)
+        if n_processes < 1:
+            raise ValueError("n_processes should be >= 1")
+        if task_size != None and task_size < 1:
+            raise ValueError("task_size should be None or >= 1")
+        self.tracking_process = tracking_process
+        self.n_processes = n_processes
+        self.task_size = task_size
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    async def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+
+        Raises a RuntimeError if a subprocess fails to return any hits.
+        """
+        task_size = self.task_size
+        if task_size == None:
+            task_size = max(len(list_of_hits), 1)
+        tasks = [self.track_task(list_of_hits[start:start+task_size]) \
+                       for start in range(0, len(list_of_hits), task_size)]
+        hits_out = []
+        for task_out in await asyncio.gather(*tasks):
+            hits_out += task_out
+        self.last = hits_out
+        return hits_out
+
+    async def track_task(self, list_of_hits):
+        """
+        Track list_of_hits in a single subprocess, once one is available
+
+        Returns a list of list of output hits. If the task is cancelled, the
+        subprocess is killed. The output directory is removed when the task
+        finishes, whether or not it succeeded.
+        """
+        async with self._get_semaphore():
+            job = copy.deepcopy(self.tracking_process)
+            job.new_out_dir()
+            try:
+                job.set_hit_list(list_of_hits)
+                proc = await asyncio.create_subprocess_exec(job.run_executable,
+                                                            "--out-dir",
+                                                            job.out_dir)
+                job.pid = proc.pid
+                try:
+                    job.exitcode = await proc.wait()
+                except asyncio.CancelledError:
+                    proc.kill()
+                    await proc.wait()
+                    raise
+                return job.get_return_value()
+            finally:
+                job.cleanup()
+
+    def _get_semaphore(self):
+        """Get the semaphore limiting the number of subprocesses"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.n_processes)
+            self._semaphore_loop = loop
+        return self._semaphore
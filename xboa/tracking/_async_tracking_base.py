@@ -0,0 +1,55 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_async_tracking_base
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+class AsyncTrackingBase(object):
+    """
+    Base class provides an asyncio interface to particle tracking routines, so
+    that many tracking requests can be run concurrently, e.g. using
+    asyncio.gather(...)
+
+    The interface mirrors TrackingBase, except that track_one and track_many
+    are coroutines.
+    - last: list of list of hits corresponding to hits from the most recent
+      call to track_one or track_many to complete
+    """
+    def __init__(self):
+        self.last = []
+
+    async def track_one(self, hit):
+        """
+        Track a hit and return a list of output hits
+        - hit initial particle coordinates to be tracked
+
+        By default this awaits track_many on a list containing hit
+        """
+        hit_list = (await self.track_many([hit]))[0]
+        self.last = [hit_list]
+        return hit_list
+
+    async def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+
+        Returns a list containing a list of output hits, one for each track.
+        """
+        raise NotImplementedError("track_many was not implemented")
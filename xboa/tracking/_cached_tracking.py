@@ -0,0 +1,209 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_cached_tracking
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import os
+import hashlib
+import pickle
+import collections
+
+from xboa.hit import Hit
+from ._tracking_base import TrackingBase
+from ._matrix_tracking import MatrixTracking
+
+class CachedTracking(TrackingBase):
+    """
+    Wraps another tracking object, remembering the output of each tracking
+    call so that repeated tracking of the same input hit is served from a
+    cache rather than by tracking again.
+
+    Input hits are identified by their variables, each rounded to a multiple
+    of quantum, together with a user-supplied fingerprint that should identify
+    the lattice and tracking configuration. If the lattice changes, change the
+    fingerprint (or call clear()). Hits that differ by less than quantum in
+    every variable may be served the same output; the output is whatever was
+    tracked the first time, including e.g. event_number.
+
+    Up to max_size tracks are held in memory; when the cache is full, the
+    least recently used track is dropped. If cache_dir is set, tracks are also
+    written to disk so that the cache persists between runs; the disk store
+    is not limited in size.
+
+    - n_cache_hits: number of tracks that were served from the cache
+    - n_cache_misses: number of tracks that had to be tracked
+    """
+    def __init__(self, tracking, fingerprint = "", variables = None,
+                 quantum = 1e-9, max_size = 10000, cache_dir = None):
+        """
+        Initialise the CachedTracking
+        - tracking: the TrackingBase object that does the tracking
+        - fingerprint: any object with a stable repr, identifying the lattice
+          and configuration used by tracking
+        - variables: list of variables used to identify an input hit. If None,
+          all of Hit.dict_from_hit() except global_weight is used.
+        - quantum: float; variables are rounded to a multiple of quantum before
+          comparison
+        - max_size: maximum number of tracks held in memory
+        - cache_dir: if not None, directory in which tracks are stored on disk
+        """
+        TrackingBase.__init__(self)
+        if quantum <= 0.:
+            raise ValueError("quantum should be > 0")
+        if max_size < 0:
+            raise ValueError("max_size should be >= 0")
+        self.tracking = tracking
+        self.fingerprint = fingerprint
+        self.variables = variables
+        self.quantum = quantum
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        if cache_dir != None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache = collections.OrderedDict()
+        self.n_cache_hits = 0
+        self.n_cache_misses = 0
+
+    def track_one(self, hit):
+        """
+        Track a hit and return a list of output hits, using the cache if the
+        hit has been tracked before
+        - hit initial particle coordinates to be tracked
+        """
+        hit_list = self.track_many([hit])[0]
+        self.last = [hit_list]
+        return hit_list
+
+    def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+
+        Hits that are not in the cache are passed to the wrapped tracking
+        object in a single call to track_many. Hits that appear more than once
+        in list_of_hits are only tracked once.
+        """
+        keys = [self.get_key(hit) for hit in list_of_hits]
+        tracks = [self._get(key) for key in keys]
+        to_track = collections.OrderedDict()
+        for i, key in enumerate(keys):
+            if tracks[i] != None:
+                self.n_cache_hits += 1
+            elif key in to_track:
+                self.n_cache_hits += 1
+                to_track[key].append(i)
+            else:
+                self.n_cache_misses += 1
+                to_track[key] = [i]
+        if len(to_track) > 0:
+            hits_in = [list_of_hits[indices[0]] \
+                                           for indices in to_track.values()]
+            hits_out = self.tracking.track_many(hits_in)
+            for (key, indices), hit_list in zip(to_track.items(), hits_out):
+                track = [hit.dict_from_hit() for hit in hit_list]
+                for hit_dict in track:
+                    for skip_key in MatrixTracking.skip_keys:
+                        del hit_dict[skip_key]
+                self._put(key, track)
+                for i in indices:
+                    tracks[i] = track
+        self.last = [[Hit.new_from_dict(hit_dict) for hit_dict in track] \
+                                                        for track in tracks]
+        return self.last
+
+    def get_key(self, hit):
+        """
+        Return the cache key for hit, a string made from the fingerprint and
+        the quantized hit variables
+        """
+        variables = self.variables
+        if variables == None:
+            hit_dict = hit.dict_from_hit()
+            variables = sorted([key for key in hit_dict.keys() \
+                                                 if key != "global_weight"])
+            values = [hit_dict[var] for var in variables]
+        else:
+            values = [hit[var] for var in variables]
+        quantized = [int(round(value/self.quantum)) for value in values]
+        key = repr((self.fingerprint, variables, quantized))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def cache_info(self):
+        """
+        Return a dict of cache statistics, with keys
+        - hits: number of tracks served from the cache
+        - misses: number of tracks that had to be tracked
+        - size: number of tracks held in memory
+        - max_size: maximum number of tracks held in memory
+        """
+        return {"hits":self.n_cache_hits, "misses":self.n_cache_misses,
+                "size":len(self.cache), "max_size":self.max_size}
+
+    def clear(self, clear_disk = False):
+        """
+        Empty the in-memory cache and reset the statistics
+        - clear_disk: if True, also delete the tracks stored in cache_dir
+        """
+        self.cache = collections.OrderedDict()
+        self.n_cache_hits = 0
+        self.n_cache_misses = 0
+        if clear_disk and self.cache_dir != None:
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(self.disk_suffix):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+
+    def _get(self, key):
+        """Get a track from memory or disk; None if it is not cached"""
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if self.cache_dir == None:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as fin:
+                track = pickle.load(fin)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        self._put_memory(key, track)
+        return track
+
+    def _put(self, key, track):
+        """Put a track into memory and, if cache_dir is set, disk"""
+        self._put_memory(key, track)
+        if self.cache_dir == None:
+            return
+        path = self._disk_path(key)
+        # write and rename so that a partial file is never read
+        with open(path+".tmp", "wb") as fout:
+            pickle.dump(track, fout)
+        os.rename(path+".tmp", path)
+
+    def _put_memory(self, key, track):
+        """Put a track into memory, evicting old tracks if required"""
+        self.cache[key] = track
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last = False)
+
+    def _disk_path(self, key):
+        """Path of the file holding the track for key"""
+        return os.path.join(self.cache_dir, key+self.disk_suffix)
+
+    disk_suffix = ".track.pickle"
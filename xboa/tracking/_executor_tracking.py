@@ -0,0 +1,64 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_executor_tracking
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import asyncio
+
+from ._async_tracking_base import AsyncTrackingBase
+
+class ExecutorTracking(AsyncTrackingBase):
+    """
+    Adapter that wraps a TrackingBase object in the AsyncTrackingBase
+    interface, by running the blocking tracking calls in an executor from
+    the concurrent.futures module
+
+    With a ThreadPoolExecutor (or the default executor of the event loop),
+    concurrent calls share the same tracking object; this is suitable for
+    tracking that releases the GIL or waits on other processes (e.g. MultiTrack
+    or MAUSTracking), but the tracking object must tolerate being called from
+    several threads at once. With a ProcessPoolExecutor, the tracking object is
+    pickled and sent to a worker process on each call, so it must be picklable.
+    """
+    def __init__(self, tracking, executor = None):
+        """
+        Initialise the ExecutorTracking
+        - tracking: the TrackingBase object that does the tracking
+        - executor: concurrent.futures.Executor used to run the tracking. If
+          None, the default executor of the event loop is used.
+        """
+        AsyncTrackingBase.__init__(self)
+        self.tracking = tracking
+        self.executor = executor
+
+    async def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+
+        Calls tracking.track_many in the executor, without blocking the event
+        loop.
+        """
+        loop = asyncio.get_running_loop()
+        hits_out = await loop.run_in_executor(self.executor,
+                                              self.tracking.track_many,
+                                              list_of_hits)
+        self.last = hits_out
+        return hits_out
@@ -0,0 +1,126 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_fake_maus
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import json
+try:
+    import numpy
+except ImportError:
+    pass
+
+from xboa import common
+
+class FakeMAUS(object):
+    """
+    Stand-in for the maus_cpp module, for use with MAUSTracking when MAUS is
+    not installed.
+
+    FakeMAUS provides the parts of the maus_cpp interface that are used by
+    MAUSTracking, i.e. globals.birth, globals.death, globals.has_instance and
+    simulation.track_particles. Tracking is done by a MatrixTracking (or
+    MapTracking) object; each primary makes one virtual hit per transfer
+    matrix, with station_id counting from 1. The json strings are the same
+    format as MAUS, so FakeMAUS can be used to test and benchmark the
+    conversion between xboa and MAUS.
+    """
+    def __init__(self, tracking, z_list=None):
+        """
+        Initialise the FakeMAUS
+        - tracking MatrixTracking object used to track the primaries
+        - z_list list of z positions of the virtual hits, one for each transfer
+              matrix. If None, virtual hits are made at the z position of the
+              primary.
+        """
+        if z_list != None and len(z_list) != len(tracking.tm_list):
+            raise IndexError("z_list must be same length as the list of "+\
+                             "transfer matrices")
+        self.tracking = tracking
+        self.z_list = z_list
+        self.datacards = None
+        self.n_calls = 0
+
+    @property
+    def globals(self):
+        """Emulates the maus_cpp.globals module"""
+        return self
+
+    @property
+    def simulation(self):
+        """Emulates the maus_cpp.simulation module"""
+        return self
+
+    def birth(self, datacards):
+        """Initialise with datacards (json string); the datacards are ignored"""
+        self.datacards = datacards
+
+    def death(self):
+        """Clear the datacards"""
+        self.datacards = None
+
+    def has_instance(self):
+        """Return True if birth has been called since the last death"""
+        return self.datacards != None
+
+    def track_particles(self, primary_str):
+        """
+        Track some primaries and return the mc events
+        - primary_str json string holding a list of MAUS primaries
+
+        Returns a json string holding a list of MAUS mc events, each with a
+        primary and a list of virtual_hits.
+        """
+        self.n_calls += 1
+        primary_list = json.loads(primary_str)
+        coordinates = numpy.array([[item["primary"]["position"]["x"],
+                                    item["primary"]["momentum"]["x"],
+                                    item["primary"]["position"]["y"],
+                                    item["primary"]["momentum"]["y"],
+                                    item["primary"]["time"],
+                                    item["primary"]["energy"]]
+                                   for item in primary_list]).reshape(-1, 6)
+        u_out = self.tracking.track_array(coordinates)
+        mass = numpy.array([common.pdg_pid_to_mass[abs(item["primary"]["particle_id"])]
+                                   for item in primary_list])
+        pz_sq = u_out[:, :, 5]**2-mass[:, numpy.newaxis]**2- \
+                u_out[:, :, 1]**2 - u_out[:, :, 3]**2
+        pz_out = numpy.zeros(pz_sq.shape)
+        on_shell = pz_sq > 0.
+        pz_out[on_shell] = pz_sq[on_shell]**0.5
+        u_out = u_out.tolist()
+        pz_out = pz_out.tolist()
+        mc_events = []
+        for i, item in enumerate(primary_list):
+            primary = item["primary"]
+            virtual_hits = []
+            for j, (u_j, pz_j) in enumerate(zip(u_out[i], pz_out[i])):
+                z = primary["position"]["z"]
+                if self.z_list != None:
+                    z = self.z_list[j]
+                virtual_hits.append({
+                    "position":{"x":u_j[0], "y":u_j[2], "z":z},
+                    "momentum":{"x":u_j[1], "y":u_j[3], "z":pz_j},
+                    "time":u_j[4],
+                    "particle_id":primary["particle_id"],
+                    "track_id":1,
+                    "station_id":j+1,
+                })
+            mc_events.append({"primary":primary, "virtual_hits":virtual_hits})
+        return json.dumps(mc_events)
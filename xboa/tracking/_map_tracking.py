@@ -0,0 +1,199 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_map_tracking
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import itertools
+
+import numpy
+
+from ._matrix_tracking import MatrixTracking
+from ._tracking_base import TrackingBase
+
+class MapTracking(MatrixTracking):
+    """
+    Class to mimic tracking using user-supplied polynomial transfer maps of up
+    to third order
+
+    Each transfer map is a list of dense coefficient tensors [M1, M2, M3]
+    (M3 and M2 may be omitted) such that
+        u_i = v_i + M1_ab d_b + M2_abc d_b d_c + M3_abcd d_b d_c d_d
+    where d = u_in - v_in, summation over repeated indices is implied and u, v
+    go like (x, px, y, py, t, energy). M1 has shape (6, 6), M2 has shape
+    (6, 6, 6) and M3 has shape (6, 6, 6, 6). Output hits are made as for
+    MatrixTracking, i.e. pz is set to obey the mass shell condition.
+
+    Maps may be derived from tracking output using fit_map.
+    """
+    def __init__(self, list_of_maps, list_of_offsets, offset_in):
+        """
+        Initialisation
+        - list_of_maps list of transfer maps, one for each output station.
+              Each element should be a list of numpy arrays [M1, M2, M3] with
+              M2 and M3 optional
+        - list_of_offsets list of offsets v_i. Each element should be
+              array-like with 6 elements, e.g. a numpy matrix of shape (1,6)
+        - offset_in offset v_in. Should be array-like with 6 elements
+        """
+        TrackingBase.__init__(self)
+        if len(list_of_offsets) != len(list_of_maps):
+            raise IndexError(
+              "list_of_offsets must be same length as list_of_maps")
+        offsets = []
+        for offset in list_of_offsets+[offset_in]:
+            offset = numpy.asarray(offset, dtype=float)
+            if offset.size != 6:
+                raise TypeError("Offset should have 6 elements not "+\
+                                str(offset.size))
+            offsets.append(offset.reshape(6))
+        self.map_list = []
+        for transfer_map in list_of_maps:
+            if len(transfer_map) < 1 or len(transfer_map) > 3:
+                raise TypeError("Map should be a list of 1 to 3 tensors")
+            tensors = []
+            for order, tensor in enumerate(transfer_map):
+                tensor = numpy.asarray(tensor, dtype=float)
+                if tensor.shape != (6,)*(order+2):
+                    raise TypeError("Order "+str(order+1)+" tensor should "+\
+                                    "be of shape "+str((6,)*(order+2))+\
+                                    " not "+str(tensor.shape))
+                tensors.append(tensor)
+            self.map_list.append(tensors)
+        self.offset_list = offsets[:-1]
+        self.offset_in = offsets[-1]
+        # linear part of each map, for comparison with MatrixTracking
+        self.tm_list = [numpy.matrix(tensors[0]) for tensors in self.map_list]
+
+    def track_array(self, coordinates):
+        """
+        Track an array of particle coordinates through the transfer maps
+        - coordinates numpy array of shape (n, 6), with each row going like
+              (x, px, y, py, t, energy)
+
+        Returns a numpy array of shape (n, m, 6) where m is the number of
+        transfer maps and element [j, i] is u_i for the jth input. For each
+        order, the tensors for all maps are applied in a single matrix-matrix
+        product against the products of the input coordinates; coordinates are
+        processed batch_size at a time to limit memory usage.
+        """
+        coordinates = numpy.asarray(coordinates, dtype=float)
+        n_maps = len(self.map_list)
+        n_hits = coordinates.shape[0]
+        u_out = numpy.zeros((n_hits, n_maps, 6))
+        if n_maps == 0:
+            return u_out
+        max_order = max([len(tensors) for tensors in self.map_list])
+        # stack the tensors of each order into a (6m, 6^order) array
+        stacks = []
+        for order in range(max_order):
+            stack = numpy.zeros((n_maps, 6, 6**(order+1)))
+            for i, tensors in enumerate(self.map_list):
+                if order < len(tensors):
+                    stack[i] = tensors[order].reshape(6, 6**(order+1))
+            stacks.append(stack.reshape(n_maps*6, 6**(order+1)).transpose())
+        offsets = numpy.array(self.offset_list)
+        for start in range(0, n_hits, self.batch_size):
+            delta = coordinates[start:start+self.batch_size]-self.offset_in
+            n_batch = delta.shape[0]
+            products = delta
+            u_batch = numpy.dot(products, stacks[0])
+            for order in range(1, max_order):
+                # products[j] = d_b d_c ... flattened in C order
+                products = (products[:, :, numpy.newaxis] * \
+                            delta[:, numpy.newaxis, :]).reshape(n_batch, -1)
+                u_batch += numpy.dot(products, stacks[order])
+            u_out[start:start+n_batch] = u_batch.reshape(n_batch, n_maps, 6)
+        u_out += offsets
+        return u_out
+
+    @classmethod
+    def monomials(cls, delta, order):
+        """
+        Evaluate all distinct monomials of degree 1 to order
+        - delta numpy array of shape (n, dimension)
+        - order maximum degree of the monomials
+        Returns a tuple of (index_list, monomials) where index_list is a list
+        of tuples of variable indices, e.g. (0, 0, 3) for d_0*d_0*d_3, sorted
+        by degree, and monomials is a numpy array of shape
+        (n, len(index_list)) holding each monomial evaluated at each point.
+        """
+        delta = numpy.asarray(delta, dtype=float)
+        dimension = delta.shape[1]
+        index_list = []
+        columns = []
+        previous = {(i,):delta[:, i] for i in range(dimension)}
+        for degree in range(1, order+1):
+            current = {}
+            for index in itertools.combinations_with_replacement(
+                                                   range(dimension), degree):
+                if degree == 1:
+                    current[index] = previous[index]
+                else:
+                    # build each monomial from one of the previous degree
+                    current[index] = previous[index[:-1]]*delta[:, index[-1]]
+                index_list.append(index)
+                columns.append(current[index])
+            previous = current
+        monomials = numpy.array(columns).transpose()
+        return index_list, monomials.reshape(delta.shape[0], len(index_list))
+
+    @classmethod
+    def fit_map(cls, bunch_in, bunch_out, order = 2, offset_in = None):
+        """
+        Derive a transfer map from a pair of bunches using least squares
+        - bunch_in Bunch of hits at the start of the map
+        - bunch_out Bunch of the same hits, in the same order, at the end of
+              the map
+        - order order of the map; 1, 2 or 3
+        - offset_in v_in about which the map is expanded; if None, the mean
+              of bunch_in is used
+        Returns a tuple of (transfer_map, offset_out, offset_in) suitable for
+        passing to MapTracking. Tensors are symmetric in the input indices.
+        Raises a ValueError if there are too few hits to constrain the fit.
+        """
+        if order < 1 or order > 3:
+            raise ValueError("order should be 1, 2 or 3")
+        u_in = numpy.array(bunch_in.list_get_hit_variable(cls.variables))
+        u_out = numpy.array(bunch_out.list_get_hit_variable(cls.variables))
+        u_in, u_out = u_in.transpose(), u_out.transpose()
+        if u_in.shape != u_out.shape:
+            raise ValueError("bunch_in and bunch_out should be the same length")
+        if offset_in is None:
+            offset_in = numpy.mean(u_in, axis=0)
+        offset_in = numpy.asarray(offset_in, dtype=float).reshape(6)
+        index_list, monomials = cls.monomials(u_in-offset_in, order)
+        if monomials.shape[0] <= monomials.shape[1]:
+            raise ValueError("Need more than "+str(monomials.shape[1]+1)+\
+                             " hits to fit a map of order "+str(order))
+        # constant term gives the output offset
+        design = numpy.hstack([numpy.ones((monomials.shape[0], 1)), monomials])
+        coefficients = numpy.linalg.lstsq(design, u_out, rcond=None)[0]
+        offset_out = coefficients[0]
+        transfer_map = [numpy.zeros((6,)*(degree+1)) \
+                                               for degree in range(1, order+1)]
+        for index, row in zip(index_list, coefficients[1:]):
+            # spread each coefficient evenly over the permutations of index
+            permutations = set(itertools.permutations(index))
+            for permutation in permutations:
+                transfer_map[len(index)-1][(slice(None),)+permutation] = \
+                                                       row/len(permutations)
+        return transfer_map, offset_out, offset_in
+
+    batch_size = 2**14
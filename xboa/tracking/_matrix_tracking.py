@@ -74,19 +74,79 @@ class MatrixTracking(TrackingBase):
         and subsequent hits given by u_i = M_i0 * u_0 with
         u = (x, px, y, py, t, energy)
         """
-        hit_list = [hit.deepcopy()]
-        for i, tm in enumerate(self.tm_list):
-            offset_out = self.offset_list[i]
-            vec_in = numpy.matrix([hit['x'], hit['px'], 
-                                  hit['y'], hit['py'],
-                                  hit['t'], hit['energy']])
-            vec_in -= self.offset_in
-            vec_out = tm * vec_in.transpose() + offset_out.transpose()
-            hit_out = hit.deepcopy()
-            for i, key in enumerate(["x", "px", "y", "py", "t", "energy"]):
-                hit_out[key] = float(vec_out[i])
-            hit_out.mass_shell_condition("pz")
-            hit_list.append(hit_out)
+        hit_list = self.track_many([hit])[0]
         self.last = [hit_list]
         return hit_list
 
+    def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+
+        All hits are transformed by all transfer matrices in a single call to
+        track_array and pz is then set to force E^2 = p^2 + m^2 for all output
+        hits at once. Returns a list containing, for each input hit, a list of
+        hits as per track_one.
+        """
+        dict_list = [hit.dict_from_hit() for hit in list_of_hits]
+        coordinates = numpy.array([[hit_dict[key] for key in self.variables]
+                                               for hit_dict in dict_list])
+        mass = numpy.array([hit_dict["mass"] for hit_dict in dict_list])
+        u_out = self.track_array(coordinates.reshape(-1, 6))
+        # mass shell condition, as per Hit.mass_shell_condition("pz")
+        pz_sq = (u_out[:, :, 5]-mass[:, numpy.newaxis]) * \
+                (u_out[:, :, 5]+mass[:, numpy.newaxis]) - \
+                u_out[:, :, 1]**2 - u_out[:, :, 3]**2
+        pz_out = numpy.zeros(pz_sq.shape)
+        on_shell = pz_sq > self.float_tolerance
+        pz_out[on_shell] = pz_sq[on_shell]**0.5
+        # tolist() converts to python floats in one go
+        u_out = u_out.tolist()
+        pz_out = pz_out.tolist()
+        for hit_dict in dict_list:
+            for key in self.skip_keys:
+                del hit_dict[key]
+        hits_out = []
+        for i, hit_dict in enumerate(dict_list):
+            hit_list = [Hit.new_from_dict(hit_dict)]
+            for u_i, pz_i in zip(u_out[i], pz_out[i]):
+                hit_dict.update(zip(self.variables, u_i))
+                hit_dict["pz"] = pz_i
+                hit_list.append(Hit.new_from_dict(hit_dict))
+            hits_out.append(hit_list)
+        self.last = hits_out
+        return hits_out
+
+    def track_array(self, coordinates):
+        """
+        Track an array of particle coordinates through the transfer matrices
+        - coordinates numpy array of shape (n, 6), with each row going like
+              (x, px, y, py, t, energy)
+
+        Returns a numpy array of shape (n, m, 6) where m is the number of
+        transfer matrices and element [j, i] is u_i = M_i*(u_j-v_in) + v_i for
+        the jth input. All transfer matrices are applied in a single
+        matrix-matrix product. No mass shell condition is applied and no hits
+        are made, so this is suitable for tracking very large numbers of
+        particles.
+        """
+        coordinates = numpy.asarray(coordinates, dtype=float)
+        n_tm = len(self.tm_list)
+        if n_tm == 0:
+            return numpy.zeros((coordinates.shape[0], 0, 6))
+        # stack M_i into a (6m, 6) array so that row 6i+k of the stack is
+        # row k of M_i
+        tm_stack = numpy.asarray(numpy.concatenate(self.tm_list, axis=0))
+        offset_stack = numpy.asarray(numpy.concatenate(self.offset_list,
+                                                       axis=0))
+        u_in = coordinates - numpy.asarray(self.offset_in)
+        u_out = numpy.dot(u_in, tm_stack.transpose())
+        u_out = u_out.reshape(coordinates.shape[0], n_tm, 6)
+        u_out += offset_stack
+        return u_out
+
+    variables = ["x", "px", "y", "py", "t", "energy"]
+    float_tolerance = 1.e-6
+    ## keys that are not copied to output hits; global_weight is held per
+    ## event rather than per hit and eventNumber, particleNumber are aliases
+    skip_keys = ["global_weight", "eventNumber", "particleNumber"]
@@ -21,6 +21,12 @@ Should be imported directly from the xboa::tracking namespace
 """
 
 import json
+import concurrent.futures
+
+try:
+    import numpy
+except ImportError:
+    pass
 try:
     import maus_cpp.globals
     import maus_cpp.simulation
@@ -36,8 +42,14 @@ from ._tracking_base import TrackingBase
 class MAUSTracking(TrackingBase):
     """
     Provides an interface to MAUS tracking routines for use by xboa.algorithms
+
+    Hits are submitted to MAUS in batches of batch_size. While MAUS tracks one
+    batch, worker threads encode the next batch to json and decode the output
+    of the previous batch, so that at most a few batches of json are held in
+    memory at any time. Virtual hits are converted to columns of numbers and
+    the output hits are built from the columns in bulk.
     """
-    def __init__(self, datacards=None, seed=0):
+    def __init__(self, datacards=None, seed=0, batch_size=1000, maus=None):
         """
         Ensure MAUS is initialised, ready for tracking
         - datacards json document containing datacards that will be used for
@@ -46,19 +58,32 @@ class MAUSTracking(TrackingBase):
                     initialised.
         - seed initial random seed; each time a particle is fired, the seed
                increments by 1
-        Raises an ImportError if maus is not installed or maus environment is
-        not sourced
+        - batch_size maximum number of hits passed to MAUS in one call to
+               track_particles. Set to None to pass all hits in one call.
+        - maus object providing the maus_cpp interface, i.e. maus.globals and
+               maus.simulation. If None, use maus_cpp. Use e.g. FakeMAUS to run
+               without MAUS installed.
+        Raises an ImportError if maus is None and maus is not installed or maus
+        environment is not sourced
         """
-        config.has_maus()
+        if maus == None:
+            config.has_maus()
         TrackingBase.__init__(self)
+        if batch_size != None and batch_size < 1:
+            raise ValueError("batch_size should be None or at least 1")
+        self.maus_module = maus
+        if maus == None:
+            maus = maus_cpp
+        self.maus = maus
         if type(datacards) == type({}) or type(datacards) == type([]):
            datacards = json.dumps(datacards)
         if datacards != None:
-            if maus_cpp.globals.has_instance():
-                maus_cpp.globals.death()
-            maus_cpp.globals.birth(datacards)
+            if self.maus.globals.has_instance():
+                self.maus.globals.death()
+            self.maus.globals.birth(datacards)
         self.datacards = datacards
         self.random_seed = seed
+        self.batch_size = batch_size
         self.spill = 0
         self.last = []
 
@@ -87,72 +112,131 @@ class MAUSTracking(TrackingBase):
         significant set up and tear down times, or which simulate collective
         effects that need to be taken into account by the algorithm
 
+        Hits are tracked in batches of batch_size; the event number counts
+        from 0 across all batches.
+
         Spill number will increment by one for each call to track_one or
         track_many
         """
-        primary_list = [self._hit_to_primary(hit) for hit in list_of_hits]
-        primary_str = json.dumps(primary_list)
-        mc_events_str = maus_cpp.simulation.track_particles(primary_str)
-        mc_events = json.loads(mc_events_str)
-        self.last = [self._mc_event_to_hit_list(event, i) \
-                                           for i, event in enumerate(mc_events)]
+        batch_size = self.batch_size
+        if batch_size == None:
+            batch_size = max(len(list_of_hits), 1)
+        starts = list(range(0, len(list_of_hits), batch_size))
+        self.last = []
+        with concurrent.futures.ThreadPoolExecutor(self.n_threads) as pool:
+            decoded = []
+            if len(starts) > 0:
+                encoded = pool.submit(self._encode,
+                                      list_of_hits[0:batch_size],
+                                      self.random_seed)
+            for i, start in enumerate(starts):
+                primary_str = encoded.result()
+                if i+1 < len(starts):
+                    next_start = starts[i+1]
+                    encoded = pool.submit(self._encode,
+                           list_of_hits[next_start:next_start+batch_size],
+                           self.random_seed+next_start)
+                mc_events_str = self.maus.simulation.track_particles(primary_str)
+                del primary_str
+                decoded.append(pool.submit(self._decode, mc_events_str, start))
+                del mc_events_str
+            for future in decoded:
+                self.last += future.result()
+        self.random_seed += len(list_of_hits)
         self.spill += 1
         return self.last
 
-    def _mc_event_to_hit_list(self, mc_event, event_number):
-        """
-        Make a list of data from a MAUS mc event
-        """
-        hit_list = [self._primary_to_xboa_hit(mc_event["primary"],
-                                              event_number, 1)]
-        if "virtual_hits" in mc_event:
-            hit_list += [self._virtual_hit_to_xboa_hit(vhit, event_number) \
-                                           for vhit in mc_event["virtual_hits"]]
-        return hit_list
-
-    def _virtual_hit_to_xboa_hit(self, virtual_hit, event):
-        """
-        Fill hit data from a MAUS virtual hit
-        - virtual_hit json object corresponding to the hit
-        - event integer event number
-        """
-        hit = Hit()
-        pid = virtual_hit["particle_id"]
-        for key in 'x', 'y', 'z':
-            hit[key] = virtual_hit['position'][key]
-            hit["p"+key] = virtual_hit['momentum'][key]
-        hit["pid"] = pid
-        hit["t"] = virtual_hit["time"]
-        hit["mass"] = common.pdg_pid_to_mass[abs(pid)]
-        hit["charge"] = common.pdg_pid_to_charge[pid]
-        hit["particle_number"] = virtual_hit["track_id"]
-        hit["event_number"] = event
-        hit["spill"] = self.spill
-        hit["station"] = virtual_hit["station_id"]
-        hit.mass_shell_condition("energy")
-        return hit
-
-    def _primary_to_xboa_hit(self, primary, event, particle):
-        """
-        Fill hit data from a MAUS primary
-        """
-        hit = Hit()
-        pid = primary["particle_id"]
-        for key in 'x', 'y', 'z':
-            hit[key] = primary['position'][key]
-            hit["p"+key] = primary['momentum'][key]
-        hit["pid"] = pid
-        hit["energy"] = primary["energy"]
-        hit["t"] = primary["time"]
-        hit["mass"] = common.pdg_pid_to_mass[abs(pid)]
-        hit["charge"] = common.pdg_pid_to_charge[pid]
-        hit["particle_number"] = particle
-        hit["event_number"] = event
-        hit["spill"] = self.spill
-        hit["station"] = -1
-        return hit
-
-    def _hit_to_primary(self, hit):
+    def _encode(self, list_of_hits, random_seed):
+        """
+        Make a json string of MAUS primaries from a list of hits
+        - list_of_hits list of Hits
+        - random_seed random seed of the first primary; increments by 1 for
+                      each subsequent primary
+        """
+        primary_list = [self._hit_to_primary(hit, random_seed+i) \
+                                            for i, hit in enumerate(list_of_hits)]
+        return json.dumps(primary_list)
+
+    def _decode(self, mc_events_str, first_event):
+        """
+        Make a list of lists of hits from a json string of MAUS mc events
+        - mc_events_str json string holding a list of MAUS mc events
+        - first_event event number of the first mc event
+        """
+        mc_events = json.loads(mc_events_str)
+        del mc_events_str
+        columns = self._mc_events_to_columns(mc_events, first_event)
+        del mc_events
+        return self._columns_to_hit_lists(*columns)
+
+    def _mc_events_to_columns(self, mc_events, first_event):
+        """
+        Make columns of data from a list of MAUS mc events
+        - mc_events list of MAUS mc events
+        - first_event event number of the first mc event
+
+        Returns a tuple of (lengths, float_columns, int_columns) where lengths
+        is the number of hits in each event, float_columns is a numpy array of
+        shape (n_hits, len(float_keys)) and int_columns is a numpy array of
+        shape (n_hits, len(int_keys)). Virtual hit energy is set to nan; see
+        _columns_to_hit_lists.
+        """
+        float_rows, int_rows, lengths = [], [], []
+        for event_number, event in enumerate(mc_events, first_event):
+            primary = event["primary"]
+            pos, mom = primary["position"], primary["momentum"]
+            float_rows.append((pos["x"], pos["y"], pos["z"],
+                               mom["x"], mom["y"], mom["z"],
+                               primary["time"], primary["energy"]))
+            int_rows.append((primary["particle_id"], 1, event_number, -1))
+            vhits = event.get("virtual_hits", [])
+            for vhit in vhits:
+                pos, mom = vhit["position"], vhit["momentum"]
+                float_rows.append((pos["x"], pos["y"], pos["z"],
+                                   mom["x"], mom["y"], mom["z"],
+                                   vhit["time"], float("nan")))
+                int_rows.append((vhit["particle_id"], vhit["track_id"],
+                                 event_number, vhit["station_id"]))
+            lengths.append(len(vhits)+1)
+        float_columns = numpy.array(float_rows, dtype=numpy.float64).reshape(
+                                               len(float_rows), len(self.float_keys))
+        int_columns = numpy.array(int_rows, dtype=numpy.int64).reshape(
+                                               len(int_rows), len(self.int_keys))
+        return lengths, float_columns, int_columns
+
+    def _columns_to_hit_lists(self, lengths, float_columns, int_columns):
+        """
+        Make a list of lists of hits from columns made by _mc_events_to_columns
+
+        Mass and charge are looked up from the pid; virtual hit energy is
+        calculated from the mass shell condition.
+        """
+        pid = int_columns[:, 0]
+        mass = numpy.zeros(pid.shape)
+        charge = numpy.zeros(pid.shape)
+        for a_pid in numpy.unique(pid).tolist():
+            is_pid = pid == a_pid
+            mass[is_pid] = common.pdg_pid_to_mass[abs(a_pid)]
+            charge[is_pid] = common.pdg_pid_to_charge[a_pid]
+        energy = float_columns[:, 7]
+        no_energy = numpy.isnan(energy)
+        momentum_sq = numpy.sum(float_columns[no_energy, 3:6]**2, axis=1)
+        energy[no_energy] = (momentum_sq+mass[no_energy]**2)**0.5
+        hit_list = []
+        keys = self.float_keys+self.int_keys+["mass", "charge", "spill"]
+        spill = [self.spill]
+        for row in zip(float_columns.tolist(), int_columns.tolist(),
+                       mass.tolist(), charge.tolist()):
+            values = row[0]+row[1]+[row[2], row[3]]+spill
+            hit_list.append(Hit.new_from_dict(dict(zip(keys, values))))
+        hit_lists = []
+        start = 0
+        for length in lengths:
+            hit_lists.append(hit_list[start:start+length])
+            start += length
+        return hit_lists
+
+    def _hit_to_primary(self, hit, random_seed):
         """
         Fill primary data from a hit
         """
@@ -163,28 +247,33 @@ class MAUSTracking(TrackingBase):
             'particle_id':hit["pid"],
             'energy':hit["energy"],
             'time':hit["t"],
-            'random_seed':self.random_seed
+            'random_seed':random_seed
           }
         }
-        self.random_seed += 1
         return primary
 
     def __getstate__(self):
-        """
-        """
+        """Return the tracking configuration and state for pickling"""
         return {
             'datacards':self.datacards,
             'random_seed':self.random_seed,
+            'batch_size':self.batch_size,
+            'maus':self.maus_module,
             'spill':self.spill,
             'last':self.last
         }
 
     def __setstate__(self, state):
-        """
-        """
+        """Reinitialise from a state returned by __getstate__"""
         datacards = state['datacards']
         random_seed = state['random_seed']
-        self.__init__(datacards, random_seed)
+        # batch_size and maus are missing from pickles made by older versions
+        self.__init__(datacards, random_seed, state.get('batch_size', 1000),
+                      state.get('maus', None))
         self.spill = state['spill']
         self.last = state['last']
 
+    ## number of worker threads used to encode and decode json
+    n_threads = 2
+    float_keys = ["x", "y", "z", "px", "py", "pz", "t", "energy"]
+    int_keys = ["pid", "particle_number", "event_number", "station"]
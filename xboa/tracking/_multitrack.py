@@ -20,8 +20,20 @@
 Should be imported directly from the xboa::tracking::multitrack namespace
 """
 
+import os
 import copy
+import json
+import time
+import multiprocessing.connection
+
+try:
+    import numpy
+except ImportError:
+    pass
+
+from xboa.bunch import Bunch
 from xboa.tracking.tracking_process import TrackingProcess
+from xboa.tracking.tracking_process import PipeProcess
 from xboa.tracking import TrackingBase
 
 # manages a worker pool
@@ -31,20 +43,80 @@ class MultiTrack(TrackingBase):
     
     Idea is to define a tracking job as normal; but then wrap it in this
     MultiTrack class which handles the distribution across nodes
+
+    MultiTrack keeps a pool of n_processes copies of the TrackingProcess. The
+    hits are divided into tasks, each a contiguous slice of the input hits.
+    By default there is one task per process; if task_size or
+    target_task_time is set, the hits are split into many smaller tasks that
+    are handed out to each process as it becomes free, so that processes that
+    draw quick tasks do not sit idle while others finish slow ones. The time
+    taken by each task is recorded in task_times; if target_task_time is set,
+    this is used to tune the number of hits per task.
+
+    Rather than polling the jobs continuously, MultiTrack waits on the
+    TrackingProcess sentinels (see TrackingProcess.get_sentinel()) so that the
+    calling process sleeps until a job finishes. Tasks that run for longer than
+    job_timeout seconds, or that finish without leaving a return value, are
+    resubmitted up to max_retries times.
+
+    If checkpoint_dir is set, the input hits and the output of each task are
+    written to checkpoint_dir as they finish, together with a manifest listing
+    the finished tasks and the ranges of hits still pending. If the calling
+    process dies, a new MultiTrack can pick up from the manifest using
+    resume(...), tracking only the hits that had not finished.
+
+    If profiler is set, MultiTrack records the time spent starting the pool,
+    dispatching tasks (including writing the input hits), running each task,
+    collecting the output and waiting for jobs in the Profiler, together with
+    the number of bytes serialised (see TrackingProcess.bytes_in and
+    bytes_out). Events for process slot i are recorded as worker i+1. If
+    profiler is None, no timing information is recorded.
     """
-    def __init__(self, n_processes, tracking_process):
+    def __init__(self, n_processes, tracking_process,
+                 job_timeout = None, max_retries = 0,
+                 task_size = None, target_task_time = None,
+                 checkpoint_dir = None, profiler = None):
         """
         Initialise the MultiTrack object
-        - tracking: the wrapped Tracking object
         - n_processes: number of processes to run
-        - tracking_process_type: type of TrackingProcess to use - should be a
-          type object, not instantiated; MultiTrack will instantiate a
-          TrackingProcess for each of n_processes
+        - tracking_process: TrackingProcess that wraps the Tracking object.
+          MultiTrack will make a copy of tracking_process for each of
+          n_processes
+        - job_timeout: if not None, kill any task that has been running for
+          longer than job_timeout seconds
+        - max_retries: number of times a task that times out or fails will be
+          resubmitted before MultiTrack raises a RuntimeError
+        - task_size: if not None, number of hits in each task. If
+          target_task_time is also set, this is the number of hits in the first
+          tasks, before any timing information is available.
+        - target_task_time: if not None, choose the number of hits in each
+          task so that each task takes roughly target_task_time seconds
+        - checkpoint_dir: if not None, directory in which to write checkpoints
+        - profiler: if not None, Profiler in which to record timing information
         """
         TrackingBase.__init__(self)
+        if task_size != None and task_size < 1:
+            raise ValueError("task_size should be None or >= 1")
+        if target_task_time != None and target_task_time <= 0.:
+            raise ValueError("target_task_time should be None or > 0")
         self.tracking_job = tracking_process
         self.n_processes = n_processes
+        self.job_timeout = job_timeout
+        self.max_retries = max_retries
+        self.task_size = task_size
+        self.target_task_time = target_task_time
+        self.checkpoint_dir = checkpoint_dir
+        self.profiler = profiler
+        self.hit_list = []
         self.job_list = []
+        self.job_tasks = []
+        self.job_start_times = []
+        self.task_list = []
+        self.task_results = []
+        self.task_times = []
+        self.task_retries = []
+        self.unassigned = []
+        self.pending_tasks = []
         self.last = []
 
     def track_many_async(self, hit_list):
@@ -53,76 +125,435 @@ class MultiTrack(TrackingBase):
         - hit_list: list of hits to be tracked
         Returns a list of (maybe still processing) jobs to the caller
 
-        track_many_async splits the hit_list up into chunks, and starts one
-        process for each chunk.
+        track_many_async splits the hit_list up into tasks, and starts one
+        task on each process.
 
         Following the method call, track_many_async returns ownership of the
         process to the caller, even though the tracking processes may not have
-        finished. Use TrackingProcess.is_alive() to check for the status of
-        each process and MultiTrack.get_return_value() to get the resultant
-        hits.
+        finished. Use MultiTrack.get_return_value() to hand out any remaining
+        tasks and get the resultant hits, or iterate over
+        MultiTrack.wait_jobs() to get the hits from each task as it finishes.
         """
-        self.job_list = []
-        self.last = []
-        n_hits = len(hit_list)
-        n_hits_per_process = n_hits/int(self.n_processes)
-        remainder = n_hits % int(self.n_processes)
-        
-        for i in range(self.n_processes):
-            if remainder > 0:
-                this_hit_list = hit_list[0:n_hits_per_process+1]
-                hit_list = hit_list[n_hits_per_process+1:]
-                remainder -= 1
-            else:
-                this_hit_list = hit_list[0:n_hits_per_process]
-                hit_list = hit_list[n_hits_per_process:]
-            next_job = copy.deepcopy(self.tracking_job)
-            next_job.new_out_dir()
-            next_job.set_hit_list(this_hit_list)
-            self.job_list.append(next_job)
-            next_job.start()
-        return self.job_list
+        n_processes = int(self.n_processes)
+        self._reset(hit_list)
+        if self.task_size == None and self.target_task_time == None:
+            n_hits_per_process, remainder = divmod(len(hit_list), n_processes)
+            for i in range(n_processes):
+                # the first remainder tasks get one extra hit
+                start = i*n_hits_per_process + min(i, remainder)
+                end = start + n_hits_per_process + (1 if i < remainder else 0)
+                self._add_task(start, end)
+            self.pending_tasks = list(range(n_processes))
+        else:
+            self.unassigned = [[0, len(hit_list)]]
+        if self.checkpoint_dir != None:
+            try:
+                os.makedirs(self.checkpoint_dir)
+            except OSError:
+                pass # maybe the directory already exists? Let's keep going
+            self._save_hits(os.path.join(self.checkpoint_dir, self.hits_file),
+                            [[hit] for hit in hit_list])
+            self._write_manifest()
+        return self._start_pool()
+
+    def resume(self, manifest):
+        """
+        Resume tracking from a checkpoint
+        - manifest: path to the manifest file in a checkpoint directory, or the
+          checkpoint directory itself
+
+        Loads the input hits and the output of finished tasks from the
+        checkpoint and tracks only the hits that had not finished. Further
+        progress is checkpointed in the same directory. Returns the result of
+        tracking.track_many, as for track_many.
+        """
+        if os.path.isdir(manifest):
+            manifest = os.path.join(manifest, self.manifest_file)
+        with open(manifest) as fin:
+            manifest_dict = json.load(fin)
+        self.checkpoint_dir = os.path.dirname(manifest)
+        hits_in = self._load_hits(os.path.join(self.checkpoint_dir,
+                                               manifest_dict["hits"]))
+        self._reset([hits[0] for hits in hits_in])
+        for start, end, file_name in sorted(manifest_dict["finished"]):
+            task_index = self._add_task(start, end)
+            self.task_results[task_index] = self._load_hits(
+                                os.path.join(self.checkpoint_dir, file_name))
+        self.unassigned = [list(hit_range) \
+                                    for hit_range in manifest_dict["pending"]]
+        self._start_pool()
+        return self._wait_all()
 
     def track_one(self, a_hit):
         """
         Just call track_one on the hit
         """
-        self.tracking.track_one(a_hit)
+        return self.tracking_job.tracking.track_one(a_hit)
 
     def track_many(self, hit_list):
         """
         Track the hits in hit_list
         - hit_list: list of hits to be tracked
 
-        Calls track_many_async and then polls returning jobs until they have all
+        Calls track_many_async and then waits for the tasks until they have all
         finished.
 
         Returns the result of tracking.track_many, i.e. a list of list of hits,
-        one list of hits for each process.
+        one list of hits for each input hit, in the order of hit_list.
         """
         self.track_many_async(hit_list)
-        tmp_job_list = [job for job in self.job_list]
-        while len(tmp_job_list) > 0:
-            very_tmp_job_list = []
-            for job in tmp_job_list:
-                if job.is_alive():
-                    very_tmp_job_list.append(job)
-                else:
-                    print("Process", job.pid, "finished with exitcode", end=' ') 
-                    print(job.exitcode)
-            tmp_job_list = very_tmp_job_list
-        return self.get_return_value()
+        return self._wait_all()
+
+    def track_iter(self, hit_list):
+        """
+        Track the hits in hit_list, yielding the output as tasks finish
+        - hit_list: list of hits to be tracked
+
+        Generator that yields a tuple of (input index, list of output hits)
+        for each hit in hit_list, where input index is the index of the hit in
+        hit_list. Output is yielded task by task in the order that the tasks
+        finish; within each task, in input order. MultiTrack does not hold on
+        to the output once it has been yielded, so that the output of a large
+        tracking job need not be held in memory all at once (get_return_value
+        will not include it). If the generator is closed before all tasks have
+        finished, any running jobs are killed.
+        """
+        self.track_many_async(hit_list)
+        finished = False
+        try:
+            for task_index, hits in self.wait_jobs():
+                # release the task output; [] marks the task as finished
+                self.task_results[task_index] = []
+                start = self.task_list[task_index][0]
+                for i, hits_out in enumerate(hits):
+                    yield start+i, hits_out
+            finished = True
+        finally:
+            if not finished:
+                self.kill_jobs()
+
+    def track_bunches(self, hit_list):
+        """
+        Track the hits in hit_list, accumulating the output into bunches
+        - hit_list: list of hits to be tracked
+
+        Returns a list of Bunches, where bunch i holds the i-th output hit of
+        each track, e.g. the hits at the i-th cell end or turn, in input
+        order. Tracks with fewer output hits, e.g. because the particle was
+        lost, do not contribute to the later bunches.
+        """
+        indexed_hits = [[] for hit in hit_list]
+        for index, hits_out in self.track_iter(hit_list):
+            indexed_hits[index] = hits_out
+        bunches = []
+        for hits_out in indexed_hits:
+            for i, hit in enumerate(hits_out):
+                if i == len(bunches):
+                    bunches.append(Bunch())
+                bunches[i].append(hit)
+        return bunches
+
+    def wait_jobs(self):
+        """
+        Wait for the tasks started by track_many_async to finish
+
+        Generator that yields a tuple of (task index, list of list of hits) for
+        each task, in the order that the tasks finish. Hits in task i
+        correspond to input hits task_list[i][0] to task_list[i][1]. The
+        calling process sleeps while no task is finishing. Tasks that time out
+        or fail are resubmitted as described in the class documentation; if a
+        task still fails, a RuntimeError is raised and any jobs still running
+        are killed.
+        """
+        while True:
+            for index in self._poll():
+                yield index, self.task_results[index]
+            if self.job_tasks.count(None) == len(self.job_tasks):
+                break
+            self._wait()
 
     def get_return_value(self):
         """
-        Return a list of list of hits. If all TrackingProcesses have finished,
-        one list for each initial hit is returned. If some TrackingProcesses are
-        still running, those results will not be included in the return value. 
+        Return a list of list of hits. If all tasks have finished, one list for
+        each initial hit is returned. If some tasks are still running, those
+        results will not be included in the return value. Any processes that
+        are free are given a new task.
         """
+        self._poll()
         self.last = []
+        for task_index in self._tasks_in_order():
+            if self.task_results[task_index] != None:
+                self.last += self.task_results[task_index]
+        return self.last
+
+    def kill_jobs(self):
+        """
+        Kill any jobs that are still running
+        """
         for job in self.job_list:
+            if job.is_alive():
+                job.kill(self.kill_timeout)
+
+    def _reset(self, hit_list):
+        """Clear the task list ready to track hit_list"""
+        self.hit_list = hit_list
+        self.task_list = []
+        self.task_results = []
+        self.task_times = []
+        self.task_retries = []
+        self.unassigned = []
+        self.pending_tasks = []
+        self.last = []
+
+    def _start_pool(self):
+        """Make the pool of processes and start a task on each one"""
+        n_processes = int(self.n_processes)
+        started = self._profile_start()
+        # output directories of finished tasks are removed as we go; clear
+        # up any left behind by earlier runs that died
+        self.tracking_job.clean_tmp_dir(self.tracking_job.tmp_dir,
+                                        self.tmp_max_age)
+        self.job_list = [copy.deepcopy(self.tracking_job) \
+                                                  for i in range(n_processes)]
+        self.job_tasks = [None]*n_processes
+        self.job_start_times = [None]*n_processes
+        self._profile_stop(started, "start_pool", "setup")
+        for slot in range(n_processes):
+            self._dispatch(slot)
+        return self.job_list
+
+    def _wait_all(self):
+        """
+        Wait for all tasks to finish and return the output hits; the time
+        taken by each task is in task_times
+        """
+        for index, hits in self.wait_jobs():
+            pass
+        return self.get_return_value()
+
+    def _tasks_in_order(self):
+        """Task indices sorted by the index of the first hit in the task"""
+        return sorted(range(len(self.task_list)),
+                      key = lambda i: self.task_list[i][0])
+
+    def _add_task(self, start, end):
+        """Add a task for hits start to end; return the task index"""
+        self.task_list.append((start, end))
+        self.task_results.append(None)
+        self.task_times.append(None)
+        self.task_retries.append(0)
+        return len(self.task_list)-1
+
+    def _next_task(self):
+        """
+        Get the index of the next task to run, making a new task if required;
+        returns None if all the hits have been handed out
+        """
+        if len(self.pending_tasks) > 0:
+            return self.pending_tasks.pop(0)
+        if len(self.unassigned) == 0:
+            return None
+        n_remaining = sum([end-start for start, end in self.unassigned])
+        # never give a process more than its share of the remaining hits, so
+        # that the processes finish together
+        n_share = -(-n_remaining // int(self.n_processes))
+        task_size = self.task_size
+        if self.target_task_time != None:
+            n_hits, total_time = 0, 0.
+            for (start, end), task_time in zip(self.task_list, self.task_times):
+                if task_time != None:
+                    n_hits += end-start
+                    total_time += task_time
+            if total_time > 0.:
+                task_size = int(self.target_task_time*n_hits/total_time)
+        if task_size == None and self.target_task_time != None:
+            task_size = 1
+        elif task_size == None:
+            task_size = n_share
+        hit_range = self.unassigned[0]
+        start = hit_range[0]
+        end = min(start+max(1, min(task_size, n_share)), hit_range[1])
+        hit_range[0] = end
+        if hit_range[0] == hit_range[1]:
+            self.unassigned.pop(0)
+        return self._add_task(start, end)
+
+    def _dispatch(self, slot):
+        """Start the next task on the job in slot, if there is one"""
+        task_index = self._next_task()
+        self.job_tasks[slot] = task_index
+        if task_index == None:
+            return
+        start, end = self.task_list[task_index]
+        job = self.job_list[slot]
+        started = self._profile_start()
+        job.new_out_dir()
+        job.set_hit_list(self.hit_list[start:end])
+        self.job_start_times[slot] = time.time()
+        job.start()
+        self._profile_stop(started, "dispatch", "overhead", slot+1, end-start,
+                           job.bytes_in)
+
+    def _poll(self):
+        """
+        Collect the results of any finished tasks, retrying failures and
+        handing out new tasks to free processes. Returns a list of the indices
+        of tasks that finished.
+        """
+        finished = []
+        for slot, job in enumerate(self.job_list):
+            task_index = self.job_tasks[slot]
+            if task_index == None:
+                continue
+            if job.is_alive():
+                if self._is_timed_out(slot):
+                    job.kill(self.kill_timeout)
+                    self._retry_task(slot, "timed out")
+                continue
+            started = self._profile_start()
             try:
-                self.last += job.get_return_value() 
-            except RuntimeError: # the job wasn't finished?
-                pass
-        return self.last
+                hits = job.get_return_value()
+            except RuntimeError:
+                self._retry_task(slot, "failed with exitcode "+\
+                                       str(job.exitcode))
+                continue
+            self.task_results[task_index] = hits
+            self.task_times[task_index] = time.time()-self.job_start_times[slot]
+            if started != None:
+                start, end = self.task_list[task_index]
+                self.profiler.add_event("task", "tracking",
+                                        self.job_start_times[slot],
+                                        self.task_times[task_index], None,
+                                        slot+1, end-start)
+                self._profile_stop(started, "collect", "overhead", slot+1,
+                                   end-start, job.bytes_out)
+            job.cleanup()
+            self._checkpoint(task_index)
+            finished.append(task_index)
+            self._dispatch(slot)
+        return finished
+
+    def _retry_task(self, slot, reason):
+        """Resubmit the task in slot, or raise if out of retries"""
+        job = self.job_list[slot]
+        task_index = self.job_tasks[slot]
+        if self.task_retries[task_index] >= self.max_retries:
+            self.kill_jobs()
+            raise RuntimeError("Tracking task "+str(task_index)+" with pid "+\
+                               str(job.pid)+" "+reason)
+        self.task_retries[task_index] += 1
+        self.pending_tasks.insert(0, task_index)
+        self._dispatch(slot)
+
+    def _is_timed_out(self, slot):
+        """Return True if the task in slot has exceeded job_timeout"""
+        if self.job_timeout == None:
+            return False
+        return time.time()-self.job_start_times[slot] > self.job_timeout
+
+    def _wait(self):
+        """
+        Sleep until one of the running jobs signals that it has finished, the
+        next job timeout expires or, if some jobs can only be polled, the
+        poll_interval expires
+        """
+        running = [slot for slot, task_index in enumerate(self.job_tasks) \
+                                                     if task_index != None]
+        timeout = None
+        if self.job_timeout != None:
+            now = time.time()
+            timeout = min([self.job_start_times[i]+self.job_timeout-now \
+                                                          for i in running])
+            timeout = max(timeout, 0.)
+        sentinels = []
+        for slot in running:
+            job = self.job_list[slot]
+            sentinel = job.get_sentinel()
+            if sentinel == None:
+                if timeout == None or timeout > job.poll_interval:
+                    timeout = job.poll_interval
+            else:
+                sentinels.append(sentinel)
+        started = self._profile_start()
+        if len(sentinels) > 0:
+            multiprocessing.connection.wait(sentinels, timeout)
+        elif timeout != None:
+            time.sleep(timeout)
+        self._profile_stop(started, "wait", "idle")
+
+    def _profile_start(self):
+        """Start timing an event; returns None if there is no profiler"""
+        if self.profiler == None:
+            return None
+        return self.profiler.start()
+
+    def _profile_stop(self, started, name, category, worker = 0, n_hits = 0,
+                      n_bytes = 0):
+        """Record an event started by _profile_start(), if there is a profiler"""
+        if started != None:
+            self.profiler.stop(started, name, category, worker, n_hits, n_bytes)
+
+    def _checkpoint(self, task_index):
+        """Write the output of a finished task and update the manifest"""
+        if self.checkpoint_dir == None:
+            return
+        start, end = self.task_list[task_index]
+        file_name = "task_"+str(start)+"_"+str(end)+".npz"
+        self._save_hits(os.path.join(self.checkpoint_dir, file_name),
+                        self.task_results[task_index])
+        self._write_manifest()
+
+    def _write_manifest(self):
+        """
+        Write the manifest, listing finished tasks as (start, end, file name)
+        and the ranges of hits that are not yet finished as (start, end)
+        """
+        finished = []
+        for task_index in self._tasks_in_order():
+            if self.task_results[task_index] == None:
+                continue
+            start, end = self.task_list[task_index]
+            finished.append((start, end, "task_"+str(start)+"_"+str(end)+".npz"))
+        pending = []
+        next_start = 0
+        for start, end, file_name in finished+[(len(self.hit_list), 0, "")]:
+            if start > next_start:
+                pending.append((next_start, start))
+            next_start = end
+        manifest = {"n_hits":len(self.hit_list), "hits":self.hits_file,
+                    "finished":finished, "pending":pending}
+        path = os.path.join(self.checkpoint_dir, self.manifest_file)
+        # write and rename so that a partial manifest is never read
+        with open(path+".tmp", "w") as fout:
+            json.dump(manifest, fout)
+        os.rename(path+".tmp", path)
+
+    @classmethod
+    def _save_hits(cls, path, hits_out):
+        """Write a list of list of hits to path as numpy column buffers"""
+        lengths = numpy.array([len(hits) for hits in hits_out],
+                              dtype=numpy.int64)
+        columns = PipeProcess.hits_to_columns([hit for hits in hits_out \
+                                                    for hit in hits])
+        with open(path+".tmp", "wb") as fout:
+            numpy.savez(fout, lengths = lengths,
+                        floats = columns[0], ints = columns[1])
+        os.rename(path+".tmp", path)
+
+    @classmethod
+    def _load_hits(cls, path):
+        """Read a list of list of hits written by _save_hits"""
+        with numpy.load(path) as data:
+            lengths = data["lengths"]
+            hits = PipeProcess.columns_to_hits((data["floats"], data["ints"]))
+        hits_out = []
+        start = 0
+        for length in lengths.tolist():
+            hits_out.append(hits[start:start+length])
+            start += length
+        return hits_out
+
+    kill_timeout = 10.
+    tmp_max_age = 7*24*3600.
+    manifest_file = "manifest.json"
+    hits_file = "hits_in.npz"
@@ -0,0 +1,276 @@
+#This file is a part of xboa
+#
+#xboa is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+#
+#xboa is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU General Public License
+#along with xboa in the doc folder.  If not, see 
+#<http://www.gnu.org/licenses/>.
+
+"""
+\namespace xboa::tracking::_profiled_tracking
+
+Should be imported directly from the xboa::tracking namespace
+"""
+
+import os
+import json
+import time
+import pickle
+
+from ._tracking_base import TrackingBase
+
+class Profiler(object):
+    """
+    Records timing information for tracking calls
+
+    Each event has a name, a category, a start time, a wall time, a cpu time
+    (None if it was not measured), the number of hits and number of bytes
+    serialised, and the worker on which it ran. Worker 0 is the calling
+    process; MultiTrack records events for process slot i as worker i+1.
+
+    Use start() and stop(...) to time an event in the calling process, or
+    add_event(...) to record an event that was timed elsewhere. The events
+    can be summarised using report() or written as a Chrome trace (viewable
+    in chrome://tracing or Perfetto) using write_chrome_trace(...).
+    """
+    def __init__(self):
+        """Initialise an empty Profiler"""
+        self.events = []
+        self.start_time = time.time()
+
+    def clear(self):
+        """Remove all events"""
+        self.events = []
+        self.start_time = time.time()
+
+    def start(self):
+        """
+        Start timing an event; returns a token to be passed to stop(...)
+        """
+        return (time.time(), time.process_time())
+
+    def stop(self, started, name, category, worker = 0, n_hits = 0,
+             n_bytes = 0):
+        """
+        Stop timing an event and record it
+        - started: token returned by start()
+        - name: string name of the event
+        - category: string category of the event
+        - worker: integer worker on which the event ran
+        - n_hits: number of hits handled by the event
+        - n_bytes: number of bytes serialised by the event
+        Returns the event
+        """
+        wall_time, cpu_time = self.elapsed(started)
+        return self.add_event(name, category, started[0], wall_time, cpu_time,
+                              worker, n_hits, n_bytes)
+
+    def elapsed(self, started):
+        """
+        Get the time since start() was called
+        - started: token returned by start()
+        Returns a tuple of (wall_time, cpu_time) in seconds
+        """
+        return time.time()-started[0], time.process_time()-started[1]
+
+    def add_event(self, name, category, start, wall_time, cpu_time = None,
+                  worker = 0, n_hits = 0, n_bytes = 0):
+        """
+        Record an event
+        - name: string name of the event
+        - category: string category of the event
+        - start: start time of the event, as returned by time.time()
+        - wall_time: duration of the event in seconds
+        - cpu_time: cpu time used by the event in seconds, or None if unknown
+        - worker: integer worker on which the event ran
+        - n_hits: number of hits handled by the event
+        - n_bytes: number of bytes serialised by the event
+        Returns the event, a dict
+        """
+        event = {"name":name, "category":category, "start":start,
+                 "wall_time":wall_time, "cpu_time":cpu_time, "worker":worker,
+                 "n_hits":n_hits, "n_bytes":n_bytes}
+        self.events.append(event)
+        return event
+
+    def report(self):
+        """
+        Summarise the events
+        
+        Returns a dict like
+        - total_wall_time: time from the start of the first event to the end
+          of the last event
+        - events: dict mapping event name to a dict of
+          - category: event category
+          - count: number of events
+          - wall_time: total wall time
+          - cpu_time: total cpu time, or None if cpu time was never measured
+          - n_hits: total number of hits
+          - n_bytes: total number of bytes serialised
+          - hits_per_second: n_hits/wall_time, or None if wall_time is 0
+        - workers: dict mapping worker to a dict of
+          - busy_time: total wall time of events with category in
+            busy_categories
+          - utilisation: busy_time/total_wall_time
+        """
+        report = {"total_wall_time":0., "events":{}, "workers":{}}
+        if len(self.events) == 0:
+            return report
+        first = min([event["start"] for event in self.events])
+        last = max([event["start"]+event["wall_time"] \
+                                                 for event in self.events])
+        total_wall_time = last-first
+        report["total_wall_time"] = total_wall_time
+        for event in self.events:
+            name = event["name"]
+            if name not in report["events"]:
+                report["events"][name] = {"category":event["category"],
+                                          "count":0, "wall_time":0.,
+                                          "cpu_time":None, "n_hits":0,
+                                          "n_bytes":0, "hits_per_second":None}
+            summary = report["events"][name]
+            summary["count"] += 1
+            summary["wall_time"] += event["wall_time"]
+            summary["n_hits"] += event["n_hits"]
+            summary["n_bytes"] += event["n_bytes"]
+            if event["cpu_time"] != None:
+                if summary["cpu_time"] == None:
+                    summary["cpu_time"] = 0.
+                summary["cpu_time"] += event["cpu_time"]
+            worker = event["worker"]
+            if worker not in report["workers"]:
+                report["workers"][worker] = {"busy_time":0.,
+                                             "utilisation":None}
+            if event["category"] in self.busy_categories:
+                report["workers"][worker]["busy_time"] += event["wall_time"]
+        for summary in report["events"].values():
+            if summary["wall_time"] > 0.:
+                summary["hits_per_second"] = \
+                                       summary["n_hits"]/summary["wall_time"]
+        if total_wall_time > 0.:
+            for summary in report["workers"].values():
+                summary["utilisation"] = \
+                                       summary["busy_time"]/total_wall_time
+        return report
+
+    def chrome_trace(self):
+        """
+        Get the events in Chrome trace event format, as a json-serialisable
+        dict
+        """
+        pid = os.getpid()
+        trace_events = []
+        for worker in sorted(set([event["worker"] for event in self.events])):
+            thread_name = "worker "+str(worker-1)
+            if worker == 0:
+                thread_name = "main"
+            trace_events.append({"name":"thread_name", "ph":"M", "pid":pid,
+                                 "tid":worker, "args":{"name":thread_name}})
+        for event in self.events:
+            trace_events.append({
+                "name":event["name"],
+                "cat":event["category"],
+                "ph":"X",
+                "ts":(event["start"]-self.start_time)*1e6,
+                "dur":event["wall_time"]*1e6,
+                "pid":pid,
+                "tid":event["worker"],
+                "args":{"cpu_time":event["cpu_time"],
+                        "n_hits":event["n_hits"],
+                        "n_bytes":event["n_bytes"]},
+            })
+        return {"traceEvents":trace_events, "displayTimeUnit":"ms"}
+
+    def write_chrome_trace(self, file_name):
+        """
+        Write the events to file_name in Chrome trace event format
+        """
+        with open(file_name, "w") as fout:
+            json.dump(self.chrome_trace(), fout)
+
+    ## events in these categories count towards worker utilisation
+    busy_categories = ["tracking"]
+
+class ProfiledTracking(TrackingBase):
+    """
+    Wraps another tracking object, recording the wall time, cpu time and
+    number of hits for each call to track_one and track_many in a Profiler.
+
+    If measure_bytes is True, the size of the pickled input and output hits is
+    also recorded. This requires the hits to be pickled, so it is off by
+    default; the pickling is done after the timing is taken, so it is not
+    included in the recorded wall and cpu time.
+
+    Note that if ProfiledTracking is pickled, e.g. to run in a
+    TrackingProcess, events recorded in the other process are not returned
+    to the calling process.
+    """
+    def __init__(self, tracking, profiler = None, worker = 0,
+                 measure_bytes = False):
+        """
+        Initialise the ProfiledTracking
+        - tracking: the TrackingBase object that does the tracking
+        - profiler: Profiler in which to record events. If None, a new
+          Profiler is made.
+        - worker: integer worker number used to label events
+        - measure_bytes: if True, record the size of the pickled hits
+        """
+        TrackingBase.__init__(self)
+        if profiler == None:
+            profiler = Profiler()
+        self.tracking = tracking
+        self.profiler = profiler
+        self.worker = worker
+        self.measure_bytes = measure_bytes
+
+    def track_one(self, hit):
+        """
+        Track a hit and return a list of output hits
+        - hit initial particle coordinates to be tracked
+        """
+        started = self.profiler.start()
+        hit_list = self.tracking.track_one(hit)
+        wall_time, cpu_time = self.profiler.elapsed(started)
+        n_bytes = 0
+        if self.measure_bytes:
+            n_bytes = self._n_bytes(hit)+self._n_bytes(hit_list)
+        self.profiler.add_event("track_one", "tracking", started[0], wall_time,
+                                cpu_time, self.worker, 1, n_bytes)
+        self.last = [hit_list]
+        return hit_list
+
+    def track_many(self, list_of_hits):
+        """
+        Track many hits and return a list of list of output hits
+        - list_of_hits list of initial particle coordinates to be tracked
+        """
+        started = self.profiler.start()
+        hits_out = self.tracking.track_many(list_of_hits)
+        wall_time, cpu_time = self.profiler.elapsed(started)
+        n_bytes = 0
+        if self.measure_bytes:
+            n_bytes = self._n_bytes(list_of_hits)+self._n_bytes(hits_out)
+        self.profiler.add_event("track_many", "tracking", started[0],
+                                wall_time, cpu_time, self.worker,
+                                len(list_of_hits), n_bytes)
+        self.last = hits_out
+        return hits_out
+
+    def report(self):
+        """
+        Summarise the events recorded so far; see Profiler.report()
+        """
+        return self.profiler.report()
+
+    @classmethod
+    def _n_bytes(cls, data):
+        """Size of data when pickled"""
+        return len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
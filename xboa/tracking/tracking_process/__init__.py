@@ -24,11 +24,28 @@ subprocess, in order to support the MultiTrack class.
 Implemented within this module:
 \li \link xboa::tracking::tracking_process::_tracking_process::TrackingProcess TrackingProcess \endlink: base class that defines an interface suitable for distributing tracking
 \li \link xboa::tracking::tracking_process::_this_node_process::ThisNodeProcess ThisNodeProcess\endlink: uses the subprocess module to run subprocesses on this node
+\li \link xboa::tracking::tracking_process::_pipe_process::PipeProcess PipeProcess\endlink: uses long-lived worker processes on this node, with in-memory messaging over pipes
+\li \link xboa::tracking::tracking_process::_batch_process::BatchProcess BatchProcess\endlink: submits jobs to a batch queue through a BatchBackend
+\li \link xboa::tracking::tracking_process::_bsub_process::BSubProcess BSubProcess\endlink: BatchProcess that submits jobs to LSF
+
+Batch backends:
+\li \link xboa::tracking::tracking_process::_batch_backend::BatchBackend BatchBackend\endlink: base class that defines the interface to a batch queue
+\li \link xboa::tracking::tracking_process::_local_queue_backend::LocalQueueBackend LocalQueueBackend\endlink: spooling queue that runs jobs on this node with a fixed number of slots
+\li \link xboa::tracking::tracking_process::_lsf_backend::LSFBackend LSFBackend\endlink: submits jobs to LSF
+\li \link xboa::tracking::tracking_process::_slurm_backend::SlurmBackend SlurmBackend\endlink: submits jobs to Slurm
 """
 from ._tracking_process import TrackingProcess
 from ._this_node_process import ThisNodeProcess
+from ._pipe_process import PipeProcess
+from ._batch_backend import BatchBackend
+from ._local_queue_backend import LocalQueueBackend
+from ._lsf_backend import LSFBackend
+from ._slurm_backend import SlurmBackend
+from ._batch_process import BatchProcess
 from ._bsub_process import BSubProcess
 
-__all__ = ["TrackingProcess", "ThisNodeProcess", "BSubProcess"]
+__all__ = ["TrackingProcess", "ThisNodeProcess", "BSubProcess", "PipeProcess",
+           "BatchBackend", "LocalQueueBackend", "LSFBackend", "SlurmBackend",
+           "BatchProcess"]
 
 
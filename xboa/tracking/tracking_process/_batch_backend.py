@@ -0,0 +1,70 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import BatchBackend directly from the tracking_process module
+"""
+
+class BatchBackend(object):
+    """
+    Interface to a batch queue, for use by BatchProcess
+
+    A batch backend submits commands to a queue and reports on their status.
+    Implementations are provided for a local spooling queue
+    (LocalQueueBackend), LSF (LSFBackend) and Slurm (SlurmBackend). The
+    status of a job is one of
+    - PENDING: the job is waiting in the queue
+    - RUNNING: the job is running
+    - DONE: the job finished with exit code 0
+    - FAILED: the job finished with a non-zero exit code, or was killed
+    - UNKNOWN: the queue does not know about the job
+    """
+    def submit(self, command, log_path, err_path):
+        """
+        Submit a job to the queue
+        - command: list of strings; the command to run
+        - log_path: path of the file to which stdout should be written
+        - err_path: path of the file to which stderr should be written
+        Returns the job id
+        """
+        raise NotImplementedError("A virtual method was called on "+\
+                           "BatchBackend base class that was not overloaded")
+
+    def status(self, job_id):
+        """
+        Get the status of a job; this should not block while the job runs
+        - job_id: job id, as returned by submit
+        Returns a tuple of (state, exit code). Exit code is None if the job has
+        not finished or the exit code is not known.
+        """
+        raise NotImplementedError("A virtual method was called on "+\
+                           "BatchBackend base class that was not overloaded")
+
+    def kill(self, job_id):
+        """
+        Kill a job, whether it is pending or running
+        - job_id: job id, as returned by submit
+        """
+        raise NotImplementedError("A virtual method was called on "+\
+                           "BatchBackend base class that was not overloaded")
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    UNKNOWN = "unknown"
+    active_states = (PENDING, RUNNING)
@@ -0,0 +1,145 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import BatchProcess directly from the tracking_process module
+"""
+
+import os
+import time
+
+from ._tracking_process import TrackingProcess
+from ._batch_backend import BatchBackend
+
+class BatchProcess(TrackingProcess):
+    """
+    TrackingProcess that submits jobs to a batch queue, through a BatchBackend
+
+    Messaging is by pickle files in out_dir, as for ThisNodeProcess, so out_dir
+    must be visible to the nodes on which the batch jobs run. The status of the
+    job is checked with backoff: after each check that finds the job in the
+    same state as before, the poll_interval doubles, up to max_poll_interval;
+    calls to is_alive() within poll_interval of the last check use the cached
+    state and do not contact the queue.
+
+    Queues can take a moment to learn about a new job. Until the queue has
+    reported the job in some state other than UNKNOWN, an UNKNOWN state is
+    treated as PENDING, for up to unknown_timeout seconds after submission.
+    Once the job has been seen, UNKNOWN means the job has gone from the queue
+    and is treated as finished.
+    """
+    def __init__(self, tracking, backend, tmp_dir = "/tmp/tracking"):
+        """
+        Initialise the Process
+        - tracking: a picklable object of type xboa.tracking.TrackingBase
+        - backend: a BatchBackend, used to submit and check on jobs
+        - tmp_dir: directory in which to make output directories
+        """
+        TrackingProcess.__init__(self, tracking, tmp_dir)
+        self.backend = backend
+        self.state = None
+        self.state_seen = False
+        self.submit_time = None
+        self.next_poll_time = 0.
+        self.poll_interval = self.min_poll_interval
+
+    def start(self):
+        """
+        Start the tracking by submitting a job to the backend
+        """
+        if self.is_alive():
+            raise RuntimeError("Attempt to start a process that is already "+\
+                               "started")
+        self.exitcode = None
+        self.pid = self.backend.submit([self.run_executable,
+                                        "--out-dir", self.out_dir],
+                                       os.path.join(self.out_dir, self.std_out),
+                                       os.path.join(self.out_dir, self.std_err))
+        self.state = BatchBackend.PENDING
+        self.state_seen = False
+        self.submit_time = time.time()
+        self.poll_interval = self.min_poll_interval
+        self.next_poll_time = self.submit_time
+
+    def is_alive(self):
+        """
+        Returns true if the job is pending or running
+        """
+        if self.pid == None or self.state not in BatchBackend.active_states:
+            return False
+        now = time.time()
+        if now < self.next_poll_time:
+            return True
+        state, exitcode = self.backend.status(self.pid)
+        if state != BatchBackend.UNKNOWN:
+            self.state_seen = True
+        elif not self.state_seen and \
+             now-self.submit_time < self.unknown_timeout:
+            # the queue does not know about the job yet
+            state = self.state
+        if state == self.state:
+            self.poll_interval = min(self.poll_interval*2.,
+                                     self.max_poll_interval)
+        else:
+            self.poll_interval = self.min_poll_interval
+        self.state = state
+        self.next_poll_time = now+self.poll_interval
+        if state in BatchBackend.active_states:
+            return True
+        if exitcode == None:
+            exitcode = 0 if state == BatchBackend.DONE else -1
+        self.exitcode = exitcode
+        return False
+
+    def terminate(self, timeout = None):
+        """
+        Terminate the job (batch queues only offer a hard exit)
+        """
+        self.kill(timeout)
+
+    def kill(self, timeout = None):
+        """
+        Kill the job; wait until the queue reports that the job has finished
+        """
+        if self.pid == None:
+            raise RuntimeError("Attempt to kill process before it has started")
+        self.backend.kill(self.pid)
+        self.next_poll_time = 0.
+        self.poll_interval = self.min_poll_interval
+        self.join(timeout)
+
+    def get_log(self):
+        """
+        Return a tuple of strings (stdout, stderr) holding the logs written by
+        the most recent job; empty strings if no logs were written
+        """
+        logs = []
+        for name in self.std_out, self.std_err:
+            try:
+                with open(os.path.join(self.out_dir, name)) as fin:
+                    logs.append(fin.read())
+            except OSError:
+                logs.append("")
+        return tuple(logs)
+
+    min_poll_interval = 0.01
+    max_poll_interval = 1.
+    ## seconds after submission for which an UNKNOWN state is treated as
+    ## PENDING, if the queue has not yet reported the job
+    unknown_timeout = 60.
+    std_out = "job.out"
+    std_err = "job.err"
@@ -0,0 +1,169 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import LocalQueueBackend directly from the tracking_process module
+"""
+
+import os
+import json
+import tempfile
+import subprocess
+
+from ._batch_backend import BatchBackend
+from ._tracking_process import TrackingProcess
+
+class LocalQueueBackend(BatchBackend):
+    """
+    A batch queue that runs jobs on this node, with at most n_slots jobs
+    running at once
+
+    Each submitted job is written as a spool file in a queue directory below
+    spool_dir. Queue directories left in spool_dir by earlier queues that have
+    not been modified for longer than spool_max_age seconds are removed when a
+    new queue is made. The queue is advanced, i.e. finished jobs are reaped and
+    pending jobs are started in submission order, whenever submit, status or
+    kill is called; there is no separate daemon. The exit code of each
+    finished job is written next to its spool file and stdout and stderr are
+    written to the log files given on submission.
+
+    Copies of a LocalQueueBackend (e.g. made by copy.deepcopy when MultiTrack
+    copies a BatchProcess) are the same queue, so that slots are shared.
+    """
+    def __init__(self, n_slots = 1, spool_dir = "/tmp/tracking/spool"):
+        """
+        Initialise the queue
+        - n_slots: maximum number of jobs that can run at once
+        - spool_dir: directory in which the queue directory is made
+        """
+        if n_slots < 1:
+            raise ValueError("n_slots should be >= 1")
+        try:
+            os.makedirs(spool_dir)
+        except OSError:
+            pass # maybe the directory already exists? Let's keep going
+        self.n_slots = n_slots
+        self.spool_dir = spool_dir
+        TrackingProcess.clean_tmp_dir(spool_dir, self.spool_max_age)
+        self.queue_dir = tempfile.mkdtemp(dir = spool_dir)
+        self.pending = []
+        self.running = {}
+        self.n_submitted = 0
+
+    def __deepcopy__(self, memo):
+        """Copies share the queue"""
+        return self
+
+    def __getstate__(self):
+        """
+        Running processes are not pickled; an unpickled queue knows about
+        finished jobs only
+        """
+        state = self.__dict__.copy()
+        state["pending"] = []
+        state["running"] = {}
+        return state
+
+    def submit(self, command, log_path, err_path):
+        """
+        Add a job to the queue
+        - command: list of strings; the command to run
+        - log_path: path of the file to which stdout should be written
+        - err_path: path of the file to which stderr should be written
+        Returns the job id, an integer
+        """
+        job_id = self.n_submitted
+        self.n_submitted += 1
+        with open(self._spool_path(job_id), "w") as fout:
+            json.dump({"command":command, "log":log_path, "err":err_path},
+                      fout)
+        self.pending.append(job_id)
+        self._schedule()
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get the status of a job
+        - job_id: job id, as returned by submit
+        Returns a tuple of (state, exit code)
+        """
+        self._schedule()
+        if job_id in self.pending:
+            return self.PENDING, None
+        if job_id in self.running:
+            return self.RUNNING, None
+        try:
+            with open(self._spool_path(job_id)+".exit") as fin:
+                exitcode = int(fin.read())
+        except (OSError, ValueError):
+            return self.UNKNOWN, None
+        if exitcode == 0:
+            return self.DONE, exitcode
+        return self.FAILED, exitcode
+
+    def kill(self, job_id):
+        """
+        Kill a job; a pending job is removed from the queue
+        - job_id: job id, as returned by submit
+        """
+        if job_id in self.pending:
+            self.pending.remove(job_id)
+            self._write_exitcode(job_id, self.killed_exitcode)
+        elif job_id in self.running:
+            self.running[job_id][0].kill()
+            self.running[job_id][0].wait()
+        self._schedule()
+
+    def _schedule(self):
+        """Reap finished jobs and start pending jobs while slots are free"""
+        for job_id in list(self.running.keys()):
+            proc, log, err = self.running[job_id]
+            exitcode = proc.poll()
+            if exitcode != None:
+                log.close()
+                err.close()
+                del self.running[job_id]
+                self._write_exitcode(job_id, exitcode)
+        while len(self.pending) > 0 and len(self.running) < self.n_slots:
+            job_id = self.pending.pop(0)
+            with open(self._spool_path(job_id)) as fin:
+                job = json.load(fin)
+            log = open(job["log"], "w")
+            err = open(job["err"], "w")
+            try:
+                proc = subprocess.Popen(job["command"], stdout = log,
+                                        stderr = err)
+            except OSError as exc:
+                err.write(str(exc)+"\n")
+                log.close()
+                err.close()
+                self._write_exitcode(job_id, self.start_failed_exitcode)
+                continue
+            self.running[job_id] = (proc, log, err)
+
+    def _write_exitcode(self, job_id, exitcode):
+        """Write the exit code of a finished job next to its spool file"""
+        with open(self._spool_path(job_id)+".exit", "w") as fout:
+            fout.write(str(exitcode))
+
+    def _spool_path(self, job_id):
+        """Path to the spool file for job_id"""
+        return os.path.join(self.queue_dir, "job_"+str(job_id)+".json")
+
+    killed_exitcode = -9
+    start_failed_exitcode = 127
+    spool_max_age = 7*24*3600.
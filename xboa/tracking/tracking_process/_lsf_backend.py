@@ -0,0 +1,110 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import LSFBackend directly from the tracking_process module
+"""
+
+import subprocess
+
+from ._batch_backend import BatchBackend
+
+class LSFBackend(BatchBackend):
+    """
+    Batch backend that submits jobs to LSF using bsub, bjobs and bkill
+    """
+    def __init__(self, queue, job_time):
+        """
+        Initialise the backend
+        - queue: name of the LSF queue
+        - job_time: wall time limit, as passed to bsub -W
+        """
+        self.queue = queue
+        self.job_time = job_time
+
+    def submit(self, command, log_path, err_path):
+        """
+        Submit a job using bsub; returns the integer LSF job id
+        """
+        proc_output = self._call(['bsub',
+                                  '-q', self.queue,
+                                  '-W', self.job_time,
+                                  '-o', log_path,
+                                  '-e', err_path]+command)
+        return self.parse_submit(proc_output)
+
+    def status(self, job_id):
+        """
+        Get the job status using bjobs; returns tuple of (state, exit code)
+        """
+        proc_output = self._call(['bjobs', '-l', str(job_id)])
+        return self.parse_status(proc_output)
+
+    def kill(self, job_id):
+        """
+        Kill the job using bkill
+        """
+        subprocess.call(['bkill', str(job_id)])
+
+    @classmethod
+    def parse_submit(cls, proc_output):
+        """
+        Parse the output of bsub, like "Job <1234> is submitted to queue <q>"
+        Returns the job id
+        """
+        return int(cls._get_substr(proc_output, "<", ">"))
+
+    @classmethod
+    def parse_status(cls, proc_output):
+        """
+        Parse the output of bjobs -l; returns tuple of (state, exit code)
+        """
+        try:
+            status = cls._get_substr(proc_output, 'Status <', '>')
+        except ValueError:
+            return cls.UNKNOWN, None
+        if status in ["PEND", "PSUSP", "WAIT"]:
+            return cls.PENDING, None
+        if status in ["RUN", "USUSP", "SSUSP"]:
+            return cls.RUNNING, None
+        if status == "DONE":
+            return cls.DONE, 0
+        exitcode = 1
+        try:
+            exitcode = int(cls._get_substr(proc_output, 'exit code ', '.'))
+        except ValueError:
+            pass # no report of exit code
+        return cls.FAILED, exitcode
+
+    @classmethod
+    def _call(cls, command):
+        """Call command and return stdout decoded as a string"""
+        return subprocess.check_output(command, universal_newlines = True)
+
+    @classmethod
+    def _get_substr(cls, a_string, start_key, end_key):
+        """Get a substring bounded, but not including, start_key and end_key"""
+        start_index = a_string.find(start_key)
+        if start_index < 0:
+            raise ValueError("start_key "+start_key+" could not be found in "+\
+                             "string "+a_string)
+        a_string = a_string[start_index+len(start_key):]
+        end_index = a_string.find(end_key)
+        if end_index < 0:
+            raise ValueError("end_key "+end_key+" could not be found in "+\
+                             "string "+a_string)
+        return a_string[:end_index]
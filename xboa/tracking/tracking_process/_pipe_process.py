@@ -0,0 +1,303 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import PipeProcess directly from the tracking_process module
+"""
+
+import traceback
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    pass
+
+import xboa.common.config as config
+from xboa.hit import Hit
+from ._tracking_process import TrackingProcess
+
+class PipeProcess(TrackingProcess):
+    """
+    TrackingProcess that does multiprocessing on this node using in-memory
+    messaging
+
+    A long-lived worker process is started the first time start() is called.
+    The tracking object is handed to the worker once, when the worker is
+    started; each call to start() then sends the hit list down a pipe as a
+    compact pair of numpy column buffers, and the worker sends the tracked hits
+    back in the same format. No files are written to disk. The same
+    PipeProcess can be started many times, each time with a new hit list, and
+    the worker will be reused.
+
+    The worker is a daemon process, so it is killed when the calling process
+    exits; call close() to stop it sooner.
+    """
+    def __init__(self, tracking):
+        """
+        Initialise the Process
+        - tracking: an object of type xboa.tracking.TrackingBase that will track
+          hits. The tracking object must be picklable if the multiprocessing
+          start method is not "fork".
+        """
+        config.has_numpy()
+        config.has_multiprocessing()
+        self.worker = None
+        self.connection = None
+        self.running = False
+        self.error = None
+        TrackingProcess.__init__(self, tracking)
+
+    def __getstate__(self):
+        """
+        Handles on the worker process are not copied or pickled
+        """
+        state = self.__dict__.copy()
+        state["worker"] = None
+        state["connection"] = None
+        state["running"] = False
+        return state
+
+    def new_out_dir(self):
+        """
+        PipeProcess does not use an output directory; returns None
+        """
+        self.out_dir = None
+        return self.out_dir
+
+    def set_hit_list(self, hit_list):
+        """
+        Set the hit list over which the PipeProcess should run
+        """
+        self.hit_list = hit_list
+
+    def start(self):
+        """
+        Send the hit list to the worker, starting the worker if required
+        """
+        if self.is_alive():
+            raise RuntimeError("Attempt to start a process that is already "+\
+                               "started")
+        if self.worker == None or not self.worker.is_alive():
+            self._start_worker()
+        self.return_value = None
+        self.error = None
+        self.exitcode = None
+        columns = self.hits_to_columns(self.hit_list)
+        self.bytes_in = columns[0].nbytes+columns[1].nbytes
+        self.connection.send(columns)
+        self.running = True
+
+    def is_alive(self):
+        """
+        Returns True if the worker is currently tracking a hit list
+        """
+        if not self.running:
+            return False
+        if self.connection.poll():
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                message = None
+            self._receive(message)
+        elif not self.worker.is_alive():
+            self._receive(None)
+        return self.running
+
+    def get_sentinel(self):
+        """
+        Returns the pipe connection, which becomes ready when the worker sends
+        back the tracked hits or dies; None if there is no worker
+        """
+        return self.connection
+
+    def get_return_value(self):
+        """
+        Get the return value, if the current job has finished running
+
+        raises a RuntimeError if the current job is still running or if the
+        tracking raised an exception in the worker
+        """
+        if self.is_alive():
+            raise RuntimeError("Cannot get return value while the job is "+\
+                               "running")
+        if self.exitcode == None:
+            raise RuntimeError("Call tracking_process.start() before trying "+\
+                               "get the return value")
+        if self.return_value == None:
+            message = "The TrackingProcess finished without leaving "+\
+                      "a return value"
+            if self.error != None:
+                message += "; worker raised\n"+self.error
+            raise RuntimeError(message)
+        return self.return_value
+
+    def terminate(self, timeout = None):
+        """
+        Terminate the worker (soft exit)
+        """
+        if self.worker == None:
+            raise RuntimeError("Attempt to terminate a process before it has "+\
+                               "been started")
+        self.worker.terminate()
+        self._stop_worker(timeout)
+
+    def kill(self, timeout = None):
+        """
+        Kill the worker (hard exit)
+        """
+        if self.worker == None:
+            raise RuntimeError("Attempt to kill a process before it has "+\
+                               "been started")
+        self.worker.kill()
+        self._stop_worker(timeout)
+
+    def close(self):
+        """
+        Ask the worker to exit once any running job has finished and wait for
+        it to do so
+        """
+        if self.worker == None:
+            return
+        self.join()
+        self.connection.send(None)
+        self._stop_worker(None)
+
+    @classmethod
+    def hits_to_columns(cls, hit_list):
+        """
+        Convert a list of hits to column buffers
+        - hit_list: list of xboa.hit.Hit objects
+
+        Returns a tuple of (float_columns, int_columns), numpy arrays of shape
+        (n_hits, n_float_variables) and (n_hits, n_int_variables)
+        """
+        float_keys, int_keys = cls._column_keys()
+        dict_list = [hit.dict_from_hit() for hit in hit_list]
+        float_columns = numpy.array(
+                  [[hit_dict[key] for key in float_keys] for hit_dict in dict_list],
+                  dtype=numpy.float64).reshape(len(dict_list), len(float_keys))
+        int_columns = numpy.array(
+                  [[hit_dict[key] for key in int_keys] for hit_dict in dict_list],
+                  dtype=numpy.int64).reshape(len(dict_list), len(int_keys))
+        return float_columns, int_columns
+
+    @classmethod
+    def columns_to_hits(cls, columns):
+        """
+        Convert column buffers made by hits_to_columns back to a list of hits
+        """
+        float_keys, int_keys = cls._column_keys()
+        hit_list = []
+        for float_row, int_row in zip(columns[0].tolist(), columns[1].tolist()):
+            hit_dict = dict(zip(float_keys, float_row))
+            hit_dict.update(zip(int_keys, int_row))
+            hit_list.append(Hit.new_from_dict(hit_dict))
+        return hit_list
+
+    def _start_worker(self):
+        """Start a new worker process, connected by a pipe"""
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.worker = multiprocessing.Process(target = _worker,
+                                 args = (self.tracking,
+                                         worker_connection,
+                                         self.connection))
+        self.worker.daemon = True
+        self.worker.start()
+        worker_connection.close()
+        self.pid = self.worker.pid
+
+    def _stop_worker(self, timeout):
+        """Wait for the worker to exit and release the pipe"""
+        self.worker.join(timeout)
+        self.exitcode = self.worker.exitcode
+        if self.running:
+            self.running = False
+            self.error = "Worker was stopped while running"
+        self.connection.close()
+        self.connection = None
+        self.worker = None
+
+    def _receive(self, message):
+        """Handle a message from the worker"""
+        self.running = False
+        if message == None:
+            self.exitcode = self.worker.exitcode
+            if self.exitcode == None:
+                self.exitcode = 1
+            self.error = "Worker died while running"
+        elif message[0] == "error":
+            self.exitcode = 1
+            self.error = message[1]
+        else:
+            self.exitcode = 0
+            lengths, columns = message[1], message[2]
+            self.bytes_out = lengths.nbytes+columns[0].nbytes+columns[1].nbytes
+            hits = self.columns_to_hits(columns)
+            self.return_value = []
+            start = 0
+            for length in lengths.tolist():
+                self.return_value.append(hits[start:start+length])
+                start += length
+
+    @classmethod
+    def _column_keys(cls):
+        """Get the variable names for the float and int columns"""
+        if cls._float_keys == None:
+            hit_dict = Hit().dict_from_hit()
+            # eventNumber and particleNumber alias event_number and
+            # particle_number; global_weight is held per event rather than
+            # per hit, so setting it before the event ids would overwrite the
+            # weight of event 0
+            keys = [key for key in hit_dict.keys() \
+                            if key not in ("eventNumber", "particleNumber",
+                                           "global_weight")]
+            cls._int_keys = [key for key in keys \
+                                       if type(hit_dict[key]) == type(1)]
+            cls._float_keys = [key for key in keys \
+                                       if key not in cls._int_keys]
+        return cls._float_keys, cls._int_keys
+
+    _float_keys = None
+    _int_keys = None
+
+def _worker(tracking, connection, parent_connection):
+    """
+    Worker loop; receives column buffers, tracks them and sends back a tuple of
+    ("hits", lengths, columns), or ("error", traceback) if tracking raised. A
+    message of None, or the pipe closing, stops the worker.
+    """
+    # close the inherited parent end so that the pipe closes if the parent
+    # goes away
+    parent_connection.close()
+    while True:
+        try:
+            columns = connection.recv()
+        except EOFError:
+            break
+        if columns == None:
+            break
+        try:
+            hits_out = tracking.track_many(PipeProcess.columns_to_hits(columns))
+            lengths = numpy.array([len(hits) for hits in hits_out],
+                                  dtype=numpy.int64)
+            flat_hits = [hit for hits in hits_out for hit in hits]
+            message = ("hits", lengths, PipeProcess.hits_to_columns(flat_hits))
+        except Exception:
+            message = ("error", traceback.format_exc())
+        connection.send(message)
+    connection.close()
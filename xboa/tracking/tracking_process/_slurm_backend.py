@@ -0,0 +1,102 @@
+# This file is a part of xboa
+# 
+# xboa is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# xboa is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with xboa in the doc folder.  If not, see 
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Import SlurmBackend directly from the tracking_process module
+"""
+
+import subprocess
+
+from ._batch_backend import BatchBackend
+
+class SlurmBackend(BatchBackend):
+    """
+    Batch backend that submits jobs to Slurm using sbatch, sacct and scancel
+    """
+    def __init__(self, partition = None, job_time = None):
+        """
+        Initialise the backend
+        - partition: name of the Slurm partition, or None to use the default
+        - job_time: wall time limit, as passed to sbatch --time, or None to
+          use the default
+        """
+        self.partition = partition
+        self.job_time = job_time
+
+    def submit(self, command, log_path, err_path):
+        """
+        Submit a job using sbatch; returns the Slurm job id
+        """
+        sbatch = ['sbatch', '--parsable', '--output', log_path,
+                  '--error', err_path]
+        if self.partition != None:
+            sbatch += ['--partition', self.partition]
+        if self.job_time != None:
+            sbatch += ['--time', self.job_time]
+        sbatch += ['--wrap', subprocess.list2cmdline(command)]
+        return self.parse_submit(self._call(sbatch))
+
+    def status(self, job_id):
+        """
+        Get the job status using sacct; returns tuple of (state, exit code)
+        """
+        proc_output = self._call(['sacct', '-j', str(job_id), '-X', '-n',
+                                  '-P', '-o', 'State,ExitCode'])
+        return self.parse_status(proc_output)
+
+    def kill(self, job_id):
+        """
+        Kill the job using scancel
+        """
+        subprocess.call(['scancel', str(job_id)])
+
+    @classmethod
+    def parse_submit(cls, proc_output):
+        """
+        Parse the output of sbatch --parsable, like "1234" or "1234;cluster"
+        Returns the job id
+        """
+        return int(proc_output.strip().split(";")[0])
+
+    @classmethod
+    def parse_status(cls, proc_output):
+        """
+        Parse the output of sacct -P -o State,ExitCode, like
+        "COMPLETED|0:0"; returns tuple of (state, exit code)
+        """
+        lines = proc_output.strip().split("\n")
+        if len(lines) == 0 or lines[0] == "":
+            # sacct can take a moment to learn about new jobs
+            return cls.UNKNOWN, None
+        state, exitcode = lines[0].split("|")[0:2]
+        state = state.split(" ")[0] # e.g. "CANCELLED by 1234"
+        if state in ["PENDING", "CONFIGURING", "REQUEUED", "RESIZING",
+                     "SUSPENDED"]:
+            return cls.PENDING, None
+        if state in ["RUNNING", "COMPLETING"]:
+            return cls.RUNNING, None
+        exitcode = int(exitcode.split(":")[0])
+        if state == "COMPLETED" and exitcode == 0:
+            return cls.DONE, exitcode
+        if exitcode == 0:
+            exitcode = 1 # e.g. cancelled or timed out
+        return cls.FAILED, exitcode
+
+    @classmethod
+    def _call(cls, command):
+        """Call command and return stdout decoded as a string"""
+        return subprocess.check_output(command, universal_newlines = True)
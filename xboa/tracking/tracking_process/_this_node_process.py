@@ -24,9 +24,9 @@ import subprocess
 
 from ._tracking_process import TrackingProcess
 
-# Could potentially use multiprocessing with pickle used to do in memory
-# messaging (rather than relying on disk writes to handle messaging, which can
-# be slow and can lead to funny errors).
+# See PipeProcess for a TrackingProcess that does in memory messaging (rather
+# than relying on disk writes to handle messaging, which can be slow and can
+# lead to funny errors).
 class ThisNodeProcess(TrackingProcess):
     """
     TrackingProcess that can do multiprocessing on this node (i.e. not 
@@ -42,6 +42,7 @@ class ThisNodeProcess(TrackingProcess):
         """
         TrackingProcess.__init__(self, tracking)
         self.proc = None
+        self.sentinel = None
 
     def start(self):
         """
@@ -50,10 +51,44 @@ class ThisNodeProcess(TrackingProcess):
         if self.is_alive():
             raise RuntimeError("Attempt to start a process that is already "+\
                                "started")
-        self.proc = subprocess.Popen([self.run_executable,
-                                      "--out-dir", self.out_dir])
+        self._close_sentinel()
+        # the child holds the write end of a pipe; when the child exits the
+        # pipe is closed and the read end becomes ready
+        read_fd, write_fd = os.pipe()
+        try:
+            self.proc = subprocess.Popen([self.run_executable,
+                                          "--out-dir", self.out_dir],
+                                          pass_fds = (write_fd,))
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self.sentinel = read_fd
         self.pid = self.proc.pid
 
+    def __getstate__(self):
+        """
+        Handles on the running process are not copied or pickled
+        """
+        state = self.__dict__.copy()
+        state["proc"] = None
+        state["sentinel"] = None
+        return state
+
+    def get_sentinel(self):
+        """
+        Returns a file descriptor that becomes ready when the process exits, or
+        None if the process has not been started
+        """
+        return self.sentinel
+
+    def _close_sentinel(self):
+        """Close the sentinel pipe, if it is open"""
+        if self.sentinel != None:
+            os.close(self.sentinel)
+            self.sentinel = None
+
     def is_alive(self):
         """
         Returns true if the process is currently running
@@ -61,6 +96,8 @@ class ThisNodeProcess(TrackingProcess):
         if self.proc == None:
             return False
         self.exitcode = self.proc.poll()
+        if self.exitcode != None:
+            self._close_sentinel()
         return self.exitcode == None
   
     def terminate(self, timeout = None):
@@ -15,10 +15,12 @@
 # <http://www.gnu.org/licenses/>.
 
 import os
+import shutil
 import tempfile
 import pickle
 import time
 import stat
+import multiprocessing.connection
 
 class TrackingProcess(object):
     """
@@ -67,10 +69,13 @@ class TrackingProcess(object):
     def set_hit_list(self, hit_list):
         """
         Set the hit list over which the TrackingProcess should run
+
+        The number of bytes written is stored in bytes_in.
         """
         self.hit_list = hit_list
-        process_out = open(os.path.join(self.out_dir, self.pickle_jar), "w")
-        pickle.dump(self, process_out)
+        with open(os.path.join(self.out_dir, self.pickle_jar), "wb") as fout:
+            pickle.dump(self, fout)
+            self.bytes_in = fout.tell()
 
     def start(self):
         """
@@ -111,6 +116,15 @@ class TrackingProcess(object):
         """
         return self.tracking.track_many(self.hit_list)
 
+    def get_sentinel(self):
+        """
+        Return an object that becomes ready, in the sense of
+        multiprocessing.connection.wait, when the process finishes. Returns
+        None if the process cannot signal that it has finished, in which case
+        the caller should poll is_alive() every poll_interval seconds.
+        """
+        return None
+
     def join(self, timeout = None):
         """
         Block the calling process until the TrackingProcess finishes or timeout
@@ -119,14 +133,26 @@ class TrackingProcess(object):
           process
         """
         start_time = time.time()
-        delta_t = -1
-        while self.is_alive() and (timeout == None or delta_t < timeout):
-            delta_t = time.time()-start_time
+        while self.is_alive():
+            wait_time = None
+            if timeout != None:
+                wait_time = timeout - (time.time()-start_time)
+                if wait_time <= 0.:
+                    break
+            sentinel = self.get_sentinel()
+            if sentinel == None:
+                if wait_time == None or wait_time > self.poll_interval:
+                    wait_time = self.poll_interval
+                time.sleep(wait_time)
+            else:
+                multiprocessing.connection.wait([sentinel], wait_time)
 
     def get_return_value(self):
         """
         Fill the return value, if the current job has finished running
 
+        The number of bytes read is stored in bytes_out.
+
         raises a RuntimeError if the current job is still running
         """
         if self.is_alive():
@@ -139,18 +165,55 @@ class TrackingProcess(object):
         if not os.path.exists(return_path):
             raise RuntimeError("The TrackingProcess finished without leaving "+\
                                "a return value")
-        fin = open(return_path)
-        self.return_value = pickle.load(fin)
+        with open(return_path, "rb") as fin:
+            self.return_value = pickle.load(fin)
+            self.bytes_out = fin.tell()
         return self.return_value
 
+    def cleanup(self):
+        """
+        Remove the output directory, once the return value has been read
+        """
+        if self.out_dir != None and os.path.isdir(self.out_dir):
+            shutil.rmtree(self.out_dir, ignore_errors = True)
+
+    @classmethod
+    def clean_tmp_dir(cls, tmp_dir, max_age):
+        """
+        Remove old output directories left behind in tmp_dir, e.g. by
+        processes that were killed before cleanup() could be called
+        - tmp_dir: directory in which output directories were made
+        - max_age: output directories that have not been modified for longer
+          than max_age seconds are removed
+        Returns a list of the directories that were removed
+        """
+        removed = []
+        if not os.path.isdir(tmp_dir):
+            return removed
+        now = time.time()
+        for name in os.listdir(tmp_dir):
+            # output directories are made by tempfile.mkdtemp
+            if not name.startswith(tempfile.template):
+                continue
+            path = os.path.join(tmp_dir, name)
+            try:
+                if not os.path.isdir(path) or \
+                   now-os.path.getmtime(path) < max_age:
+                    continue
+                shutil.rmtree(path)
+                removed.append(path)
+            except OSError:
+                pass # e.g. removed by someone else; keep going
+        return removed
+
     @classmethod
     def new_from_pickle(cls, pickle_dir):
         """
         Instantiate a TrackingProcess from pickle directory
         - pickle_dir: directory where pickled data is stored.
         """
-        fin = open(os.path.join(pickle_dir, cls.pickle_jar), "r")
-        process = pickle.load(fin)
+        with open(os.path.join(pickle_dir, cls.pickle_jar), "rb") as fin:
+            process = pickle.load(fin)
         return process
 
     # I know these names are inscrutable - but I couldn't resist. I like
@@ -158,4 +221,8 @@ class TrackingProcess(object):
     pickle_jar = "tracking_process.pickle"
     pickle_sandwich = "hits_out.pickle"
     run_executable = "xboa_tracking_process.py"
+    poll_interval = 1.
+    ## number of bytes of serialised input and output data for the last job
+    bytes_in = 0
+    bytes_out = 0
 
@@ -40,15 +40,19 @@ def main():
     """Run the TrackingProcess"""
     args = parse_args()
     out_dir = args.out_dir 
-    fin = open(os.path.join(out_dir, TrackingProcess.pickle_jar))
-    tracking_process = pickle.load(fin)
+    with open(os.path.join(out_dir, TrackingProcess.pickle_jar), "rb") as fin:
+        tracking_process = pickle.load(fin)
     # clear any old data; always want to get new data
-    if os.path.exists(TrackingProcess.pickle_sandwich):
-        os.remove(TrackingProcess.pickle_sandwich)
+    sandwich_path = os.path.join(out_dir, TrackingProcess.pickle_sandwich)
+    if os.path.exists(sandwich_path):
+        os.remove(sandwich_path)
     # run the data and dump the output
     hits = tracking_process.run()
-    fout = open(os.path.join(out_dir, TrackingProcess.pickle_sandwich), "w")
-    pickle.dump(hits, fout)
+    # write to a temporary file and rename, so that a partially written
+    # return value is never read by the calling process
+    with open(sandwich_path+".tmp", "wb") as fout:
+        pickle.dump(hits, fout)
+    os.rename(sandwich_path+".tmp", sandwich_path)
 
 if __name__ == "__main__":
     main()